@@ -0,0 +1,44 @@
+#!/usr/bin/python
+#-*- coding: utf-8
+"""
+Measures the host CPU cost of turning a command into the bytes which are written to the PiSoC.
+
+"before" is the original PrepareData followed by the chr join done in UART.send_data, written with bytearray so that it runs, and gives bytes, on Python 2 and 3.
+"after" is FrameEncoder.encode followed by tobytes, as the UART and USB UART transports now do.
+
+Usage: python benchmarks/encode_frames.py [iterations]
+"""
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pisoc import PiSoC, FrameEncoder
+
+
+def legacy_prepare(*args, **kwargs):
+    Hformat = kwargs.get('Hformat', [2])
+    buf = list(bytearray(struct.pack(''.join(['B' if (args[x]<256 and x not in Hformat) else 'H' for x in range(len(args))]), *args))) #the ord() of each character, on Python 2 and 3
+    buf = [PiSoC.MAGIC, len(buf)]+buf
+    return bytes(bytearray(buf)) #the chr join, as bytes
+
+COMMANDS = {
+    'gpio write'    : ((PiSoC.GPIO_REGISTER, 0x01, (2<<4)|(3<<1)|1), [2]),
+    'pwm compare'   : ((PiSoC.PWM_REGISTER0, 0x0E, 1500), [2]),
+    'test read 32B' : (tuple([PiSoC.TEST_REGISTER, 0] + list(range(32))), []),
+}
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    encoder = FrameEncoder()
+    print('%-14s %12s %12s %8s'%('command', 'before (us)', 'after (us)', 'speedup'))
+    for name in sorted(COMMANDS):
+        args, Hformat = COMMANDS[name]
+        assert legacy_prepare(*args, Hformat = Hformat) == encoder.encode(args, Hformat).tobytes()
+        before = min(timeit.repeat(lambda: legacy_prepare(*args, Hformat = Hformat), number = iterations, repeat = 3))
+        after = min(timeit.repeat(lambda: encoder.encode(args, Hformat).tobytes(), number = iterations, repeat = 3))
+        print('%-14s %12.3f %12.3f %7.2fx'%(name, 1e6*before/iterations, 1e6*after/iterations, before/after))
+
+if __name__ == '__main__':
+    main()
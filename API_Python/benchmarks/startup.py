@@ -0,0 +1,99 @@
+#!/usr/bin/python
+#-*- coding: utf-8
+"""
+Measures how long a program built on the API takes to start, so that command line tools stay quick.
+
+import      Time to import pisoc in a fresh interpreter, as the median and best of several runs, and the modules importing it loads.
+            Backend dependencies which should only be loaded once a transport needs them are listed if they were loaded anyway.
+detect      Time taken to work out what kind of host this is, the first time and once it has been memoized.
+connect     Time to construct the PiSoC on the given protocol, which defaults to LOOPBACK so that no board is needed.
+
+Usage: python benchmarks/startup.py [--runs 20] [--protocol LOOPBACK] [--json results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAZY = ['serial', 'smbus', 'smbus2', 'spidev', 'json', 'platform', 'concurrent.futures', 'pisoc.emulator', 'pisoc.hotplug', 'pisoc.trace', 'pisoc.broker',
+        'pisoc.pipeline', 'pisoc.threaded', 'pisoc.metrics', 'pisoc.coalescer']
+
+PROBE = """
+import sys, time
+sys.path.insert(0, %r)
+before = set(sys.modules)
+t0 = time.time()
+import pisoc
+elapsed = time.time() - t0
+print(repr((elapsed, sorted(set(sys.modules) - before))))
+"""
+
+def measure_import(runs):
+    samples = []
+    loaded = []
+    for i in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', PROBE%ROOT])
+        elapsed, loaded = eval(out.decode().strip())
+        samples.append(1000*elapsed)
+    samples.sort()
+    return {
+        'runs': runs,
+        'median_ms': round(samples[len(samples)//2], 2),
+        'best_ms': round(samples[0], 2),
+        'modules_loaded': len(loaded),
+        'loaded_eagerly': [name for name in LAZY if name in loaded],
+        }
+
+def measure_detect():
+    from pisoc import detect_platform
+    t0 = time.time()
+    plat = detect_platform()
+    first = time.time() - t0
+    t0 = time.time()
+    detect_platform()
+    again = time.time() - t0
+    return {'platform': plat, 'first_us': round(1e6*first, 1), 'memoized_us': round(1e6*again, 1)}
+
+def measure_connect(protocol):
+    from pisoc import PiSoC
+    t0 = time.time()
+    PiSoC(protocol, log_level = 'error')
+    elapsed = time.time() - t0
+    PiSoC.cleanup()
+    return {'protocol': protocol, 'ms': round(1000*elapsed, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Measures import and start up time of the PiSoC API')
+    parser.add_argument('--runs', type = int, default = 20, help = 'fresh interpreters to time the import in')
+    parser.add_argument('--protocol', default = 'LOOPBACK', help = 'protocol to construct the PiSoC with; see PiSoC()')
+    parser.add_argument('--json', default = None, help = 'file to write the results to; - for stdout')
+    opts = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    results = {
+        'python': sys.version.split()[0],
+        'import': measure_import(opts.runs),
+        'detect': measure_detect(),
+        'connect': measure_connect(opts.protocol),
+        }
+    if opts.json == '-':
+        json.dump(results, sys.stdout, indent = 2, sort_keys = True)
+        print('')
+        return
+    if opts.json:
+        with open(opts.json, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+    result = results['import']
+    print('%-18s %10.2f ms median, %.2f ms best, %d modules'%('import pisoc', result['median_ms'], result['best_ms'], result['modules_loaded']))
+    if result['loaded_eagerly']:
+        print('%-18s %s'%('loaded eagerly', ', '.join(result['loaded_eagerly'])))
+    result = results['detect']
+    print('%-18s %10.1f us, then %.1f us (%s)'%('detect platform', result['first_us'], result['memoized_us'], result['platform'] or 'PC'))
+    result = results['connect']
+    print('%-18s %10.2f ms'%('PiSoC(%s)'%result['protocol'], result['ms']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/python
+#-*- coding: utf-8
+"""
+Measures the transport between the host and the PiSoC, so that firmware and host releases can be compared.
+
+latency     Round trip time of single commands, as p50, p99 and max, with a histogram of power of two buckets in microseconds.
+throughput  Commands completed per second over a fixed time, for reads and for writes.
+payload     Test_Read round trips with 1 to 53 bytes of data, which with the address and index is the 55 byte limit of a frame.
+            Every echo is checked, and the number which came back wrong is reported.
+
+The protocol is chosen as for PiSoC(): PC or USB for USB_UART, PI or UART for the UART, I2C, or LOOPBACK.
+PTY serves a virtual PiSoC on a pseudo-terminal and measures it over the UART, at --baud with --latency per command.
+On the UART, --uart-baud measures at a faster rate agreed with the PiSoC, rather than at 115200.
+
+Usage: python benchmarks/transport.py [--protocol PC] [--json results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pisoc
+from pisoc import *
+
+PAYLOAD_SIZES = [1, 2, 4, 8, 16, 32, 48, 53]
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction*len(ordered)), len(ordered) - 1)]
+
+def summarize(samples):
+    """
+    Turns round trip times, in seconds, into a summary in microseconds
+    """
+    us = [1e6*s for s in samples]
+    histogram = dict()
+    for sample in us:
+        bucket = 1
+        while bucket < sample:
+            bucket*=2
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return {
+        'count': len(us),
+        'p50_us': round(percentile(us, 0.50), 1),
+        'p99_us': round(percentile(us, 0.99), 1),
+        'max_us': round(max(us), 1),
+        'mean_us': round(sum(us)/len(us), 1),
+        'histogram_us': dict(('<=%d'%bucket, histogram[bucket]) for bucket in sorted(histogram)),
+        }
+
+def time_calls(call, iterations):
+    samples = []
+    for i in range(iterations):
+        t0 = time.time()
+        call()
+        samples.append(time.time() - t0)
+    return samples
+
+def commands():
+    """
+    The commands whose latency is measured. Each is a read, so that it completes when its response arrives, whatever the window.
+    """
+    channel = PiSoC.commChannel
+    return {
+        'test_read':        lambda: Test_Read(0x5A),
+        'firmware_version': lambda: channel.receive_data(PiSoC.CHECK_BUILD, 0x09),
+        'gpio_bitmap':      lambda: channel.receive_data(PiSoC.GPIO_REGISTER, 0x04),
+        }
+
+def measure_latency(iterations):
+    results = dict()
+    for name, call in sorted(commands().items()):
+        call() #warm up
+        results[name] = summarize(time_calls(call, iterations))
+    return results
+
+def measure_throughput(duration):
+    channel = PiSoC.commChannel
+    tests = [('reads', lambda: Test_Read(0x5A))]
+    if PiSoC.GPIO:
+        port = sorted(PiSoC.GPIO)[0]
+        dat = (port<<4)|(PiSoC.GPIO[port][0]<<1)
+        tests.append(('writes', lambda: channel.send_data(PiSoC.GPIO_REGISTER, 0x01, dat)))
+    results = dict()
+    for name, call in tests:
+        done = 0
+        t0 = time.time()
+        while time.time() - t0 < duration:
+            call()
+            done+=1
+        if hasattr(channel, 'flush'): #writes may still be in flight with a window
+            channel.flush()
+        elapsed = time.time() - t0
+        results[name] = {'commands': done, 'seconds': round(elapsed, 3), 'commands_per_s': round(done/elapsed, 1)}
+    return results
+
+def measure_payload(iterations, sizes):
+    results = []
+    for size in sizes:
+        data = [(7*i + size)&0xFF for i in range(size)]
+        wrong = [0]
+        calls = [0]
+        def call():
+            index = calls[0] % size
+            calls[0]+=1
+            if Test_Read(*data, index = index) != data[index]:
+                wrong[0]+=1
+        samples = time_calls(call, iterations)
+        result = summarize(samples)
+        del result['histogram_us']
+        result['payload_bytes'] = size
+        result['frame_bytes'] = size + 4 #MAGIC, length, address and index
+        result['kbps'] = round(8.0*result['frame_bytes']*len(samples)/(1000*sum(samples)), 2)
+        result['wrong'] = wrong[0]
+        results.append(result)
+    return results
+
+def connect(opts):
+    virtual = None
+    protocol, com_port = opts.protocol, opts.com_port
+    if protocol == 'PTY':
+        from pisoc.emulator import PtyPiSoC
+        virtual = PtyPiSoC(baud = opts.baud, latency = opts.latency)
+        protocol, com_port = 'UART', virtual.start()
+    PiSoC(protocol, com_port, opts.baud, 'warn', opts.window, uart_baud = opts.uart_baud)
+    return virtual
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Measures latency, throughput and payload size sweeps over a PiSoC transport')
+    parser.add_argument('--protocol', default = None, help = 'PC, USB, PI, UART, I2C, LOOPBACK or PTY; detected if not given')
+    parser.add_argument('--com-port', default = '/dev/ttyAMA0')
+    parser.add_argument('--baud', type = int, default = 115200)
+    parser.add_argument('--window', type = int, default = 1)
+    parser.add_argument('--uart-baud', type = int, default = None, help = 'baud rate to switch the UART to, e.g. 1000000')
+    parser.add_argument('--latency', type = float, default = 0.0001, help = 'seconds per command of the PTY virtual PiSoC')
+    parser.add_argument('--iterations', type = int, default = 1000)
+    parser.add_argument('--duration', type = float, default = 2.0, help = 'seconds each throughput test runs for')
+    parser.add_argument('--sizes', default = ','.join(str(size) for size in PAYLOAD_SIZES), help = 'comma separated payload sizes, up to 53 bytes')
+    parser.add_argument('--json', default = None, help = 'file to write the results to; - for stdout')
+    opts = parser.parse_args()
+    sizes = [int(size) for size in opts.sizes.split(',')]
+    if max(sizes) > 53 or min(sizes) < 1:
+        parser.error('payload sizes must be from 1 to 53 bytes')
+
+    virtual = connect(opts)
+    try:
+        results = {
+            'host': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'api_version': pisoc.__version__,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                },
+            'pisoc': {
+                'protocol': opts.protocol,
+                'transport': type(PiSoC.commChannel).__name__,
+                'com_port': getattr(PiSoC.commChannel, 'com', None),
+                'baud': getattr(PiSoC.commChannel, 'baudr', None),
+                'window': opts.window,
+                'firmware_version': PiSoC.FIRMWARE_VERSION,
+                'features': PiSoC.FEATURES,
+                'fingerprint': PiSoC.FINGERPRINT,
+                },
+            'latency': measure_latency(opts.iterations),
+            'throughput': measure_throughput(opts.duration),
+            'payload': measure_payload(max(opts.iterations//10, 10), sizes),
+            }
+    finally:
+        PiSoC.cleanup()
+        if virtual is not None:
+            virtual.close()
+
+    if opts.json == '-':
+        json.dump(results, sys.stdout, indent = 2, sort_keys = True)
+        print('')
+        return
+    if opts.json:
+        with open(opts.json, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+    print('%-18s %10s %10s %10s'%('command', 'p50 (us)', 'p99 (us)', 'max (us)'))
+    for name in sorted(results['latency']):
+        result = results['latency'][name]
+        print('%-18s %10.1f %10.1f %10.1f'%(name, result['p50_us'], result['p99_us'], result['max_us']))
+    for name in sorted(results['throughput']):
+        print('%-18s %10.1f commands/s'%(name, results['throughput'][name]['commands_per_s']))
+    print('%-18s %10s %10s %10s'%('payload (bytes)', 'p50 (us)', 'kbps', 'wrong'))
+    for result in results['payload']:
+        print('%-18d %10.1f %10.2f %10d'%(result['payload_bytes'], result['p50_us'], result['kbps'], result['wrong']))
+
+if __name__ == '__main__':
+    main()
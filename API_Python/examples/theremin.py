@@ -5,5 +5,6 @@ ranger = RangeFinder(DigitalPin(12, 1), DigitalPin(12, 2))
 piezo = Tone(1)
 piezo.Start()
 piezo.SetVolume(10) #Max volume
-while True:
-        piezo.SetFrequency(ranger.ReadRaw())
\ No newline at end of file
+with PiSoC.coalesce(max_rate = 50): #the piezo can't follow more than this; older frequencies are dropped
+    while True:
+        piezo.SetFrequency(ranger.ReadRaw())
@@ -25,18 +25,52 @@
 __author__ = 'Brian Bradley'
 __version__ = '2.0.1'
 
+import sys
 import time
-import platform
 import re
 import os
 import struct
 import logging
-import importlib
+import collections
+import functools
+import threading
+import itertools
+import contextlib
 
 
 
 
 
+class sessionmethod(object):
+    """
+    Decorator for :class:`PiSoC` methods which act on a session. The method is given the session it was called on as its first argument:
+    the PiSoC object when called on one, or the :class:`PiSoC` class itself when called on the class.
+    """
+    def __init__(self, fn):
+        self.fn = fn
+        self.__doc__ = fn.__doc__
+
+    def __get__(self, obj, cls):
+        return functools.partial(self.fn, cls if obj is None else obj)
+
+
+class memoized(object):
+    """
+    Decorator for functions without arguments whose result does not change while the process runs, such as what kind of host it is. The function is only called the first time.
+    """
+    def __init__(self, fn):
+        self.fn = fn
+        self.__doc__ = fn.__doc__
+        self.called = False
+        self.result = None
+
+    def __call__(self):
+        if not self.called:
+            self.result = self.fn()
+            self.called = True
+        return self.result
+
+
 class PiSoC(object):
     """
     :Class:
@@ -85,6 +119,7 @@ class PiSoC(object):
 
     REGISTERS_IN_USE        = []
 
+    BATCH_REGISTER          = 0xF9
     STRIPLIGHT_REGISTER     = 0xFB
     RANGE_FINDER            = 0xFC
     TEST_REGISTER           = 0xFD
@@ -92,7 +127,9 @@ class PiSoC(object):
     RESET_ADDRESS           = 0xFF
 
     MAGIC                   = 0xEB
+    UNACKED_MAGIC           = 0xEA
     BAD_PARAM               = 0xFBAD0080
+    RESEND                  = 0xFBAD00C0
     STATUS                  = 0xFBAD0000
     GOOD                    = 0xA11600D
     MAX_RESPONSE_SIZE       = 0xFEFFFFFF
@@ -106,6 +143,16 @@ class PiSoC(object):
     I2C_STATUS_OFFSET 		= 0
     I2C_RESPONSE_OFFSET		= 4
     I2C_DATA_OFFSET 		= 8
+    I2C_POLL_MIN            = 0.00005
+    I2C_POLL_MAX            = 0.002
+    I2C_TIMEOUT             = 0.5
+
+    SPI_SPEED               = 4000000
+    SPI_MODE                = 0
+    SPI_TRANSFER_SIZE       = 5
+    SPI_POLL_MIN            = 0.00002
+    SPI_POLL_MAX            = 0.001
+    SPI_TIMEOUT             = 0.5
 
     MASTER_CLK_FREQ         = 24000000
     IMO_CLK_FREQ            = 24000000
@@ -136,11 +183,47 @@ class PiSoC(object):
     ANALOG_IN_NUM           = 0
     CAPSENSE_SENSOR_NUM     = 0
     FIRMWARE_VERSION        = str()
+    FINGERPRINT             = None
+
+    FEATURES                = 0
+    RX_QUEUE_DEPTH          = 1
+    FEATURE_PIPELINE        = 0x0001
+    FEATURE_BATCH           = 0x0002
+    FEATURE_FRAMED          = 0x0004
+    FEATURE_UNACKED         = 0x0008
+    FEATURE_CHECKED         = 0x0010
+    FEATURE_BAUD            = 0x0020
+
+    PRIORITY_HIGH           = 0
+    PRIORITY_NORMAL         = 1
+    PRIORITY_LOW            = 2
+
+    MAX_BATCH_COMMANDS      = 16
+    MAX_BATCH_SIZE          = 55
+
+    MAX_RESENDS             = 3
+    RESEND_TIMEOUT          = 0.25
+    RESYNC_SIZE             = 60
+
+    DEFAULT_BAUD            = 115200
+    BAUD_RATES              = (1000000, 921600, 460800, 230400)
+    BAUD_ECHO               = (0x55, 0xAA, 0x00, 0xFF, 0x0F, 0xF0, 0x33, 0xCC)
+    BAUD_SETTLE             = 0.01
+    BAUD_TIMEOUT            = 0.1
+    MAX_BLOCK_WORDS         = 255
+
+    REOPEN_TIMEOUT          = 2.0
+    HOTPLUG_SETTLE          = 0.05
+
+    BROKER_PATH             = '/tmp/pisoc.sock'
+    METRICS                 = None
+    TOPOLOGY_CACHE          = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'pisoc', 'topology.json')
 
     DEBUG                   = False
     DEVICE_DESCRIPTOR       = "PiSoC USB UART"
     VID                     = "16D0"
     PID                     = "0B33"
+    SYSFS_ROOT              = '/sys'
 
     log_level_lut           =   {   'debug' : logging.DEBUG, 
                                     'info'  : logging.INFO,
@@ -149,7 +232,7 @@ class PiSoC(object):
                                     None    : logging.CRITICAL #There are no messages with a critical level, so no messages will be displayed if no level is specified.
                                 }
 
-    def __new__ (self, protocol = None, com_port = '/dev/ttyAMA0', baud = 9600, log_level = None):
+    def __new__ (self, protocol = None, com_port = '/dev/ttyAMA0', baud = 9600, log_level = None, window = 1, threaded = False, session = False, metrics = False, record = None, unacked = False, scheduled = False, checked = False, uart_baud = None, hotplug = False, serial_number = None):
         """
         :Method: __new__
 
@@ -159,10 +242,13 @@ class PiSoC(object):
 
             Describes how the PiSoC will communicate with the host device. For simplicity, one can choose "PC" or "PI" so that the generic protocols for those devices will be chosen. 
             The explicit protocol can be specified as "USB" or "UART" as well, for the standard API. With updated firmware, "I2C" and "SPI" will be valid choices.
+            "LOOPBACK" talks to a :class:`~pisoc.emulator.VirtualPiSoC` instead of a real board, which is useful for testing without hardware.
+            "BROKER" shares a PiSoC which is owned by a :class:`~pisoc.broker.Broker` running in another process.
 
         :type protocol: str
 
-        :param com_port: Optional parameter used to specify a com port for UART, if required. Defaults to "/dev/ttyAMA0"
+        :param com_port: Optional parameter used to specify a com port for UART, if required. Defaults to "/dev/ttyAMA0". For "BROKER", it is the path of the broker's socket, which defaults to :attr:`BROKER_PATH`,
+            and for "SPI" it is the spidev device, which defaults to "/dev/spidev0.0".
 
         :type com_port: str
 
@@ -179,11 +265,69 @@ class PiSoC(object):
 
         :type log_level: str
 
-        :returns: None
+        :param window: Number of requests which may be in flight at once on a UART or USB UART backend. Defaults to 1, which waits for every response before sending the next command.
+            Larger values let writes return immediately, and responses are matched to their requests in order. It is limited to the number of frames the firmware can queue, and is ignored by firmware that cannot queue frames.
+
+        :type window: int
+
+        :param threaded: When True, :attr:`commChannel` becomes a :class:`~pisoc.threaded.ThreadedTransport`, so that components can be used from several threads at once. Defaults to False.
+
+        :type threaded: bool
+
+        :param session: When True, a new PiSoC object is returned which holds its own transport and what was learned about its board, so that several boards can be used at once.
+            Components are put on it by passing it as their *board*. When False, the :class:`PiSoC` class itself is configured, and is used by components which are not given a *board*. Defaults to False.
+
+        :type session: bool
+
+        :param metrics: When True, :attr:`commChannel` becomes a :class:`~pisoc.metrics.MeteredTransport`, which counts the calls made for each address and command so that they can be read with :meth:`stats`. Defaults to False.
+
+        :type metrics: bool
+
+        :param record: Path of a trace file. When given, every command sent to the PiSoC after it has been set up is recorded, with its response, by a :class:`~pisoc.trace.TraceRecorder`, so that it can be replayed by :func:`~pisoc.trace.replay`.
+
+        :type record: str
+
+        :param unacked: When True, writes are not acknowledged by the PiSoC on a UART or USB UART backend, so they return as soon as they are sent. Writes which fail are reported by :meth:`sync`,
+            which is also done before the next read. It is ignored by firmware which acknowledges every write. Defaults to False.
+
+        :type unacked: bool
+
+        :param scheduled: When True, :attr:`commChannel` becomes a :class:`~pisoc.threaded.Scheduler`, which is a :class:`~pisoc.threaded.ThreadedTransport` that sends the requests queued by several threads by priority, so that
+            servo and motor commands go ahead of queued NeoPixel traffic. Defaults to False.
+
+        :type scheduled: bool
+
+        :param checked: When True, frames to and from the PiSoC carry a sequence number and a CRC on a UART or USB UART backend, so that a corrupted or lost response is detected and its request
+            is sent again on its own, rather than the connection being reset. It is ignored by firmware which cannot check frames. Defaults to False.
+
+        :type checked: bool
+
+        :param uart_baud: Baud rate to switch to on a UART backend, which otherwise stays at :attr:`DEFAULT_BAUD`. The rate is agreed with the PiSoC, and checked with echoes of :func:`Test_Read`;
+            if it does not work, both go back to :attr:`DEFAULT_BAUD`. True tries each of :attr:`BAUD_RATES`, fastest first. It is ignored by firmware which cannot change its rate. Defaults to None.
+
+        :type uart_baud: int
+
+        :param hotplug: When True, a USB UART is watched for being unplugged, and is reopened as soon as it is plugged back in, keeping what is known about the PiSoC if the fingerprint
+            of its firmware build has not changed. See :meth:`USB_UART.watch`. Defaults to False.
+
+        :type hotplug: bool
+
+        :param serial_number: The USB serial number of the PiSoC to use, when several are plugged into a PC. The first one found is used if None. See :meth:`USB_UART.find_device`.
+
+        :type serial_number: str
+
+        :returns: The session: a new PiSoC object if *session* is True, otherwise the :class:`PiSoC` class
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> boards = [PiSoC('UART', com_port = port, session = True) for port in ('/dev/ttyUSB0', '/dev/ttyUSB1')]
+            >>> servos = [Servo(0, board = b) for b in boards]
         """
         logging.basicConfig(level=self.log_level_lut[log_level],
                             format='%(message)s')
-        self.PWM_clks_copy  = dict((k,v) for k,v in PiSoC.PWM_clks.items())
+        board = object.__new__(self) if session else self
+        board.PWM_clks_copy  = dict((k,v) for k,v in PiSoC.PWM_clks.items())
         
         backend = {
 			"Model B Revision 1.0" : lambda: UART(),
@@ -200,40 +344,213 @@ class PiSoC(object):
             "unresolved": lambda: I2C()
 		}
         if protocol is None: #Lets try an autodetect...
-            plat = None
-            if platform.platform().find("Linux") >=0: #We are on linux... Is it a pi?
-                if os.uname()[4][:3] == 'arm': #probably a pi
-                    plat = get_pi_version()
-                    if plat is None: #oh no! Maybe another SBC?
-                        logging.warning("Problem resolving platform. Type of device not clear. Choosing I2C as backend for arm SBC.")
-                        plat = "unresolved"
+            plat = detect_platform()
             if plat is None: #Likely on a PC of some sort...
-                self.commChannel = USB_UART(baud)
-                while not self.commChannel.pisoc_available:
-                    time.sleep(1)
-                    logging.error("Can't connect. Trying again...")
-                    self.commChannel.reconnect()
+                board.commChannel = USB_UART(baud, serial_number)
+                board.commChannel.pipeline.board = board #reconnect() learns about the board it finds
+                while not board.commChannel.pisoc_available:
+                    logging.error("Can't connect. Waiting for the PiSoC to be plugged in...")
+                    board.commChannel.wait_for_device(1)
             else:
-                self.commChannel = backend[plat]()
+                board.commChannel = backend[plat]()
         elif protocol == 'I2C':
-            self.commChannel = I2C()
+            board.commChannel = I2C()
         elif protocol == 'SPI':
-            raise ValueError('SPI is not currently an officially supported protocol')
-            #self.commChannel = SPI()
+            board.commChannel = SPI('/dev/spidev0.0' if com_port == '/dev/ttyAMA0' else com_port)
         elif protocol == 'PC' or protocol == 'USB':
-            self.commChannel = USB_UART(baud)
-            while not self.commChannel.pisoc_available:
-                time.sleep(1)
-                logging.error("Can't connect. Trying again...")
-                self.commChannel.reconnect()
+            board.commChannel = USB_UART(baud, serial_number)
+            board.commChannel.pipeline.board = board
+            while not board.commChannel.pisoc_available:
+                logging.error("Can't connect. Waiting for the PiSoC to be plugged in...")
+                board.commChannel.wait_for_device(1)
+        elif protocol == 'LOOPBACK':
+            from pisoc.emulator import Loopback
+            board.commChannel = Loopback()
+        elif protocol == 'BROKER':
+            from pisoc.broker import BrokerClient
+            board.commChannel = BrokerClient(PiSoC.BROKER_PATH if com_port == '/dev/ttyAMA0' else com_port)
         elif protocol == "UART" or protocol == 'PI':
-            self.commChannel = UART(com_port, 115200) #the API requires this baud rate for a generic UART. 
+            board.commChannel = UART(com_port, PiSoC.DEFAULT_BAUD) #the PiSoC starts at this baud rate; a faster one is agreed below.
         else:
             raise ValueError('Invalid Communication Protocol selected: Choose "I2C" "SPI" or provide a valid COM port for Serial communication')
         logging.debug('commChannel attribute created')
-        build_info()
+        pipeline = getattr(board.commChannel, 'pipeline', None)
+        if pipeline is not None:
+            pipeline.board = board
+        topology = getattr(board.commChannel, 'topology', None)
+        if topology is not None: #the transport already knows what is on the PiSoC
+            apply_topology(topology, board)
+        else:
+            restore_info(board)
+        if uart_baud:
+            if hasattr(board.commChannel, 'negotiate_baud'):
+                board.commChannel.negotiate_baud(PiSoC.BAUD_RATES if uart_baud is True else [uart_baud])
+            else:
+                logging.warning('The baud rate cannot be changed on this transport.')
+        if checked:
+            if hasattr(board.commChannel, 'set_framed'):
+                board.commChannel.set_framed(True, True)
+            else:
+                logging.warning('Frames are not checked on this transport.')
+        if window > 1:
+            board.commChannel.set_window(window)
+        if hotplug:
+            if hasattr(board.commChannel, 'watch'):
+                board.commChannel.watch()
+            else:
+                logging.warning('Only a USB UART is watched for being plugged back in.')
+        if unacked:
+            if hasattr(board.commChannel, 'set_unacked'):
+                board.commChannel.set_unacked(True)
+            else:
+                logging.warning('Every write is acknowledged on this transport.')
+        if scheduled:
+            from pisoc.threaded import Scheduler
+            board.commChannel = Scheduler(board.commChannel, board)
+        elif threaded:
+            from pisoc.threaded import ThreadedTransport
+            board.commChannel = ThreadedTransport(board.commChannel)
+        if record is not None:
+            from pisoc.trace import TraceRecorder
+            board.commChannel = TraceRecorder(board.commChannel, record)
+        board.METRICS = None
+        if metrics:
+            from pisoc.metrics import Metrics, MeteredTransport
+            board.METRICS = Metrics()
+            board.commChannel = MeteredTransport(board.commChannel, board.METRICS)
+        return board
+
+    @sessionmethod
+    def batch(board):
+        """
+        :Method: batch
+
+        :Description: Creates a :class:`Batch` context. Writes made inside of it are collected and sent to the PiSoC as one frame, which is acknowledged once, instead of waiting for a response to each of them.
+            Anything which reads from the PiSoC inside the context first sends the writes collected so far, so reads always see the writes made before them.
+
+        :returns: A :class:`Batch` object, to be used in a *with* statement
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> PiSoC('PC', log_level = 'info')
+            >>> servos = [PWM(i) for i in range(12)]
+            >>> with PiSoC.batch():
+            ...     for servo in servos:
+            ...         servo.WriteCompare(1500)
+
+        """
+        return Batch(board)
+
+    @sessionmethod
+    def coalesce(board, max_rate = 50):
+        """
+        :Method: coalesce
+
+        :Description: Creates a :class:`~pisoc.coalescer.Coalescer` context. Writes made inside of it are sent at most *max_rate* times a second, and a write which is superseded by another to the same
+            address and command before it is sent never reaches the PiSoC. The writes which were dropped are counted in its *elided* attribute.
+
+        :param max_rate: Largest number of times a second that writes are sent. Defaults to 50.
+        :type max_rate: float
+
+        :returns: A :class:`~pisoc.coalescer.Coalescer` object, to be used in a *with* statement
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> PiSoC('PC')
+            >>> ranger = RangeFinder(DigitalPin(12, 1), DigitalPin(12, 2))
+            >>> piezo = Tone(1)
+            >>> with PiSoC.coalesce(30) as writes:
+            ...     for i in range(1000):
+            ...         piezo.SetFrequency(ranger.ReadRaw())
+
+        """
+        from pisoc.coalescer import Coalescer
+        return Coalescer(board, max_rate)
+
+    @sessionmethod
+    def sync(board):
+        """
+        :Method: sync
+
+        :Description: A checkpoint for unacknowledged writes: waits until everything sent so far has been executed by the PiSoC, and logs a warning if any unacknowledged write failed.
+
+        :returns: The number of unacknowledged writes which failed since the last checkpoint. Always 0 when writes are acknowledged.
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> PiSoC('PC', unacked = True)
+            >>> servos = [Servo(i) for i in range(4)]
+            >>> for angle in range(0, 180, 10):
+            ...     for servo in servos:
+            ...         servo.SetAngle(angle)
+            ...     PiSoC.sync()
+        """
+        channel = board.commChannel
+        if hasattr(channel, 'flush'):
+            channel.flush()
+        if hasattr(channel, 'sync'):
+            return channel.sync()
+        return 0
+
+    @sessionmethod
+    def stats(board, reset = False):
+        """
+        :Method: stats
+
+        :Description: Reports the calls made to the PiSoC for each address and command, when it was constructed with *metrics* set. See :meth:`~pisoc.metrics.Metrics.snapshot`.
+
+        :param reset: When True, the counts start again from zero afterwards
+        :type reset: bool
+
+        :returns: dict keyed by names such as "PWM_REGISTER3/0x0E". It is empty if metrics are not being kept.
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> PiSoC('PC', metrics = True)
+            >>> pwm = PWM(3)
+            >>> pwm.WriteCompare(1500)
+            >>> PiSoC.stats()['PWM_REGISTER3/0x0E']['calls']
+            1
+        """
+        if board.METRICS is None:
+            return dict()
+        return board.METRICS.snapshot(reset)
+
+    @sessionmethod
+    def cleanup(board):
+        """
+        :Method: cleanup
+
+        :Description: Resets the PiSoC and closes its transport. Components which were reserved on this session are released.
+
+        :returns: None
+        """
+        board.commChannel.cleanup()
+        board.REGISTERS_IN_USE = []
         
 
+@memoized
+def detect_platform():
+    """
+    :Function: detect_platform
+
+    :Description: Works out which kind of host the API is running on, for :meth:`PiSoC.__new__` to choose a protocol. This is only done once per process.
+
+    :returns: The Raspberry Pi model, as returned by :func:`get_pi_version`, "unresolved" for another ARM Linux board, or None for a PC
+    """
+    if not sys.platform.startswith('linux') or os.uname()[4][:3] != 'arm': #Not a pi; likely a PC
+        return None
+    plat = get_pi_version()
+    if plat is None: #oh no! Maybe another SBC?
+        logging.warning("Problem resolving platform. Type of device not clear. Choosing I2C as backend for arm SBC.")
+        plat = "unresolved"
+    return plat
+
+@memoized
 def get_pi_version():
 	pi_versions = {
 		"0002" : "Model B Revision 1.0",
@@ -286,20 +603,119 @@ def PrepareData(*args, **kwargs):
     """
     #The third element must be formatted as 16-bit unless otherwise specified, hence default of [2].
     Hformat = kwargs.get('Hformat', [2]) 
-    
+
+
     #format our data as 8-bit when possible unless specified by Hformat, else 16-bit if >255
-    buf = [ord(c) for c in struct.pack(''.join(['B' if (args[x]<256 and x not in Hformat) else 'H' for x in range(len(args))]), *args)]
-	
-    #Keyword + length prefic our data
-    buf = [PiSoC.MAGIC, len(buf)]+buf 
+    buf = list(bytearray(struct.pack(''.join(['B' if (args[x]<256 and x not in Hformat) else 'H' for x in range(len(args))]), *args)))
 
-    return buf
+    #Keyword + length prefix our data. A new buffer is packed every time, so callers on any thread can share it.
+    return [PiSoC.MAGIC, len(buf)]+buf
 
-def build_info():
-    PiSoC.REGISTERS_IN_USE = []
-    PiSoC.GPIO = dict()
-    PiSoC.PWM_clks = dict()
-    analog = Check_Analog()
+class FrameEncoder(object):
+    """
+    :Class:
+
+        Packs commands into frames for the PiSoC, in the same format as :func:`PrepareData`. The *struct.Struct* for each kind of command is compiled once and cached,
+        and frames are packed straight into a reusable buffer, instead of being built up as a list of ints and joined back into a string for every command.
+
+        Each transport owns one, since the buffer is reused by the next call to :meth:`encode`.
+    """
+    def __init__(self):
+        self.buf = bytearray(64)
+        self.view = memoryview(self.buf)
+        self.buf[0] = PiSoC.MAGIC
+        self.signatures = dict()
+        self.structs = dict()
+
+    def compile(self, fmt):
+        packer = self.structs.get(fmt)
+        if packer is None:
+            packer = self.structs[fmt] = struct.Struct(fmt)
+        return packer
+
+    def encode(self, args, Hformat = (2,), magic = PiSoC.MAGIC):
+        """
+        :Method: encode
+
+        :Description: Packs a command into the encoder's buffer
+
+        :param args: Ordered list of data to be sent to the pisoc
+        :type args: tuple
+
+        :param Hformat: list of indices of args that should be formatted as unsigned short, independent of their length. Defaults to (2,), as this is generally required.
+        :type Hformat: list
+
+        :param magic: The byte which starts the frame: :attr:`PiSoC.MAGIC`, or :attr:`PiSoC.UNACKED_MAGIC` for a write which the PiSoC should not answer
+        :type magic: int
+
+        :returns: A memoryview of the frame, which is valid until the next call to :meth:`encode`
+        """
+        key = (len(args), tuple(Hformat))
+        signature = self.signatures.get(key)
+        if signature is None:
+            narrow = tuple([x for x in range(len(args)) if x not in Hformat])
+            fmt = ''.join(['B' if x in narrow else 'H' for x in range(len(args))])
+            signature = self.signatures[key] = (narrow, self.compile(fmt))
+        narrow, packer = signature
+
+        #format our data as 8-bit when possible unless specified by Hformat, else 16-bit if >255
+        for x in narrow:
+            if args[x] > 255:
+                packer = self.compile(''.join(['B' if (args[x]<256 and x not in Hformat) else 'H' for x in range(len(args))]))
+                break
+
+        #Keyword + length prefix our data
+        self.buf[0] = magic
+        self.buf[1] = packer.size
+        packer.pack_into(self.buf, 2, *args)
+        return self.view[:packer.size + 2]
+
+def crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte<<8
+        for bit in range(8):
+            crc = ((crc<<1)^0x1021 if crc&0x8000 else crc<<1)&0xFFFF
+        table.append(crc)
+    return table
+
+CRC16_TABLE = crc16_table()
+
+def crc16(data, crc = 0xFFFF):
+    """
+    :Function: crc16
+
+    :Description: Computes the CRC-16/CCITT-FALSE (polynomial 0x1021, starting from 0xFFFF) which checked frames end with, as *Python_crc16* does on the PiSoC
+
+    :param data: The bytes to check
+    :type data: bytearray
+
+    :param crc: The CRC of the bytes which came before *data*, to continue from
+    :type crc: int
+
+    :returns: The 16-bit CRC
+    """
+    for byte in bytearray(data):
+        crc = ((crc<<8)&0xFF00)^CRC16_TABLE[(crc>>8)^byte]
+    return crc
+
+def build_info(board = None):
+    if board is None:
+        board = PiSoC
+    if hasattr(board.commChannel, 'set_framed'): #the PiSoC may still be sending framed responses to a previous connection
+        board.commChannel.set_framed(False)
+    board.REGISTERS_IN_USE = []
+    board.GPIO = dict()
+    board.PWM_clks = dict()
+    board.FINGERPRINT = None
+    description = Describe_Board(board)
+    if description is not None:
+        analog, PWM_DAT, gpio_023, gpio_456, gpio_1215, version, features, fingerprint = description[:8]
+        board.FINGERPRINT = None if fingerprint == PiSoC.BAD_PARAM else fingerprint
+    else:
+        analog = Check_Analog(board)
+        PWM_DAT = Check_PWM(board)
+        gpio_023, gpio_456, gpio_1215 = [Check_GPIO(block, board) for block in range(3)]
     DELSIG__MASK = 0x01
     SAR0__MASK = 0x01<<1
     SAR1__MASK = 0x01<<2
@@ -315,61 +731,60 @@ def build_info():
     IDAC0_RANGE__MASK = 0x03
     IDAC1_RANGE__MASK = 0x03
 
-    PiSoC.DELSIG = bool(analog&DELSIG__MASK)
-    PiSoC.SAR0 = bool(analog&SAR0__MASK)
-    PiSoC.SAR1 = bool(analog&SAR1__MASK)
-    PiSoC.VDAC0 = bool(analog&VDAC0__MASK)
-    PiSoC.VDAC1 = bool(analog&VDAC1__MASK)
-    PiSoC.IDAC0 = bool(analog&IDAC0__MASK)
-    PiSoC.IDAC1 = bool(analog&IDAC1__MASK)
-    PiSoC.WAVEDAC = bool(analog&WAVEDAC__MASK)
-    PiSoC.ANALOG_IN_NUM = (analog&ANALOG_PINS__MASK)>>8
-    PiSoC.CAPSENSE_SENSOR_NUM = (analog&CAPSENSE__MASK)>>14
+    board.DELSIG = bool(analog&DELSIG__MASK)
+    board.SAR0 = bool(analog&SAR0__MASK)
+    board.SAR1 = bool(analog&SAR1__MASK)
+    board.VDAC0 = bool(analog&VDAC0__MASK)
+    board.VDAC1 = bool(analog&VDAC1__MASK)
+    board.IDAC0 = bool(analog&IDAC0__MASK)
+    board.IDAC1 = bool(analog&IDAC1__MASK)
+    board.WAVEDAC = bool(analog&WAVEDAC__MASK)
+    board.ANALOG_IN_NUM = (analog&ANALOG_PINS__MASK)>>8
+    board.CAPSENSE_SENSOR_NUM = (analog&CAPSENSE__MASK)>>14
     VDAC0_MODE = VDAC0_RANGE__MASK&(analog>>20)
     VDAC1_MODE = VDAC1_RANGE__MASK&(analog>>21)
     IDAC0_MODE = IDAC0_RANGE__MASK&(analog>>23)
     IDAC1_MODE = IDAC1_RANGE__MASK&(analog>>25)
     if VDAC0_MODE:
-    	PiSoC.VDAC0_RANGE = 4.080
+    	board.VDAC0_RANGE = 4.080
     else:
-    	PiSoC.VDAC0_RANGE = 1.020
+    	board.VDAC0_RANGE = 1.020
     if VDAC1_MODE:
-    	PiSoC.VDAC1_RANGE = 4.080
+    	board.VDAC1_RANGE = 4.080
     else:
-    	PiSoC.VDAC1_RANGE = 1.020
-    if IDAC0_MODE is 0x01:
-    	PiSoC.IDAC0_RANGE = .03175
-    elif IDAC0_MODE is 0x02:
-    	PiSoC.IDAC0_RANGE = .255
+    	board.VDAC1_RANGE = 1.020
+    if IDAC0_MODE == 0x01:
+    	board.IDAC0_RANGE = .03175
+    elif IDAC0_MODE == 0x02:
+    	board.IDAC0_RANGE = .255
     else:
-    	PiSoC.IDAC0_RANGE = 2.04
+    	board.IDAC0_RANGE = 2.04
 
-    if IDAC1_MODE is 0x01:
-    	PiSoC.IDAC1_RANGE = 0.03175
-    elif IDAC1_MODE is 0x02:
-    	PiSoC.IDAC1_RANGE = .255
+    if IDAC1_MODE == 0x01:
+    	board.IDAC1_RANGE = 0.03175
+    elif IDAC1_MODE == 0x02:
+    	board.IDAC1_RANGE = .255
     else:
-    	PiSoC.IDAC1_RANGE = 2.04
+    	board.IDAC1_RANGE = 2.04
 
-    PWM_DAT = Check_PWM()
-    PiSoC.PWM_CLK_NUM = PWM_DAT&0x0F
-    PiSoC.PWM_NUM = PWM_DAT>>4
+    board.PWM_CLK_NUM = PWM_DAT&0x0F
+    board.PWM_NUM = PWM_DAT>>4
 
-    gpio_023 = Check_GPIO(0)
     PORT3 = (gpio_023&(0xFF<<16))>>16
     PORT2 = (gpio_023&(0xFF<<8))>>8
     PORT0 = gpio_023&0xFF
 
-    gpio_456 = Check_GPIO(1)
     PORT6 = (gpio_456&(0xFF<<16))>>16
     PORT5 = (gpio_456&(0xFF<<8))>>8
     PORT4 = gpio_456&0xFF
 
-    gpio_1215 = Check_GPIO(2)
     PORT15 = (gpio_1215&(0xFF<<8))>>8
     PORT12 = gpio_1215&0xFF
 
-    PWM_CLK_DAT_L = Get_Clocks(PiSoC.PWM_CLK_NUM)
+    if description is not None:
+        PWM_CLK_DAT_L = description[8:8 + board.PWM_CLK_NUM]
+    else:
+        PWM_CLK_DAT_L = Get_Clocks(board.PWM_CLK_NUM, board)
 
     clk_dividers = []
     clk_numbers = []
@@ -388,53 +803,56 @@ def build_info():
         elif clk_freq[i] ==4:
             clk_freq[i] = PiSoC.PLL_CLK_FREQ
 
-        PiSoC.PWM_clks[clk_numbers[i]] = [clk_freq[i],clk_dividers[i], []]
+        board.PWM_clks[clk_numbers[i]] = [clk_freq[i],clk_dividers[i], []]
 
     if PORT0:
-        PiSoC.GPIO[0] = []
+        board.GPIO[0] = []
         for i in range(8):
             if PORT0&(0x01<<i):
-                PiSoC.GPIO[0].append(i)
+                board.GPIO[0].append(i)
     if PORT2:
-        PiSoC.GPIO[2] = []
+        board.GPIO[2] = []
         for i in range(8):
             if PORT2&(0x01<<i):
-                PiSoC.GPIO[2].append(i)
+                board.GPIO[2].append(i)
     if PORT3:
-        PiSoC.GPIO[3] = []
+        board.GPIO[3] = []
         for i in range(8):
             if PORT3&(0x01<<i):
-                PiSoC.GPIO[3].append(i)
+                board.GPIO[3].append(i)
 
     if PORT4:
-        PiSoC.GPIO[4] = []
+        board.GPIO[4] = []
         for i in range(8):
             if PORT4&(0x01<<i):
-                PiSoC.GPIO[4].append(i)
+                board.GPIO[4].append(i)
 
     if PORT5:
-        PiSoC.GPIO[5] = []
+        board.GPIO[5] = []
         for i in range(8):
             if PORT5&(0x01<<i):
-                PiSoC.GPIO[5].append(i)
+                board.GPIO[5].append(i)
     if PORT6:
-        PiSoC.GPIO[6] = []
+        board.GPIO[6] = []
         for i in range(8):
             if PORT6&(0x01<<i):
-                PiSoC.GPIO[6].append(i)
+                board.GPIO[6].append(i)
     if PORT12:
-        PiSoC.GPIO[12] = []
+        board.GPIO[12] = []
         for i in range(8):
             if PORT12&(0x01<<i):
-                PiSoC.GPIO[12].append(i)
+                board.GPIO[12].append(i)
 
     if PORT15:
-        PiSoC.GPIO[15] = []
+        board.GPIO[15] = []
         for i in range(8):
             if PORT15&(0x01<<i):
-                PiSoC.GPIO[15].append(i)
+                board.GPIO[15].append(i)
 
-    PWM_DAT = Match_Clocks(PiSoC.PWM_NUM)
+    if description is not None:
+        PWM_DAT = description[8 + board.PWM_CLK_NUM:]
+    else:
+        PWM_DAT = Match_Clocks(board.PWM_NUM, board)
 
     num = -1
     for i in PWM_DAT:
@@ -442,56 +860,245 @@ def build_info():
             num+=1
             res =16*((i >> (4 + 5*j)&0x01) == 1) + 8*((i >> (4 + 5*j)&0x01) == 0)
             if (i>>j*5)&0x0F:
-                PiSoC.PWM_clks[(i>>j*5)&0x0F][2].append([num,res])
-
-    PiSoC.FIRMWARE_VERSION = Get_Firmware_Version()
+                board.PWM_clks[(i>>j*5)&0x0F][2].append([num,res])
 
+    if description is not None:
+        board.FIRMWARE_VERSION = "%r.%r"%(version>>8, version&0xFF)
+        Set_Features(features, board)
+    else:
+        board.FIRMWARE_VERSION = Get_Firmware_Version(board)
+        Check_Features(board)
+    if hasattr(board.commChannel, 'set_framed'):
+        board.commChannel.set_framed(bool(board.FEATURES&PiSoC.FEATURE_FRAMED))
+    log_info(board)
+
+def log_info(board = None):
+    if board is None:
+        board = PiSoC
     #formatting info into readable format.
-    firmware_str = '====================\nINFO\n====================\n\rFIRMWARE VERSION: %s'%PiSoC.FIRMWARE_VERSION
+    firmware_str = '====================\nINFO\n====================\n\rFIRMWARE VERSION: %s'%board.FIRMWARE_VERSION
     GPIO_str = '====================\nGPIO\n====================\n\rGPIO FOUND:'
-    for key in sorted(PiSoC.GPIO):
-            for value in PiSoC.GPIO[key]:
+    for key in sorted(board.GPIO):
+            for value in board.GPIO[key]:
                 GPIO_str+='\n\r\tP%d[%d]'%(key,value)
-    PWM_str = '\n====================\nPWM\n====================\n\r%d PWM CHANNELS FOUND\n\r%d PWM CLOCKS FOUND'%(PiSoC.PWM_NUM,PiSoC.PWM_CLK_NUM)
-    for key in PiSoC.PWM_clks:
-            PWM_str+='\n\rPWM CLOCK %d:\n\tSource Frequency  :\t%d\t(Hz)\n\tDefault Divider   :\t%d\n\tStarting Frequency:\t%d\t\t(Hz)\n\r\tPWM channels sharing this clock:'%(key, PiSoC.PWM_clks[key][0],PiSoC.PWM_clks[key][1], PiSoC.PWM_clks[key][0]/PiSoC.PWM_clks[key][1])
-            for i in PiSoC.PWM_clks[key][2]:
+    PWM_str = '\n====================\nPWM\n====================\n\r%d PWM CHANNELS FOUND\n\r%d PWM CLOCKS FOUND'%(board.PWM_NUM,board.PWM_CLK_NUM)
+    for key in board.PWM_clks:
+            PWM_str+='\n\rPWM CLOCK %d:\n\tSource Frequency  :\t%d\t(Hz)\n\tDefault Divider   :\t%d\n\tStarting Frequency:\t%d\t\t(Hz)\n\r\tPWM channels sharing this clock:'%(key, board.PWM_clks[key][0],board.PWM_clks[key][1], board.PWM_clks[key][0]/board.PWM_clks[key][1])
+            for i in board.PWM_clks[key][2]:
                 PWM_str+='\n\r\t\tPWM_%d (%d-bit resolution)' %(i[0]+1, i[1])
     
     analog_str = '====================\nANALOG\n===================='
-    analog_str+=('\n\rDELSIG ADC: \tFOUND', '\n\rDELSIG ADC: \tNOT FOUND')[not PiSoC.DELSIG]
-    analog_str+=('\n\rSAR0 ADC: \tFOUND', '\n\rSAR0 ADC: \tNOT FOUND')[not PiSoC.SAR0]
-    analog_str+=('\n\rSAR1 ADC: \tFOUND', '\n\rSAR1 ADC: \tNOT FOUND')[not PiSoC.SAR1]
-    analog_str+=('\n\rVDAC0: \t\tFOUND\t(%.3fV full scale range)'%PiSoC.VDAC0_RANGE, '\n\rVDAC0: \t\tNOT FOUND')[not PiSoC.VDAC0]
-    analog_str+=('\n\rVDAC1: \t\tFOUND\t(%.3fV full scale range)'%PiSoC.VDAC1_RANGE, '\n\rVDAC1: \t\tNOT FOUND')[not PiSoC.VDAC1]
-    analog_str+=('\n\rIDAC0: \t\tFOUND\t(%.3fmA full scale range)'%PiSoC.IDAC0_RANGE,'\n\rIDAC0: \t\tNOT FOUND')[not PiSoC.IDAC0]
-    analog_str+=('\n\rIDAC1: \t\tFOUND\t(%.3fmA full scale range)'%PiSoC.IDAC1_RANGE,'\n\rIDAC1: \t\tNOT FOUND')[not PiSoC.IDAC1]
-    analog_str+=('\n\rWAVEDAC: \tFOUND','\n\rWAVEDAC: \tNOT FOUND')[not PiSoC.WAVEDAC]
-    analog_str+= '\n\r%d ANALOG PINS FOUND ON SEQUENCED SAR ADC'%PiSoC.ANALOG_IN_NUM
-    analog_str+= '\n\r%d CAPSENSE SENSORS FOUND'%PiSoC.CAPSENSE_SENSOR_NUM
+    analog_str+=('\n\rDELSIG ADC: \tFOUND', '\n\rDELSIG ADC: \tNOT FOUND')[not board.DELSIG]
+    analog_str+=('\n\rSAR0 ADC: \tFOUND', '\n\rSAR0 ADC: \tNOT FOUND')[not board.SAR0]
+    analog_str+=('\n\rSAR1 ADC: \tFOUND', '\n\rSAR1 ADC: \tNOT FOUND')[not board.SAR1]
+    analog_str+=('\n\rVDAC0: \t\tFOUND\t(%.3fV full scale range)'%board.VDAC0_RANGE, '\n\rVDAC0: \t\tNOT FOUND')[not board.VDAC0]
+    analog_str+=('\n\rVDAC1: \t\tFOUND\t(%.3fV full scale range)'%board.VDAC1_RANGE, '\n\rVDAC1: \t\tNOT FOUND')[not board.VDAC1]
+    analog_str+=('\n\rIDAC0: \t\tFOUND\t(%.3fmA full scale range)'%board.IDAC0_RANGE,'\n\rIDAC0: \t\tNOT FOUND')[not board.IDAC0]
+    analog_str+=('\n\rIDAC1: \t\tFOUND\t(%.3fmA full scale range)'%board.IDAC1_RANGE,'\n\rIDAC1: \t\tNOT FOUND')[not board.IDAC1]
+    analog_str+=('\n\rWAVEDAC: \tFOUND','\n\rWAVEDAC: \tNOT FOUND')[not board.WAVEDAC]
+    analog_str+= '\n\r%d ANALOG PINS FOUND ON SEQUENCED SAR ADC'%board.ANALOG_IN_NUM
+    analog_str+= '\n\r%d CAPSENSE SENSORS FOUND'%board.CAPSENSE_SENSOR_NUM
     
     logging.info(firmware_str)
     logging.info(GPIO_str)
     logging.info(PWM_str)
     logging.info(analog_str)
     
-def Get_Firmware_Version():
+def restore_info(board = None):
+    """
+    :Function: restore_info
+
+    :Description: Learns what is on the PiSoC, like :func:`build_info`, but first looks for a description of the same device saved in :attr:`PiSoC.TOPOLOGY_CACHE` by an earlier connection.
+        The saved description is used if the fingerprint of the firmware build, which is read with a single request, still matches; otherwise :func:`build_info` runs and its result is saved.
+
+    :param board: The session to learn about. Defaults to the :class:`PiSoC` class.
+    :type board: PiSoC
+
+    :returns: None
+    """
+    if board is None:
+        board = PiSoC
+    key = device_key(board.commChannel)
+    entries = read_topology_cache() if key is not None else dict()
+    entry = entries.get(key)
+    if entry is not None:
+        if hasattr(board.commChannel, 'set_framed'): #the PiSoC may still be sending framed responses to a previous connection
+            board.commChannel.set_framed(False)
+        if Get_Fingerprint(board) == entry['fingerprint']:
+            logging.debug('Using the saved description of the PiSoC at %s'%key)
+            apply_topology(entry['topology'], board)
+            board.FINGERPRINT = None if isinstance(entry['fingerprint'], list) else entry['fingerprint'] #older firmware is told apart by several words, which are only kept in the cache
+            if hasattr(board.commChannel, 'set_framed'):
+                board.commChannel.set_framed(bool(board.FEATURES&PiSoC.FEATURE_FRAMED))
+            log_info(board)
+            return
+        logging.debug('The saved description of the PiSoC at %s is out of date'%key)
+    build_info(board)
+    if key is not None:
+        fingerprint = board.FINGERPRINT if board.FINGERPRINT is not None else Get_Fingerprint(board) #build_info has it if the PiSoC described itself
+        board.FINGERPRINT = None if isinstance(fingerprint, list) else fingerprint
+        entries[key] = {'fingerprint': fingerprint, 'topology': get_topology(board)}
+        write_topology_cache(entries)
+
+def device_key(channel):
+    """
+    :Function: device_key
+
+    :Description: Names the device a transport is connected to, for :func:`restore_info`. USB devices are named by their serial number, when they report one, so the name survives a change of port.
+
+    :returns: str, or None for transports which cannot name their device
+    """
+    hwid = getattr(channel, 'hwid', None)
+    if hwid:
+        serial = re.search(r'SER=(\S+)', hwid)
+        return 'usb:%s'%(serial.group(1) if serial else hwid)
+    if isinstance(channel, I2C):
+        return 'i2c:%#x'%channel.addr
+    if isinstance(channel, SPI):
+        return 'spi:%s'%channel.com
+    com = getattr(channel, 'com', None)
+    return 'serial:%s'%com if com else None
+
+def read_topology_cache():
+    if not PiSoC.TOPOLOGY_CACHE or not os.path.exists(PiSoC.TOPOLOGY_CACHE):
+        return dict()
+    import json
+    try:
+        with open(PiSoC.TOPOLOGY_CACHE) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logging.debug('Could not read %s: %s'%(PiSoC.TOPOLOGY_CACHE, e))
+        return dict()
+
+def write_topology_cache(entries):
+    if not PiSoC.TOPOLOGY_CACHE:
+        return
+    import json
+    try:
+        folder = os.path.dirname(PiSoC.TOPOLOGY_CACHE)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        tmp = '%s.%d'%(PiSoC.TOPOLOGY_CACHE, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(entries, f)
+        os.rename(tmp, PiSoC.TOPOLOGY_CACHE) #another process may be reading it
+    except (IOError, OSError) as e:
+        logging.debug('Could not save %s: %s'%(PiSoC.TOPOLOGY_CACHE, e))
+
+TOPOLOGY = ('FIRMWARE_VERSION', 'FEATURES', 'RX_QUEUE_DEPTH', 'GPIO', 'PWM_NUM', 'PWM_CLK_NUM', 'PWM_clks', 'DELSIG', 'SAR0', 'SAR1', 'VDAC0', 'VDAC1', 'IDAC0', 'IDAC1', 'WAVEDAC',
+            'VDAC0_RANGE', 'VDAC1_RANGE', 'IDAC0_RANGE', 'IDAC1_RANGE', 'ANALOG_IN_NUM', 'CAPSENSE_SENSOR_NUM')
+
+def get_topology(board = None):
+    """
+    :Function: get_topology
+
+    :Description: Collects what :func:`build_info` learned about the PiSoC, so that it can be handed to another process or saved.
+
+    :param board: The session to collect from. Defaults to the :class:`PiSoC` class.
+    :type board: PiSoC
+
+    :returns: dict of the :class:`PiSoC` attributes named in :data:`TOPOLOGY`, which can be encoded as JSON
+    """
+    if board is None:
+        board = PiSoC
+    return dict((name, getattr(board, name)) for name in TOPOLOGY)
+
+def apply_topology(topology, board = None):
+    """
+    :Function: apply_topology
+
+    :Description: Sets the :class:`PiSoC` attributes normally found by :func:`build_info` from a dict made by :func:`get_topology`, without talking to the PiSoC.
+        Dictionary keys which were turned into strings by JSON are turned back into port and clock numbers.
+
+    :param topology: dict made by :func:`get_topology`
+    :type topology: dict
+
+    :param board: The session to set them on. Defaults to the :class:`PiSoC` class.
+    :type board: PiSoC
+
+    :returns: None
+    """
+    if board is None:
+        board = PiSoC
+    board.REGISTERS_IN_USE = []
+    for name in TOPOLOGY:
+        value = topology[name]
+        if name in ('GPIO', 'PWM_clks'):
+            value = dict((int(k), v) for k, v in value.items())
+        setattr(board, name, value)
+
+def Get_Firmware_Version(board = None):
+    if board is None:
+        board = PiSoC
     addr = PiSoC.CHECK_BUILD
     cmd = 0x09
-    result = PiSoC.commChannel.receive_data(addr, cmd)
+    result = board.commChannel.receive_data(addr, cmd)
     return "%r.%r"%(result>>8, result&0xFF)
 
-def Check_Analog():
+def Get_Fingerprint(board = None):
+    if board is None:
+        board = PiSoC
+    addr = PiSoC.CHECK_BUILD
+    cmd = 0x0D
+    result = board.commChannel.receive_data(addr, cmd)
+    if result == PiSoC.BAD_PARAM: #firmware without fingerprints; its version, analog and PWM words have to do.
+        return [board.commChannel.receive_data(addr, cmd) for cmd in (0x09, 0x00, 0x01)]
+    return result
+
+def Check_Features(board = None):
+    if board is None:
+        board = PiSoC
+    addr = PiSoC.CHECK_BUILD
+    cmd = 0x0B
+    return Set_Features(board.commChannel.receive_data(addr, cmd), board)
+
+def Set_Features(result, board = None):
+    if board is None:
+        board = PiSoC
+    if result == PiSoC.BAD_PARAM: #firmware older than 2.1 does not know this command.
+        result = 0
+    board.FEATURES = result&0xFFFF
+    board.RX_QUEUE_DEPTH = max((result>>16)&0xFF, 1)
+    return board.FEATURES
+
+def Describe_Board(board = None):
+    """
+    :Function: Describe_Board
+
+    :Description: Asks the PiSoC to describe its build with CheckBuild 0x0E, which answers with the words that the other CheckBuild queries would return, in one response.
+        Firmware which does not know the query, and the I2C transport, whose responses are a single word, fall back to those queries.
+
+    :param board: The session to ask. Defaults to the :class:`PiSoC` class.
+    :type board: PiSoC
+
+    :returns: The words for queries 0x00, 0x01, 0x02, 0x03, 0x04, 0x09, 0x0B and 0x0D, then one 0x07 word per PWM clock and one 0x08 word per 4 PWM channels. None if the PiSoC cannot describe itself.
+    """
+    if board is None:
+        board = PiSoC
+    if not hasattr(board.commChannel, 'receive_block'):
+        return None
+    words = board.commChannel.receive_block(PiSoC.CHECK_BUILD, 0x0E)
+    if words == PiSoC.BAD_PARAM or not isinstance(words, list) or len(words) < 8:
+        return None
+    return words
+
+def Check_Analog(board = None):
+    if board is None:
+        board = PiSoC
     addr = PiSoC.CHECK_BUILD
     cmd = 0x00
-    return PiSoC.commChannel.receive_data(addr,cmd)
+    return board.commChannel.receive_data(addr,cmd)
 
-def Check_PWM():
+def Check_PWM(board = None):
+    if board is None:
+        board = PiSoC
     addr = PiSoC.CHECK_BUILD
     cmd = 0x01
-    return PiSoC.commChannel.receive_data(addr,cmd)
+    return board.commChannel.receive_data(addr,cmd)
 
-def Check_GPIO(block):
+def Check_GPIO(block, board = None):
+    if board is None:
+        board = PiSoC
     if block == 0:
         cmd = 0x02
     elif block == 1:
@@ -499,22 +1106,26 @@ def Check_GPIO(block):
     elif block == 2:
         cmd = 0x04
     addr = PiSoC.CHECK_BUILD
-    return PiSoC.commChannel.receive_data(addr,cmd)
+    return board.commChannel.receive_data(addr,cmd)
 
-def Get_Clocks(clk_num):
+def Get_Clocks(clk_num, board = None):
+    if board is None:
+        board = PiSoC
     addr = PiSoC.CHECK_BUILD
     cmd = 0x07
     clk_dat = []
     for i in range(clk_num):
-        clk_dat.append(PiSoC.commChannel.receive_data(addr, cmd, i))
+        clk_dat.append(board.commChannel.receive_data(addr, cmd, i))
     return clk_dat
 
-def Match_Clocks(val):
+def Match_Clocks(val, board = None):
+    if board is None:
+        board = PiSoC
     addr = PiSoC.CHECK_BUILD
     cmd = 0x08
     dat = []
-    for i in range(int(val)/4 + (int(val)%4>0)):
-        dat.append(PiSoC.commChannel.receive_data(addr, cmd, i))
+    for i in range(int(val)//4 + (int(val)%4>0)):
+        dat.append(board.commChannel.receive_data(addr, cmd, i))
     return dat
 
 def Test_Read(*args, **kwargs):
@@ -529,6 +1140,9 @@ def Test_Read(*args, **kwargs):
     :param index: the index of *args* containing the element that should be echoed back. Defaults to 0.
     :type index: int
 
+    :param board: the session to test. Defaults to the :class:`PiSoC` class.
+    :type board: PiSoC
+
     :returns: The data returned from the PiSoC; if transmission of *args* was successful, the return value should be args[index].
 
     :Example:
@@ -544,12 +1158,110 @@ def Test_Read(*args, **kwargs):
         
     """
     index = kwargs.get('index', 0)
-    echo = PiSoC.commChannel.receive_data(PiSoC.TEST_REGISTER, index, *args, Hformat = [])
+    board = kwargs.get('board', PiSoC)
+    echo = board.commChannel.receive_data(PiSoC.TEST_REGISTER, index, *args, Hformat = [])
     return echo
 
 
+class Batch(object):
+    """
+    :Class:
+
+        Collects writes to the PiSoC so that several of them can be sent as one frame to :attr:`PiSoC.BATCH_REGISTER`. It is created with :meth:`PiSoC.batch`, and
+        stands in for the session's :attr:`PiSoC.commChannel` while its *with* block runs. A frame carries at most :attr:`PiSoC.MAX_BATCH_COMMANDS` commands and :attr:`PiSoC.MAX_BATCH_SIZE` bytes;
+        larger batches are split over as many frames as are needed.
+
+        If the firmware does not support batches, writes are sent one at a time as usual.
+    """
+    def __init__(self, board = None):
+        self.board = PiSoC if board is None else board
+        self.channel = None
+        self.commands = []
+        self.size = 2
+
+    def __enter__(self):
+        self.channel = self.board.commChannel
+        self.board.commChannel = self
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.flush()
+        finally:
+            self.board.commChannel = self.channel
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Adds a write to the batch. The batch is sent first if this write would not fit in the same frame.
+
+        :param args: Ordered list of data to be sent to the pisoc, as for :meth:`UART.send_data`
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :returns: None
+        """
+        if not self.board.FEATURES&PiSoC.FEATURE_BATCH or args[0] in (PiSoC.RESET_ADDRESS, PiSoC.BATCH_REGISTER):
+            self.flush()
+            return self.channel.send_data(*args, **kwargs)
+        frame = PrepareData(*args, Hformat = kwargs.get('Hformat', [2]))[1:] #keep the length prefix, drop the keyword
+        if len(self.commands) >= PiSoC.MAX_BATCH_COMMANDS or self.size + len(frame) > PiSoC.MAX_BATCH_SIZE:
+            self.flush()
+        self.commands.append((args, kwargs, frame))
+        self.size += len(frame)
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Sends any writes which are waiting in the batch, and then sends a request for data to the PiSoC.
+
+        :param args: Ordered list of data to be sent to the pisoc, as for :meth:`UART.receive_data`
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :returns: The response from the PiSoC
+        """
+        self.flush()
+        return self.channel.receive_data(*args, **kwargs)
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Sends the writes collected so far as one frame, and logs a warning for each of them which the PiSoC rejected.
+
+        :returns: None
+        """
+        commands = self.commands
+        self.commands = []
+        self.size = 2
+        if not commands:
+            return
+        if len(commands) == 1:
+            args, kwargs, frame = commands[0]
+            self.channel.send_data(*args, **kwargs)
+            return
+        data = [PiSoC.BATCH_REGISTER, len(commands)]
+        for args, kwargs, frame in commands:
+            data+=frame
+        result = self.channel.receive_data(*data, Hformat = [])
+        if result == PiSoC.BAD_PARAM:
+            count, failures = 0, 0
+        else:
+            count, failures = (result>>16)&0xFF, result&0xFFFF
+        for i in range(len(commands)):
+            if i >= count or failures&(0x01<<i):
+                logging.warning("Sent:%s\n\rin a batch, which was rejected by the PiSoC" %(','.join([hex(c) for c in list(commands[i][0])])))
+
+
 class UART(object):
-    
+
+    metrics = None
+
     def __init__(self, com = "/dev/ttyAMA0", baudr = 115200):
         """
         :Method: __init__
@@ -559,7 +1271,7 @@ class UART(object):
         :param com: Serial port to be used for communication. Defaults to /dev/ttyAMA0
         :type com: str
 
-        :param baud: Baud rate to be used. Defaults to 115200, which is required for use with the default firmware. This can be changed, but will only work desireably with adjusted firmware.
+        :param baud: Baud rate to be used. Defaults to 115200, which is the rate the PiSoC starts at. Faster rates are agreed with the PiSoC by :meth:`negotiate_baud`.
         :type baud: int
 
         :returns: None
@@ -572,6 +1284,9 @@ class UART(object):
         self.com = com
         self.baudr = baudr
         self.ser = self.serial.Serial(self.com, self.baudr)        
+        self.encoder = FrameEncoder()
+        from pisoc.pipeline import ResponsePipeline
+        self.pipeline = ResponsePipeline(self.ser, encoder = self.encoder)
 
     def send_data(self, *args, **kwargs):
         """
@@ -588,12 +1303,21 @@ class UART(object):
         :returns: None
         """
         Hfmt = kwargs.get('Hformat', [2])
-        data = PrepareData(*args, Hformat = Hfmt)
+        if self.pipeline.unacked:
+            self.pipeline.post(self.encoder.encode(args, Hfmt, PiSoC.UNACKED_MAGIC).tobytes())
+            return
+        data = self.encoder.encode(args, Hfmt).tobytes()
+
+        if self.pipeline.window > 1 or self.pipeline.framed or self.pipeline.pending: #requests in flight, such as an AsyncTransport's, must not be flushed away
+            slot = self.pipeline.submit(data, args, check = True)
+            if self.pipeline.window == 1:
+                self.pipeline.wait(slot)
+            return
 
         if self.ser.inWaiting()>0: 
             self.ser.flushInput()
 
-        self.ser.write(''.join([chr(c) for c in data]))
+        self.ser.write(data)
         data_packet = self.ser.read(4)
 
         resp = struct.unpack('I', data_packet)[0]
@@ -602,10 +1326,14 @@ class UART(object):
         if resp != PiSoC.GOOD:
             recursive_call = kwargs.get('recursive_calls', 0)
             logging.debug("Sent:%s\n\rGot: %s (%s) in send_data which likely indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)))
+            if self.metrics is not None:
+                self.metrics.note(args, 'bad_param')
             if self.ser.inWaiting()>0:
                 self.ser.read(self.ser.inWaiting()) #flush input by popping existing data from the buffer..
             if recursive_call<=1:
                 recursive_call+=1
+                if self.metrics is not None:
+                    self.metrics.note(args, 'retries')
                 self.send_data(*args, recursive_calls = recursive_call)
             else:
                 return
@@ -626,10 +1354,14 @@ class UART(object):
         """
         delay = kwargs.get('delay', None)
         Hfmt = kwargs.get('Hformat', [2])
-        data = PrepareData(*args, Hformat = Hfmt)
+        if self.pipeline.unsynced:
+            self.pipeline.sync()
+        data = self.encoder.encode(args, Hfmt).tobytes()
+        if self.pipeline.window > 1 or self.pipeline.framed or self.pipeline.pending: #requests in flight, such as an AsyncTransport's, must not be flushed away
+            return self.pipeline.wait(self.pipeline.submit(data, args))
         if self.ser.inWaiting()>0: 
             self.ser.flushInput()
-        self.ser.write(''.join([chr(c) for c in data]))
+        self.ser.write(data)
         data_packet = self.ser.read(4)
         resp = struct.unpack('I', data_packet)[0]
         resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
@@ -637,146 +1369,568 @@ class UART(object):
             logging.warning( "Sent:%s\n\rGot: %s (%s) in receive_data which indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)) )
         return resp
 
+    def receive_block(self, *args, **kwargs):
+        """
+        :Method: receive_block
+
+        :Description: Sends a command whose response is a count of 32-bit words, followed by that many words. Such responses are only sent over the UART and USB UART; see CheckBuild 0x0E.
 
-    def cleanup(self):
+        :param args: The command, as for :meth:`receive_data`
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :param Hformat: list of indices of args that should be formatted as unsigned short. Defaults to [2].
+        :type Hformat: list
+
+        :returns: The list of words, or :attr:`PiSoC.BAD_PARAM` if the PiSoC does not know the command
         """
-        :Method: cleanup
+        if self.pipeline.unsynced:
+            self.pipeline.sync()
+        data = self.encoder.encode(args, kwargs.get('Hformat', [2])).tobytes()
+        return self.pipeline.wait(self.pipeline.submit(data, args, block = True))
 
-        :Description: Forces a software reset on the PiSoC and then closes and cleans up the serial port        
+    def set_window(self, window):
+        """
+        :Method: set_window
 
-        :returns: None
+        :Description: Sets how many requests may be in flight at once. With a window larger than 1, :meth:`send_data` returns as soon as its frame is written, and responses are checked as they are read back.
+            A failed write is logged, but is not retried, since retrying it after later writes would reorder them.
+
+        :param window: Number of requests which may be waiting for a response
+        :type window: int
+
+        :returns: The window which will actually be used; see :meth:`~pisoc.pipeline.ResponsePipeline.resize`
         """
-        self.send_data(0xFF,0xFF)
-        PiSoC.REGISTERS_IN_USE = []
-        self.ser.close()
+        return self.pipeline.resize(window)
 
-class I2C(object):
+    def set_framed(self, framed, checked = None):
+        """
+        :Method: set_framed
 
-        
-    def __init__(self, addr = 0x07):
-		
-        try:
-		    self.smbus = __import__('smbus')
-        except:
-		    raise ImportError("Need python-smbus for i2c backend for pisoc.")
-        self.addr = addr
-        self.bus = self.smbus.SMBus(1) 
-        
-        time.sleep(0.1)
-        
-    def send_data(self, *args, **kwargs):
-        Hfmt = kwargs.get('Hformat', [2])
-        data = PrepareData(*args, Hformat = Hfmt)[2:]
-        
-        self.bus.write_i2c_block_data(self.addr, PiSoC.I2C_DATA_OFFSET, data)
-        self.bus.write_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET, PiSoC.I2C_SIGNAL) #Signal the PiSoC that we want to give it new data.
-        
-        ans = PiSoC.I2C_SIGNAL
-        while ans == PiSoC.I2C_SIGNAL:
-			ans = self.bus.read_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET) #waiting for a response...
-			
-        if ans!=PiSoC.I2C_DONE: #something went wrong... Lets make sure..
-			time.sleep(0.001)
-			ans = self.bus.read_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET) #waiting for a response...
-        else: #we are good.
-			data_packet = self.bus.read_i2c_block_data(self.addr, PiSoC.I2C_RESPONSE_OFFSET, 4)
-			resp = struct.unpack('I', ''.join([chr(c) for c in data_packet]))[0]
-			resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
-			if resp != PiSoC.GOOD:
-				recursive_call = kwargs.get('recursive_calls', 0)
-				logging.debug("Sent:%s\n\rGot: %s (%s) in send_data which likely indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)))
-				if recursive_call<=1:
-					recursive_call+=1
-					self.send_data(*args, recursive_calls = recursive_call)
-				else:
-					return
-        if ans == PiSoC.I2C_BAD:
-			recursive_call = kwargs.get('recursive_calls', 0)
-			if recursive_call<=1:
-				recursive_call+=1
-				self.send_data(*args, recursive_calls = recursive_call)
-			else:
-				raise ValueError("PiSoC flagged packet as bad.")
+        :Description: Turns framed responses on or off. With framing on, stale data in the port is skipped rather than flushed before each command. This is done by :func:`build_info` when the firmware supports it.
 
-    def receive_data(self, *args, **kwargs):
+        :param framed: True to frame responses
+        :type framed: bool
+
+        :param checked: True to also give frames in both directions a sequence number and a CRC. The last choice is kept if None.
+        :type checked: bool
+
+        :returns: True if responses are now framed; see :meth:`~pisoc.pipeline.ResponsePipeline.set_framed`
         """
+        return self.pipeline.set_framed(framed, checked)
+
+    def set_unacked(self, unacked):
         """
-        delay = kwargs.get('delay', None)
-        Hfmt = kwargs.get('Hformat', [2])
-        data = PrepareData(*args, Hformat = Hfmt)[2:]
-        
-        self.bus.write_i2c_block_data(self.addr, PiSoC.I2C_DATA_OFFSET, data)
-        self.bus.write_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET, PiSoC.I2C_SIGNAL) #Signal the PiSoC that we want to give it new data.
-        ans = PiSoC.I2C_SIGNAL
-        while ans == PiSoC.I2C_SIGNAL:
-			ans = self.bus.read_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET) #waiting for a response...
-			
-        if ans!=PiSoC.I2C_DONE: #something went wrong... Lets make sure..
-			time.sleep(0.001)
-			ans = self.bus.read_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET) #waiting for a response...
-        else: #we are good.
-			data_packet = self.bus.read_i2c_block_data(self.addr, PiSoC.I2C_RESPONSE_OFFSET, 4)
-			resp = struct.unpack('I', ''.join([chr(c) for c in data_packet]))[0]
-			resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
-			if resp == PiSoC.BAD_PARAM:
-				logging.warning( "Sent:%s\n\rGot: %s (%s) in receive_data which indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)) )
-			return resp
-        if ans == PiSoC.I2C_BAD:
-			recursive_call = kwargs.get('recursive_calls', 0)
-			if recursive_call<=1:
-				recursive_call+=1
-				self.send_data(*args, recursive_calls = recursive_call)
-			else:
-				raise ValueError("PiSoC flagged packet as bad.")
-			
+        :Method: set_unacked
 
+        :Description: Turns unacknowledged writes on or off. While they are on, :meth:`send_data` returns as soon as its frame is written, and the PiSoC does not answer it.
+            Writes which failed are counted by the PiSoC, and are reported by :meth:`sync`, which is also done before every read.
 
-class USB_UART(object):
-    """
-    :Class:
+        :param unacked: True to stop waiting for writes to be acknowledged
+        :type unacked: bool
 
-        Provides a serial (USB UART) interface for communicating with the PiSoC
+        :returns: True if writes are now unacknowledged; see :meth:`~pisoc.pipeline.ResponsePipeline.set_unacked`
+        """
+        return self.pipeline.set_unacked(unacked)
 
-    :Note:
+    def negotiate_baud(self, rates = None):
+        """
+        :Method: negotiate_baud
 
-        pyserial 2.7 must be available to use this class
-    """
+        :Description: Switches to the fastest of *rates* which works with the PiSoC; see :meth:`set_baud`. Rates which are not faster than the one in use are not tried.
 
-    
-    def __init__(self, baudr = 9600):
+        :param rates: Baud rates to try, fastest first. Defaults to :attr:`PiSoC.BAUD_RATES`.
+        :type rates: list
+
+        :returns: The baud rate in use
         """
-        :Method: __init__
+        for baud in (PiSoC.BAUD_RATES if rates is None else rates):
+            if baud > self.baudr and self.set_baud(baud):
+                logging.info('Talking to the PiSoC at %d baud.'%baud)
+                break
+        return self.baudr
 
-        :Description: Constructs and initializes a USB_UART object. This is the default protocol for PC use. No serial port should need to be provided, as long as any required drivers are properly installed. This function should find the PiSoC automatically.
+    def set_baud(self, baud):
+        """
+        :Method: set_baud
 
-        :param baud: Baud rate to be used. Defaults to 9600, but can be any standard baud rate. (:math:`9600 * 2^n`)
-        :type baud: int
+        :Description: Switches the PiSoC's UART, and then the serial port, to *baud*. CheckBuild 0x10 proposes the rate, which the PiSoC switches to once it has answered, and the new rate
+            is checked with echoes of :func:`Test_Read` of :attr:`PiSoC.BAUD_ECHO`. If they all come back, CheckBuild 0x10 is sent again at the new rate to confirm it. Otherwise the port goes back
+            to the rate it was using and writes zeros, which the PiSoC sees as framing errors at the new rate; until a rate has been confirmed, the PiSoC goes back to its last rate on a framing error.
 
-        :returns: None
+        :param baud: Baud rate, which the PiSoC accepts if its clock can make it to within 2%
+        :type baud: int
 
+        :returns: True if *baud* is now in use
         """
+        if baud == self.baudr:
+            return True
+        if not self.pipeline.board.FEATURES&PiSoC.FEATURE_BAUD:
+            logging.warning('The firmware on this PiSoC cannot change its baud rate.')
+            return False
+        self.flush()
+        if self.receive_data(PiSoC.CHECK_BUILD, 0x10, baud//100) != PiSoC.GOOD:
+            logging.info('The PiSoC cannot run its UART at %d baud.'%baud)
+            return False
+        old, timeout = self.baudr, self.ser.timeout
+        self.ser.timeout = PiSoC.BAUD_TIMEOUT #a rate which does not work is noticed quickly
         try:
-			self.serial = __import__("serial")
-        except ImportError:
-			raise ImportError("Need pyserial version 2.7 to use a USBUART backend")
+            time.sleep(PiSoC.BAUD_SETTLE) #for the PiSoC to switch
+            self.ser.baudrate = baud
+            if self.echo() and self.receive_data(PiSoC.CHECK_BUILD, 0x10, baud//100) == PiSoC.GOOD:
+                self.baudr = baud
+                return True
+            logging.warning('The PiSoC did not answer at %d baud; going back to %d baud.'%(baud, old))
+            self.ser.baudrate = old
+            self.ser.write(bytes(bytearray(PiSoC.RESYNC_SIZE)))
+            time.sleep(PiSoC.BAUD_SETTLE)
+            self.ser.flushInput()
+            if not self.echo():
+                logging.error('The PiSoC did not answer at %d baud either.'%old)
+            return False
+        finally:
+            self.ser.timeout = timeout
 
+    def echo(self):
+        """
+        :Method: echo
+
+        :Description: Sends :attr:`PiSoC.BAUD_ECHO` to the PiSoC with :func:`Test_Read`, once for each byte, and checks that every byte comes back
+
+        :returns: True if every byte came back
+        """
         try:
-            plat = platform.platform()
-            if plat.find('Windows')!=-1:
-                self.lp = importlib.import_module("serial.tools.list_ports_windows")
-            elif plat.find('Linux')!=-1:
-                self.lp = importlib.import_module("serial.tools.list_ports_linux")
-            else:
-                self.lp = importlib.import_module("serial.tools.list_ports_osx")
+            for index, byte in enumerate(PiSoC.BAUD_ECHO):
+                if self.receive_data(PiSoC.TEST_REGISTER, index, *PiSoC.BAUD_ECHO, Hformat = []) != byte:
+                    return False
+        except struct.error: #the response was cut short by the port's timeout
+            self.ser.flushInput()
+            return False
+        return True
+
+    def sync(self):
+        """
+        :Method: sync
+
+        :Description: Waits until everything sent so far has been executed by the PiSoC, and reports the unacknowledged writes which failed
+
+        :returns: The number of unacknowledged writes which failed since the last sync; see :meth:`~pisoc.pipeline.ResponsePipeline.sync`
+        """
+        return self.pipeline.sync()
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Waits until every request sent so far has been answered by the PiSoC
+
+        :returns: None
+        """
+        self.pipeline.drain()
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Forces a software reset on the PiSoC and then closes and cleans up the serial port        
+
+        :returns: None
+        """
+        self.pipeline.drain()
+        self.ser.write(self.pipeline.frame(self.encoder.encode((0xFF, 0xFF), [2]).tobytes())) #the PiSoC resets without responding, so there is nothing to wait for
+        self.ser.close()
+
+class I2C(object):
+    """
+    :Class:
+
+        Provides an I2C interface for communicating with the PiSoC, whose EZI2C buffer holds a status byte at :attr:`PiSoC.I2C_STATUS_OFFSET`, the response at :attr:`PiSoC.I2C_RESPONSE_OFFSET`,
+        and the frame at :attr:`PiSoC.I2C_DATA_OFFSET`.
+
+        With smbus2, each command is written together with :attr:`PiSoC.I2C_SIGNAL` in one block write starting at the status byte, and the status and response are read back together in one
+        *i2c_rdwr* transaction. With python-smbus, the frame, the signal, the status and the response are each a transfer of their own.
+        Either way, the status is polled with a backoff which starts from how long the same command took the last time.
+    """
+
+    metrics = None
+
+    def __init__(self, addr = 0x07):
+
+        try:
+            self.smbus = __import__('smbus2')
+            self.i2c_msg = self.smbus.i2c_msg
         except ImportError:
-            raise ImportError("Using wrong version of pyserial.")
-        
+            try:
+                self.smbus = __import__('smbus')
+            except:
+                raise ImportError("Need python-smbus or smbus2 for i2c backend for pisoc.")
+            self.i2c_msg = None
+        self.addr = addr
+        self.bus = self.smbus.SMBus(1) 
+        self.clock = getattr(time, 'monotonic', time.time)
+        self.service = dict() #seconds each address and command took to execute, the last time it was sent
+
+        time.sleep(0.1)
+
+    def transfer(self, args, Hfmt):
+        """
+        :Method: transfer
+
+        :Description: Gives a command to the PiSoC, and polls its status until it has been executed. The first poll waits for most of the time the same command took last time, and later
+            polls back off from :attr:`PiSoC.I2C_POLL_MIN` to :attr:`PiSoC.I2C_POLL_MAX`. If the status has not changed after :attr:`PiSoC.I2C_TIMEOUT`, it is read once more and given up on.
+
+        :param args: The command, as for :meth:`receive_data`
+        :param Hfmt: list of indices of args that should be formatted as unsigned short
+        :type Hfmt: list
+
+        :returns: tuple of the status and the response, which is None unless the status is :attr:`PiSoC.I2C_DONE`
+        """
+        data = PrepareData(*args, Hformat = Hfmt)[2:]
+        key = tuple(args[:2])
+        start = self.clock()
+        if self.i2c_msg is not None:
+            self.bus.i2c_rdwr(self.i2c_msg.write(self.addr, [PiSoC.I2C_STATUS_OFFSET, PiSoC.I2C_SIGNAL, 0, 0, 0, 0, 0, 0, 0] + list(data)))
+        else:
+            self.bus.write_i2c_block_data(self.addr, PiSoC.I2C_DATA_OFFSET, data)
+            self.bus.write_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET, PiSoC.I2C_SIGNAL) #Signal the PiSoC that we want to give it new data.
+
+        delay = 0.8*self.service.get(key, 0)
+        while True:
+            if delay > 0:
+                time.sleep(delay)
+            ans, resp = self.read_status()
+            if ans != PiSoC.I2C_SIGNAL:
+                break
+            if self.clock() - start > PiSoC.I2C_TIMEOUT:
+                break
+            delay = min(max(2*delay, PiSoC.I2C_POLL_MIN), PiSoC.I2C_POLL_MAX)
+
+        if ans != PiSoC.I2C_DONE: #something went wrong... Lets make sure..
+            time.sleep(0.001)
+            ans, resp = self.read_status()
+        if ans == PiSoC.I2C_DONE:
+            self.service[key] = self.clock() - start
+            if resp is None:
+                data_packet = self.bus.read_i2c_block_data(self.addr, PiSoC.I2C_RESPONSE_OFFSET, 4)
+                resp = struct.unpack('I', bytes(bytearray(data_packet)))[0]
+            resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
+        else:
+            resp = None
+        return ans, resp
+
+    def read_status(self):
+        """
+        :Method: read_status
+
+        :Description: Reads the status byte, and with smbus2 the response after it in the same transaction
+
+        :returns: tuple of the status and the raw response, which is None if it was not read
+        """
+        if self.i2c_msg is None:
+            return self.bus.read_byte_data(self.addr, PiSoC.I2C_STATUS_OFFSET), None
+        read = self.i2c_msg.read(self.addr, PiSoC.I2C_RESPONSE_OFFSET + 4)
+        self.bus.i2c_rdwr(self.i2c_msg.write(self.addr, [PiSoC.I2C_STATUS_OFFSET]), read)
+        packet = bytearray(list(read))
+        return packet[0], struct.unpack('I', bytes(packet[PiSoC.I2C_RESPONSE_OFFSET:]))[0]
+
+    def send_data(self, *args, **kwargs):
+        Hfmt = kwargs.get('Hformat', [2])
+        ans, resp = self.transfer(args, Hfmt)
+
+        if ans == PiSoC.I2C_DONE and resp != PiSoC.GOOD:
+            recursive_call = kwargs.get('recursive_calls', 0)
+            logging.debug("Sent:%s\n\rGot: %s (%s) in send_data which likely indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)))
+            if self.metrics is not None:
+                self.metrics.note(args, 'bad_param')
+            if recursive_call<=1:
+                recursive_call+=1
+                if self.metrics is not None:
+                    self.metrics.note(args, 'retries')
+                self.send_data(*args, recursive_calls = recursive_call)
+            else:
+                return
+        if ans == PiSoC.I2C_BAD:
+            recursive_call = kwargs.get('recursive_calls', 0)
+            if recursive_call<=1:
+                recursive_call+=1
+                if self.metrics is not None:
+                    self.metrics.note(args, 'retries')
+                self.send_data(*args, recursive_calls = recursive_call)
+            else:
+                raise ValueError("PiSoC flagged packet as bad.")
+
+    def receive_data(self, *args, **kwargs):
+        """
+        """
+        delay = kwargs.get('delay', None)
+        Hfmt = kwargs.get('Hformat', [2])
+        ans, resp = self.transfer(args, Hfmt)
+
+        if ans == PiSoC.I2C_DONE:
+            if resp == PiSoC.BAD_PARAM:
+                logging.warning( "Sent:%s\n\rGot: %s (%s) in receive_data which indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)) )
+            return resp
+        if ans == PiSoC.I2C_BAD:
+            recursive_call = kwargs.get('recursive_calls', 0)
+            if recursive_call<=1:
+                recursive_call+=1
+                if self.metrics is not None:
+                    self.metrics.note(args, 'retries')
+                self.send_data(*args, recursive_calls = recursive_call)
+            else:
+                raise ValueError("PiSoC flagged packet as bad.")
+
+
+class SpiStream(object):
+    """
+    :Class:
+
+        Gives an spidev device the parts of the pyserial interface which :class:`~pisoc.pipeline.ResponsePipeline` uses, so that responses over SPI are matched to their requests as they are on the UART.
+
+        Every transfer is full duplex. While a frame is clocked in, the PiSoC clocks out :attr:`PiSoC.MAGIC` followed by the response to an earlier frame, if one is ready,
+        or otherwise its status register, which has :attr:`PiSoC.BUSY` set while a frame is being executed. Responses are kept, in order, until they are read.
+        A read which finds no response waiting clocks out transfers of zeros, which the PiSoC ignores, backing off from :attr:`PiSoC.SPI_POLL_MIN` to :attr:`PiSoC.SPI_POLL_MAX`.
+    """
+    def __init__(self, spi, timeout = PiSoC.SPI_TIMEOUT):
+        """
+        :Method: __init__
+
+        :param spi: An open spidev.SpiDev, or a stand-in such as :class:`~pisoc.emulator.VirtualSpiDev`
+
+        :param timeout: Seconds a read waits for a response before returning what it has
+        :type timeout: float
+        """
+        self.spi = spi
+        self.timeout = timeout
+        self.buf = bytearray()
+        self.transfers = 0
+        self.clock = getattr(time, 'monotonic', time.time)
+
+    def transfer(self, data):
+        """
+        :Method: transfer
+
+        :Description: Clocks *data* out to the PiSoC, padded with zeros to :attr:`PiSoC.SPI_TRANSFER_SIZE`, and keeps the response which is clocked in, if there is one
+
+        :returns: True if a response was clocked in
+        """
+        data = list(bytearray(data))
+        data+=[0]*(PiSoC.SPI_TRANSFER_SIZE - len(data))
+        miso = bytearray(self.spi.xfer2(data))
+        self.transfers+=1
+        if miso[0] != PiSoC.MAGIC:
+            return False
+        self.buf+=miso[1:PiSoC.SPI_TRANSFER_SIZE]
+        return True
+
+    def write(self, data):
+        self.transfer(data)
+        return len(data)
+
+    def read(self, size = 1):
+        start = self.clock()
+        delay = PiSoC.SPI_POLL_MIN
+        while len(self.buf) < size:
+            if self.transfer([]):
+                continue
+            if self.clock() - start > self.timeout:
+                break
+            time.sleep(delay)
+            delay = min(2*delay, PiSoC.SPI_POLL_MAX)
+        data = bytes(self.buf[:size])
+        del self.buf[:size]
+        return data
+
+    def inWaiting(self):
+        return len(self.buf)
+
+    def flushInput(self):
+        del self.buf[:]
+
+    def flushOutput(self):
+        pass
+
+    def close(self):
+        self.spi.close()
+
+
+class SPI(object):
+    """
+    :Class:
+
+        Provides an SPI interface for communicating with the PiSoC through spidev. Frames are the same as on the UART, and the response to each one is clocked out during the next transfer,
+        so with a window larger than 1 the link runs full duplex: a stream of writes takes one transfer each, and their acknowledgements come back while later frames are being sent.
+        With a window of 1, each command is followed by a transfer of zeros to collect its response. See :class:`SpiStream`.
+
+    :Note:
+
+        The PiSoC firmware must be built with USE_SPI
+    """
+
+    metrics = None
+
+    def __init__(self, com = '/dev/spidev0.0', speed = None, spi = None):
+        """
+        :Method: __init__
+
+        :Description: Constructs and initializes an SPI object
+
+        :param com: The spidev device the PiSoC is on. Defaults to /dev/spidev0.0
+        :type com: str
+
+        :param speed: Clock rate in Hz. Defaults to :attr:`PiSoC.SPI_SPEED`.
+        :type speed: int
+
+        :param spi: An spidev.SpiDev-like object to use instead of the spidev package, such as :class:`~pisoc.emulator.VirtualSpiDev`. It is opened on *com*.
+
+        :returns: None
+        """
+        if spi is None:
+            try:
+                spi = __import__('spidev').SpiDev()
+            except ImportError:
+                raise ImportError("SPI backend needs spidev installed for access to /dev/spidev.")
+        device = re.match(r'.*spidev(\d+)\.(\d+)$', com)
+        if device is None:
+            raise ValueError('%s is not an spidev device, such as /dev/spidev0.0'%com)
+        spi.open(int(device.group(1)), int(device.group(2)))
+        spi.max_speed_hz = speed or PiSoC.SPI_SPEED
+        spi.mode = PiSoC.SPI_MODE
+        self.com = com
+        self.speed = spi.max_speed_hz
+        self.spi = spi
+        self.ser = SpiStream(spi)
+        self.encoder = FrameEncoder()
+        from pisoc.pipeline import ResponsePipeline
+        self.pipeline = ResponsePipeline(self.ser, encoder = self.encoder)
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Sends data to the PiSoC, as :meth:`UART.send_data` does. With a window larger than 1, it returns once the frame has been clocked out, and the acknowledgement is checked
+            when it comes back during a later transfer.
+
+        :param args: a variable length of data to be transferred to the PiSoC (limited to 1 byte per element and a maximum of 55 bytes)
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :param Hformat: list of indices of args that should be formatted as unsigned short, independent of their length. Defaults to [2], as this is generally required.
+        :type Hformat: list
+
+        :returns: None
+        """
+        data = self.encoder.encode(args, kwargs.get('Hformat', [2])).tobytes()
+        slot = self.pipeline.submit(data, args, check = True)
+        if self.pipeline.window == 1:
+            self.pipeline.wait(slot)
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Sends a command, and waits for its response, as :meth:`UART.receive_data` does
+
+        :param args: a variable length of data to be transferred to the PiSoC (limited to 1 byte per element and a maximum of 55 bytes)
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :param Hformat: list of indices of args that should be formatted as unsigned short, independent of their length. Defaults to [2], as this is generally required.
+        :type Hformat: list
+
+        :returns: Unpacked data from the PiSoC, indicating the returned value
+        """
+        data = self.encoder.encode(args, kwargs.get('Hformat', [2])).tobytes()
+        return self.pipeline.wait(self.pipeline.submit(data, args))
+
+    def set_window(self, window):
+        """
+        :Method: set_window
+
+        :Description: Sets how many requests may be in flight at once; see :meth:`UART.set_window`
+
+        :returns: The window which will actually be used
+        """
+        return self.pipeline.resize(window)
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Waits until every request sent so far has been answered by the PiSoC
+
+        :returns: None
+        """
+        self.pipeline.drain()
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Forces a software reset on the PiSoC and then closes the spidev device
+
+        :returns: None
+        """
+        self.pipeline.drain()
+        self.ser.write(self.encoder.encode((0xFF, 0xFF), [2]).tobytes())
+        self.ser.close()
+
+
+def sysfs_read(path, name):
+    """
+    :Function: sysfs_read
+
+    :Description: Reads a sysfs attribute
 
+    :returns: str without its trailing newline, or None if the attribute does not exist
+    """
+    try:
+        with open(os.path.join(path, name)) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+class USB_UART(object):
+    """
+    :Class:
+
+        Provides a serial (USB UART) interface for communicating with the PiSoC
+
+    :Note:
+
+        pyserial 2.7 must be available to use this class
+    """
+
+    metrics = None
+    ports = dict() #the port each serial number was last found on, shared by every USB_UART; None stands for any PiSoC
+
+    def __init__(self, baudr = 9600, serial_number = None):
+        """
+        :Method: __init__
+
+        :Description: Constructs and initializes a USB_UART object. This is the default protocol for PC use. No serial port should need to be provided, as long as any required drivers are properly installed. This function should find the PiSoC automatically.
+
+        :param baud: Baud rate to be used. Defaults to 9600, but can be any standard baud rate. (:math:`9600 * 2^n`)
+        :type baud: int
+
+        :param serial_number: The USB serial number of the PiSoC to connect to. Any PiSoC is connected to if None.
+        :type serial_number: str
+
+        :returns: None
+
+        """
+        try:
+            self.serial = __import__("serial")
         except ImportError:
-            raise ImportError("Using wrong version of pyserial")
+            raise ImportError("Need pyserial version 2.7 to use a USBUART backend")
+        self.lp = None #the port lister, which is only loaded if sysfs cannot be used; see comports_find()
        
         self.baudr = baudr
+        self.serial_number = serial_number
         self.read_timeout = 2
+        self.lock = threading.RLock() #held while the port is reopened by the hot-plug watcher
+        self.watcher = None
+        self.encoder = FrameEncoder()
+        from pisoc.pipeline import ResponsePipeline
+        self.pipeline = ResponsePipeline(None, encoder = self.encoder)
         search_passed = self.find_device()
 
         if not search_passed:
@@ -787,7 +1941,7 @@ class USB_UART(object):
             if not hasattr(self, 'ser'):
                 logging.debug('No existing serial object found... Creating')
                 try:
-                    self.ser = self.serial.Serial(self.com, self.baudr, timeout = 4, writeTimeout = 4)
+                    self.ser = self.serial.Serial(self.com, self.baudr, timeout = self.read_timeout, writeTimeout = 4)
                 except:
                     logging.error("It looks like the port we need is already in use by another program...")
                     raise RuntimeError("It looks like the port we need is already in use by another program...")
@@ -797,11 +1951,12 @@ class USB_UART(object):
                 if self.ser.isOpen():
                     logging.debug('Serial object already opened. Reconnecting')
                     self.ser.close()
-                self.ser = self.serial.Serial(self.com, self.baudr, timeout = 4, writeTimeout = 4)
+                self.ser = self.serial.Serial(self.com, self.baudr, timeout = self.read_timeout, writeTimeout = 4)
                 time.sleep(0.1)
             if not self.ser.isOpen():
                 logging.debug('Port is not open. Attempting to force it open...')
                 self.ser.open()
+            self.pipeline.reset(self.ser)
             logging.debug('Serial connection is open.')
 
 
@@ -829,50 +1984,61 @@ class USB_UART(object):
             * :class:`LostConnection` 
 
         """
-        Hfmt = kwargs.get('Hformat', [2])
-        try:
-            if self.is_connected():
-                data = PrepareData(*args, Hformat = Hfmt)
-                self.ser.flushOutput()
-                self.ser.flushInput()
-                self.ser.write(data)
-                t_start = time.time()
-                while self.ser.inWaiting()<4:
-                    if time.time() - t_start > self.read_timeout:
+        with self.lock: #the hot-plug watcher may be replacing the port
+            Hfmt = kwargs.get('Hformat', [2])
+            try:
+                if self.is_connected():
+                    if self.pipeline.unacked:
+                        self.pipeline.post(self.encoder.encode(args, Hfmt, PiSoC.UNACKED_MAGIC).tobytes())
+                        return
+                    data = self.encoder.encode(args, Hfmt).tobytes()
+                    if self.pipeline.window > 1 or self.pipeline.framed or self.pipeline.pending: #requests in flight, such as an AsyncTransport's, must not be flushed away
+                        slot = self.pipeline.submit(data, args, check = True)
+                        if self.pipeline.window == 1:
+                            self.pipeline.wait(slot)
+                        return
+                    self.ser.flushOutput()
+                    self.ser.flushInput()
+                    self.ser.write(data)
+                    data_packet = self.ser.read(4) #blocks until the response arrives, or the port's timeout of read_timeout seconds passes
+                    if len(data_packet) < 4:
                         logging.debug("Lost connection to PiSoC temporarily.")
                         self.ser.flushInput()
                         self.ser.flushOutput()
-                        self.ser.flush()
-                data_packet = self.ser.read(4)
-                resp = struct.unpack('I', data_packet)[0]
-                resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
-                if resp != PiSoC.GOOD:
-                    recursive_call = kwargs.get('recursive_calls', 0)
-                    logging.warning("Sent:%s\n\rGot: %s (%s) in send_data which likely indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)))
-                    if self.ser.inWaiting()>0:
-                        self.ser.read(self.ser.inWaiting())
-                        if recursive_call>1:
-                            recursive_call+=1
-                            self.send_data(*args, recursive_calls = recursive_call)
+                        return
+                    resp = struct.unpack('I', data_packet)[0]
+                    resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
+                    if resp != PiSoC.GOOD:
+                        recursive_call = kwargs.get('recursive_calls', 0)
+                        logging.warning("Sent:%s\n\rGot: %s (%s) in send_data which likely indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp)))
+                        if self.metrics is not None:
+                            self.metrics.note(args, 'bad_param')
+                        if self.ser.inWaiting()>0:
+                            self.ser.read(self.ser.inWaiting())
+                            if recursive_call>1:
+                                recursive_call+=1
+                                if self.metrics is not None:
+                                    self.metrics.note(args, 'retries')
+                                self.send_data(*args, recursive_calls = recursive_call)
+                            else:
+                                return
+                else:
+                    try:
+                        self.ser.open()
+                        self.send_data(*args, Hformat = Hfmt)
+                    except AttributeError:
+                        logging.debug('No serial object exists- could not find PiSoC')
+                        if self.reconnect():
+                            loggin.debug('Successfully reconnected with pisoc')
+                            restore_info(self.pipeline.board)
                         else:
-                            return
-            else:
-                try:
-                    self.ser.open()
-                    self.send_data(*args, Hformat = Hfmt)
-                except AttributeError:
-                    logging.debug('No serial object exists- could not find PiSoC')
-                    if self.reconnect():
-                        loggin.debug('Successfully reconnected with pisoc')
-                        build_info()
-                    else:
-                        logging.debug('Cannot reconnect to pisoc')
-                except:
-                    self.ser.close()
-                    raise ClosedPortException("Can't open port for read/write")
-        except self.serial.SerialException:
-            self.ser.close()
-            raise LostConnection("Lost connection trying to write to device..")
+                            logging.debug('Cannot reconnect to pisoc')
+                    except:
+                        self.ser.close()
+                        raise ClosedPortException("Can't open port for read/write")
+            except self.serial.SerialException:
+                self.ser.close()
+                raise LostConnection("Lost connection trying to write to device..")
 
 
 
@@ -896,54 +2062,80 @@ class USB_UART(object):
             * :class:`LostConnection` 
 
         """
-        delay = kwargs.get('delay', None)
-        Hfmt = kwargs.get('Hformat', [2])
-        try:
-            if self.is_connected():
-                data = PrepareData(*args, Hformat = Hfmt)
-                self.ser.flushOutput()
-                self.ser.flushInput()
-                self.ser.write(data)
-                t_start = time.time()
-                while self.ser.inWaiting()<4:
-                    if time.time() - t_start > self.read_timeout:
+        with self.lock: #the hot-plug watcher may be replacing the port
+            delay = kwargs.get('delay', None)
+            Hfmt = kwargs.get('Hformat', [2])
+            try:
+                if self.is_connected():
+                    if self.pipeline.unsynced:
+                        self.pipeline.sync()
+                    data = self.encoder.encode(args, Hfmt).tobytes()
+                    if self.pipeline.window > 1 or self.pipeline.framed or self.pipeline.pending: #requests in flight, such as an AsyncTransport's, must not be flushed away
+                        return self.pipeline.wait(self.pipeline.submit(data, args))
+                    self.ser.flushOutput()
+                    self.ser.flushInput()
+                    self.ser.write(data)
+                    data_packet = self.ser.read(4) #blocks until the response arrives, or the port's timeout of read_timeout seconds passes
+                    if len(data_packet) < 4:
                         logging.debug("Lost connection to PiSoC temporarily.")
                         self.ser.close()
                         self.reconnect()
                         self.ser.flushInput()
                         self.ser.flushOutput()
-                        self.ser.flush()
+                        return PiSoC.BAD_PARAM
+                    try:
+                        resp = struct.unpack('I', data_packet)[0]
+                    except:
+                        logging.debug("Unpack data failed. Received %n bytes: %s"%(len(data_packet), ', '.join([c for c in data_packet])))
+                        return 0
+                    resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
+                    if resp == PiSoC.BAD_PARAM:
+                        logging.debug( "Sent:%s\n\rGot: %s (%s) in receive_data which indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp))) 
+                    return resp
+                else:
+                    try:
+                        self.ser.open()
+                        self.receive_data(*args, Hformat = Hfmt)
+                    except AttributeError:
+                        logging.debug('No existing connection with PiSoC found')
+                        if self.reconnect():
+                            logging.debug('successfully reconnected with pisoc')
+                            restore_info(self.pipeline.board)
+                        else:
+                            logging.debug('Cannot reconnect to pisoc')
+                        return 0
+                    except:
+                        self.ser.close()
+                        raise ClosedPortException("Can't open port for read/write")
+            except self.serial.SerialException:
+                self.ser.close()
+                raise LostConnection("Lost connection trying to read from device..")
 
+    def receive_block(self, *args, **kwargs):
+        """
+        :Method: receive_block
 
-                        return PiSoC.BAD_PARAM
-                data_packet = self.ser.read(4)
-                try:
-                    resp = struct.unpack('I', data_packet)[0]
-                except:
-                    logging.debug("Unpack data failed. Received %n bytes: %s"%(len(data_packet), ', '.join([c for c in data_packet])))
-                    return 0
-                resp = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
-                if resp == PiSoC.BAD_PARAM:
-                    logging.debug( "Sent:%s\n\rGot: %s (%s) in receive_data which indicates a bad parameter" %(','.join([hex(c) for c in list(args)]),str(int(resp)), hex(resp))) 
-                return resp
-            else:
-                try:
-                    self.ser.open()
-                    self.receive_data(*args, Hformat = Hfmt)
-                except AttributeError:
-                    logging.debug('No existing connection with PiSoC found')
-                    if self.reconnect():
-                        logging.debug('successfully reconnected with pisoc')
-                        build_info()
-                    else:
-                        logging.debug('Cannot reconnect to pisoc')
-                    return 0
-                except:
-                    self.ser.close()
-                    raise ClosedPortException("Can't open port for read/write")
-        except self.serial.SerialException:
-            self.ser.close()
-            raise LostConnection("Lost connection trying to read from device..")
+        :Description: Sends a command whose response is a count of 32-bit words, followed by that many words. Such responses are only sent over the UART and USB UART; see CheckBuild 0x0E.
+
+        :param args: The command, as for :meth:`receive_data`
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :param Hformat: list of indices of args that should be formatted as unsigned short. Defaults to [2].
+        :type Hformat: list
+
+        :returns: The list of words, or :attr:`PiSoC.BAD_PARAM` if the PiSoC does not know the command
+
+        :raises: :class:`LostConnection`
+        """
+        with self.lock:
+            data = self.encoder.encode(args, kwargs.get('Hformat', [2])).tobytes()
+            try:
+                if self.pipeline.unsynced:
+                    self.pipeline.sync()
+                return self.pipeline.wait(self.pipeline.submit(data, args, block = True))
+            except self.serial.SerialException:
+                self.ser.close()
+                raise LostConnection("Lost connection trying to read from device..")
 
     def reconnect(self):
         """
@@ -955,63 +2147,335 @@ class USB_UART(object):
         :returns: Boolean value (True/False) indicating whether the reconnection was successful or unsuccessful, respectively.
 
         """
-        logging.debug('Rechecking available ports..')
-        if hasattr(self, 'ser'):
-            if self.ser.isOpen():
-                self.ser.close()
-        time.sleep(.1)
-        search_passed = self.find_device()
-        if not search_passed:
-            logging.error('Could not find PiSoC')
-            self.pisoc_available = False
-            return False
-        else:
-            self.pisoc_available = True
-            logging.debug('trying to init serial object on %s'%self.com)
-            if not hasattr(self, 'ser'):
-                self.ser = self.serial.Serial(self.com, self.baudr, timeout = 4, writeTimeout = 4)
+        with self.lock:
+            if getattr(self, 'com', None) and os.path.exists(self.com) and self.reopen(): #the PiSoC is still where it was last found
                 return True
-            else:
-                logging.debug('Cleaning buffers...')
-                if self.ser.isOpen():
-                    self.ser.read(self.ser.inWaiting())
-                    self.ser.flushInput()
-                    self.ser.flushOutput()
-                    self.ser.flush()
-                logging.debug('Trying to reconnect..')
+            logging.debug('Rechecking available ports..')
+            if hasattr(self, 'ser'):
                 if self.ser.isOpen():
-                    logging.debug('Port still open. Closing...')
                     self.ser.close()
-                    logging.debug('Closed.')
-                logging.debug('Reestablishing connection..')
-                self.ser = self.serial.Serial(self.com, self.baudr, timeout = 4, writeTimeout = 4)
-                logging.debug('Connection requested. Validating...')
-                if not self.ser.isOpen():
-                    logging.debug('Failed to reopen device... Attempting to force open')
-                    self.ser.open()
-                    t = time.time()
-                    while not self.ser.isOpen():
-                        if time.time() - t >1:
-                                logging.debug('Could not establish connection')
-                                self.pisoc_available = False
-                                return False
-                logging.debug('New connection validated. Ready for data')
-                build_info()
-                return True
+            time.sleep(.1)
+            search_passed = self.find_device()
+            if not search_passed:
+                logging.error('Could not find PiSoC')
+                self.pisoc_available = False
+                return False
+            else:
+                self.pisoc_available = True
+                logging.debug('trying to init serial object on %s'%self.com)
+                if not hasattr(self, 'ser'):
+                    self.ser = self.serial.Serial(self.com, self.baudr, timeout = self.read_timeout, writeTimeout = 4)
+                    self.pipeline.reset(self.ser)
+                    return True
+                else:
+                    logging.debug('Cleaning buffers...')
+                    if self.ser.isOpen():
+                        self.ser.read(self.ser.inWaiting())
+                        self.ser.flushInput()
+                        self.ser.flushOutput()
+                        self.ser.flush()
+                    logging.debug('Trying to reconnect..')
+                    if self.ser.isOpen():
+                        logging.debug('Port still open. Closing...')
+                        self.ser.close()
+                        logging.debug('Closed.')
+                    logging.debug('Reestablishing connection..')
+                    self.ser = self.serial.Serial(self.com, self.baudr, timeout = self.read_timeout, writeTimeout = 4)
+                    logging.debug('Connection requested. Validating...')
+                    if not self.ser.isOpen():
+                        logging.debug('Failed to reopen device... Attempting to force open')
+                        self.ser.open()
+                        t = time.time()
+                        while not self.ser.isOpen():
+                            if time.time() - t >1:
+                                    logging.debug('Could not establish connection')
+                                    self.pisoc_available = False
+                                    return False
+                            time.sleep(0.01)
+                    logging.debug('New connection validated. Ready for data')
+                    self.pipeline.reset(self.ser)
+                    restore_info(self.pipeline.board)
+                    return True
+
+    def reopen(self, timeout = 0):
+        """
+        :Method: reopen
+
+        :Description: Reopens the port the PiSoC was last found on, without searching the other ports, and checks the fingerprint of its firmware build against the one already known.
+            If it matches, what is known about the PiSoC is kept and framing is turned back on as it was; otherwise the PiSoC is learned about again with :func:`restore_info`.
+            Other calls wait until this is done.
+
+        :param timeout: Seconds to keep trying to open the port, which may not be usable until udev has set its permissions
+        :type timeout: float
+
+        :returns: True if the port was reopened
+        """
+        board = self.pipeline.board
+        with self.lock:
+            framed, checked = self.pipeline.framed, self.pipeline.want_checked
+            if hasattr(self, 'ser') and self.ser.isOpen():
+                self.ser.close()
+            t = time.time()
+            while True:
+                try:
+                    ser = self.serial.Serial(self.com, self.baudr, timeout = self.read_timeout, writeTimeout = 4)
+                    break
+                except (self.serial.SerialException, OSError) as e:
+                    if time.time() - t >= timeout:
+                        logging.debug('Could not reopen %s: %s'%(self.com, e))
+                        return False
+                    time.sleep(0.01)
+            self.ser = ser
+            self.pisoc_available = True
+            self.pipeline.reset(self.ser)
+            if framed: #the PiSoC may not have been reset, and still be framing its responses
+                self.pipeline.set_framed(False)
+            known = False
+            if board.FINGERPRINT is None:
+                logging.info('The firmware on the PiSoC on %s has no fingerprint to check; learning about it again'%self.com)
+            else:
+                args = (PiSoC.CHECK_BUILD, 0x0D)
+                fingerprint = self.pipeline.wait(self.pipeline.submit(self.encoder.encode(args).tobytes(), args)) #not receive_data, which would reopen the port again on a short read
+                known = fingerprint == board.FINGERPRINT
+                if not known:
+                    logging.info('The PiSoC on %s has different firmware; learning about it again'%self.com)
+            if known:
+                if framed:
+                    self.pipeline.set_framed(True, checked)
+                logging.info('Reopened the PiSoC on %s'%self.com)
+            else:
+                channel, board.commChannel = board.commChannel, self #a wrapper's I/O thread would wait on the lock held here
+                try:
+                    restore_info(board)
+                finally:
+                    board.commChannel = channel
+        return True
+
+    def watch(self):
+        """
+        :Method: watch
+
+        :Description: Starts a :class:`~pisoc.hotplug.HotplugWatcher` on the port, so that the port is closed as soon as the PiSoC is unplugged, and reopened with :meth:`reopen` as soon as it
+            is plugged back in. Calls made while it is unplugged raise :class:`ClosedPortException`, and calls made while it is being reopened wait for it.
+
+        :returns: True if the port is being watched
+        """
+        if self.watcher is not None:
+            return True
+        if not getattr(self, 'com', None) or not os.path.isabs(self.com):
+            logging.warning('Hot-plugging can only be watched for on ports in /dev.')
+            return False
+        from pisoc.hotplug import HotplugWatcher
+        self.watcher = HotplugWatcher(os.path.dirname(self.com), self.hotplug, [os.path.basename(self.com)])
+        self.watcher.start()
+        return True
+
+    def hotplug(self, name, present):
+        if present:
+            if not self.pisoc_available:
+                self.reopen(PiSoC.REOPEN_TIMEOUT)
+            return
+        logging.info('The PiSoC on %s was unplugged'%self.com)
+        with self.lock:
+            self.pisoc_available = False
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+
+    def wait_for_device(self, timeout = 1):
+        """
+        :Method: wait_for_device
+
+        :Description: Waits for a device to be plugged in, for up to *timeout* seconds, and then looks for the PiSoC again with :meth:`reconnect`. Where device nodes cannot be watched, it waits for
+            the whole timeout.
+
+        :param timeout: Seconds to wait
+        :type timeout: float
+
+        :returns: True if the PiSoC was found
+        """
+        appeared = threading.Event()
+        watcher = None
+        if os.path.isdir('/dev'):
+            from pisoc.hotplug import HotplugWatcher
+            watcher = HotplugWatcher('/dev', lambda name, present: present and appeared.set())
+            watcher.start()
+        appeared.wait(timeout)
+        if watcher is not None:
+            watcher.stop()
+            if appeared.is_set():
+                time.sleep(PiSoC.HOTPLUG_SETTLE) #the node was just made, and may not be listed as a PiSoC yet
+        return self.reconnect()
+
     def find_device(self):
+        """
+        :Method: find_device
+
+        :Description: Looks for the PiSoC with :attr:`serial_number`, or for any PiSoC if it is None. The port it was last found on is checked first. Otherwise, where sysfs is available,
+            USB devices are looked up by :attr:`PiSoC.VID` and :attr:`PiSoC.PID` under :attr:`PiSoC.SYSFS_ROOT`, without describing every serial port; elsewhere the ports listed by pyserial are searched.
+            On Linux, *udevadm info /dev/ttyACM0* shows a PiSoC's serial number as ID_SERIAL_SHORT.
+
+        :returns: Boolean value (True/False) indicating whether the PiSoC was found. If it was, :attr:`com`, :attr:`desc` and :attr:`hwid` describe it.
+        """
+        found = None
+        if USB_UART.ports.get(self.serial_number):
+            found = self.sysfs_port(os.path.basename(USB_UART.ports[self.serial_number]))
+        if found is None:
+            found = self.sysfs_find() if os.path.isdir(os.path.join(PiSoC.SYSFS_ROOT, 'bus', 'usb', 'devices')) else self.comports_find()
+        if found is None:
+            return False
+        self.com, self.desc, self.hwid = found
+        USB_UART.ports[self.serial_number] = self.com
+        logging.debug('platform determined to be %s'%sys.platform)
+        logging.debug('found PiSoC on %s'%self.com)
+        return True
+
+    def sysfs_find(self):
+        """
+        :Method: sysfs_find
+
+        :Description: Looks through the USB devices in sysfs for a PiSoC, and finds the tty of its serial interface
+
+        :returns: tuple of the port, the product description and a pyserial style hardware id, or None if no PiSoC was found
+        """
+        devices = os.path.join(PiSoC.SYSFS_ROOT, 'bus', 'usb', 'devices')
+        for name in sorted(os.listdir(devices)):
+            if ':' in name: #an interface, rather than a device
+                continue
+            usb = os.path.join(devices, name)
+            if not self.sysfs_match(usb):
+                continue
+            for interface in sorted(os.listdir(usb)):
+                if not interface.startswith(name + ':'):
+                    continue
+                path = os.path.join(usb, interface)
+                ttys = os.listdir(os.path.join(path, 'tty')) if os.path.isdir(os.path.join(path, 'tty')) else [entry for entry in os.listdir(path) if entry.startswith('tty')]
+                for tty in sorted(ttys):
+                    return self.sysfs_describe(usb, tty)
+        return None
+
+    def sysfs_port(self, tty):
+        """
+        :Method: sysfs_port
+
+        :Description: Checks that *tty* is still the serial interface of the PiSoC being looked for
+
+        :param tty: Name of the tty, such as ttyACM0
+        :type tty: str
+
+        :returns: tuple as for :meth:`sysfs_find`, or None if it is not
+        """
+        device = os.path.realpath(os.path.join(PiSoC.SYSFS_ROOT, 'class', 'tty', tty, 'device'))
+        for usb in (os.path.dirname(device), os.path.dirname(os.path.dirname(device))): #the interface of a CDC ACM tty, or the port of a USB serial adapter, is under the device
+            if os.path.exists(os.path.join(usb, 'idVendor')):
+                return self.sysfs_describe(usb, tty) if self.sysfs_match(usb) else None
+        return None
+
+    def sysfs_match(self, usb):
+        if [(sysfs_read(usb, name) or '').upper() for name in ('idVendor', 'idProduct')] != [PiSoC.VID, PiSoC.PID]:
+            return False
+        return self.serial_number is None or sysfs_read(usb, 'serial') == self.serial_number
+
+    def sysfs_describe(self, usb, tty):
+        serial_number = sysfs_read(usb, 'serial')
+        hwid = 'USB VID:PID=%s:%s'%(PiSoC.VID, PiSoC.PID) + (' SER=%s'%serial_number if serial_number else '')
+        return os.path.join('/dev', tty), sysfs_read(usb, 'product') or PiSoC.DEVICE_DESCRIPTOR, hwid
+
+    def comports_find(self):
+        """
+        :Method: comports_find
+
+        :Description: Searches the serial ports listed by pyserial for a PiSoC, by its description or its VID and PID
+
+        :returns: tuple as for :meth:`sysfs_find`, or None if no PiSoC was found
+        """
+        if self.lp is None:
+            import importlib
+            try:
+                if sys.platform.startswith('win'):
+                    self.lp = importlib.import_module("serial.tools.list_ports_windows")
+                elif sys.platform.startswith('linux'):
+                    self.lp = importlib.import_module("serial.tools.list_ports_linux")
+                else:
+                    self.lp = importlib.import_module("serial.tools.list_ports_osx")
+            except ImportError:
+                raise ImportError("Using wrong version of pyserial.")
         for port, desc, hwid in sorted(self.lp.comports()):
             if hwid.find('VID:PID=') !=-1:
                 vidpid = hwid.split('VID:PID=')[1].split(' ')[0]
             else:
                 vidpid = None
+            serial_number = re.search(r'SER=(\S+)', hwid)
+            if self.serial_number is not None and (serial_number is None or serial_number.group(1) != self.serial_number):
+                continue
             if desc.find(PiSoC.DEVICE_DESCRIPTOR) !=-1 or vidpid == ':'.join([PiSoC.VID, PiSoC.PID]):
-                self.com = port
-                self.desc = desc
-                self.hwid = hwid
-                logging.debug('platform determined to be %s'%platform.platform())
-                logging.debug('found PiSoC on %s'%self.com)
-                return True
-        return False
+                return port, desc, hwid
+        return None
+
+    def set_window(self, window):
+        """
+        :Method: set_window
+
+        :Description: Sets how many requests may be in flight at once. With a window larger than 1, :meth:`send_data` returns as soon as its frame is written, and responses are checked as they are read back.
+            A failed write is logged, but is not retried, since retrying it after later writes would reorder them.
+
+        :param window: Number of requests which may be waiting for a response
+        :type window: int
+
+        :returns: The window which will actually be used; see :meth:`~pisoc.pipeline.ResponsePipeline.resize`
+        """
+        return self.pipeline.resize(window)
+
+    def set_framed(self, framed, checked = None):
+        """
+        :Method: set_framed
+
+        :Description: Turns framed responses on or off. With framing on, stale data in the port is skipped rather than flushed before each command. This is done by :func:`build_info` when the firmware supports it.
+
+        :param framed: True to frame responses
+        :type framed: bool
+
+        :param checked: True to also give frames in both directions a sequence number and a CRC. The last choice is kept if None.
+        :type checked: bool
+
+        :returns: True if responses are now framed; see :meth:`~pisoc.pipeline.ResponsePipeline.set_framed`
+        """
+        return self.pipeline.set_framed(framed, checked)
+
+    def set_unacked(self, unacked):
+        """
+        :Method: set_unacked
+
+        :Description: Turns unacknowledged writes on or off. While they are on, :meth:`send_data` returns as soon as its frame is written, and the PiSoC does not answer it.
+            Writes which failed are counted by the PiSoC, and are reported by :meth:`sync`, which is also done before every read.
+
+        :param unacked: True to stop waiting for writes to be acknowledged
+        :type unacked: bool
+
+        :returns: True if writes are now unacknowledged; see :meth:`~pisoc.pipeline.ResponsePipeline.set_unacked`
+        """
+        return self.pipeline.set_unacked(unacked)
+
+    def sync(self):
+        """
+        :Method: sync
+
+        :Description: Waits until everything sent so far has been executed by the PiSoC, and reports the unacknowledged writes which failed
+
+        :returns: The number of unacknowledged writes which failed since the last sync; see :meth:`~pisoc.pipeline.ResponsePipeline.sync`
+        """
+        return self.pipeline.sync()
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Waits until every request sent so far has been answered by the PiSoC
+
+        :returns: None
+        """
+        self.pipeline.drain()
 
     def cleanup(self):
         """
@@ -1021,8 +2485,11 @@ class USB_UART(object):
 
         :returns: None
         """
-        self.send_data(0xFF,0xFF)
-        PiSoC.REGISTERS_IN_USE = []
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.pipeline.drain()
+        self.ser.write(self.pipeline.frame(self.encoder.encode((0xFF, 0xFF), [2]).tobytes())) #the PiSoC resets without responding, so there is nothing to wait for
         self.ser.close()
 
     def disconnect(self):
@@ -1043,10 +2510,11 @@ class USB_UART(object):
 
         :returns: Boolean value (True/False) indicating whether the PiSoC is connected or disconnected, respectively.
         """
-        if self.pisoc_available:
-            return self.ser.isOpen()
-        else:
-            return False
+        with self.lock:
+            if self.pisoc_available:
+                return self.ser.isOpen()
+            else:
+                return False
 class ClosedPortException(Exception):
     """
     :Exception: ClosedPortException  
@@ -1059,10 +2527,22 @@ class LostConnection(Exception):
     :Description: Raised when connection to the PiSoC is lost 
     """
     pass
+class DeadlineMissed(Exception):
+    """
+    :Exception: DeadlineMissed
+    :Description: Raised when a read given to a :class:`~pisoc.threaded.Scheduler` was dropped because it was stale before it could be sent
+    """
+    pass
+class ConversionTimeout(Exception):
+    """
+    :Exception: ConversionTimeout
+    :Description: Raised when an ADC conversion does not finish within the ADC's *conversion_timeout*
+    """
+    pass
 
 
-from digital import *
-from analog import *
+from .digital import *
+from .analog import *
 
 
 
@@ -0,0 +1,342 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+asyncio support for the PiSoC. This module needs Python 3.5 or newer.
+
+:Example:
+
+    >>> import asyncio
+    >>> from pisoc.aio import *
+    >>> async def main():
+    ...     await AsyncPiSoC.connect('PC')
+    ...     pin = AsyncDigitalPin(2, 0, 'input')
+    ...     adc = AsyncADC('SAR0')
+    ...     adc.Start()
+    ...     print(await asyncio.gather(pin.ReadAsync(), adc.ReadAsync()))
+    >>> asyncio.get_event_loop().run_until_complete(main())
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import asyncio
+import collections
+import functools
+import time
+import logging
+
+from pisoc import *
+
+
+class AsyncTransport(object):
+    """
+    :Class:
+
+        Sends commands over the serial port of a :class:`~pisoc.UART`, :class:`~pisoc.USB_UART` or :class:`~pisoc.emulator.Loopback` transport without blocking the event loop.
+        Frames are written straight away, and responses are read by a reader callback on the port's file descriptor, which hands them out in order through the transport's :class:`~pisoc.pipeline.ResponsePipeline`.
+
+        Up to the pipeline's window of requests may be in flight at once. The blocking transport stays usable from the same thread: both share the pipeline, and while requests are in flight the blocking calls
+        are sent through it rather than flushing the port, even with a window of 1 and unframed responses, so neither can take or drop the other's responses.
+    """
+    def __init__(self, channel, loop = None, board = None):
+        """
+        :Method: __init__
+
+        :param channel: A connected UART, USB_UART or Loopback transport
+        :param loop: The event loop to run on. Defaults to the current event loop.
+        :param board: The :class:`~pisoc.PiSoC` session that *channel* belongs to. Defaults to the :class:`~pisoc.PiSoC` class.
+        """
+        if not hasattr(channel, 'pipeline'):
+            raise ValueError('asyncio is only supported on the UART, USB UART and loopback transports')
+        self.channel = channel
+        self.board = PiSoC if board is None else board
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self.encoder = FrameEncoder()
+        self.futures = collections.deque()
+        self.read_timeout = getattr(channel, 'read_timeout', 2)
+        self.fd = None
+
+    @property
+    def pipeline(self):
+        return self.channel.pipeline
+
+    def watch(self):
+        fileno = getattr(self.pipeline.ser, 'fileno', None)
+        if fileno is None: #nothing to wait on; whatever the port holds can be read now.
+            self.loop.call_soon(self.on_readable)
+        elif self.fd is None:
+            self.fd = fileno()
+            self.loop.add_reader(self.fd, self.on_readable)
+
+    def unwatch(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+
+    def on_readable(self):
+        try:
+            self.pipeline.poll()
+        except Exception as e:
+            logging.debug("Lost connection to PiSoC temporarily: %s"%e)
+            self.pipeline.fail_pending()
+        if not self.pipeline.pending:
+            self.unwatch()
+
+    async def request(self, args, Hformat, check):
+        while len(self.pipeline.pending) >= self.pipeline.window:
+            await self.settle(self.futures[0])
+        while self.futures and self.futures[0].done():
+            self.futures.popleft()
+        future = self.loop.create_future()
+        def done(resp):
+            if not future.done():
+                future.set_result(resp)
+        self.pipeline.submit(self.encoder.encode(args, Hformat).tobytes(), args, check, callback = done)
+        self.futures.append(future)
+        self.watch()
+        return await self.settle(future)
+
+    async def settle(self, future):
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.read_timeout)
+        except asyncio.TimeoutError:
+            logging.debug("Lost connection to PiSoC temporarily.")
+            self.pipeline.fail_pending()
+            self.pipeline.ser.flushInput()
+            self.unwatch()
+            return future.result()
+        finally:
+            while self.futures and self.futures[0].done():
+                self.futures.popleft()
+
+    async def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Coroutine version of :meth:`~pisoc.UART.send_data`. It finishes once the PiSoC has acknowledged the command; a rejected command is logged.
+
+        :returns: None
+        """
+        await self.request(args, kwargs.get('Hformat', [2]), True)
+
+    async def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Coroutine version of :meth:`~pisoc.UART.receive_data`
+
+        :returns: The response from the PiSoC
+        """
+        return await self.request(args, kwargs.get('Hformat', [2]), False)
+
+    async def flush(self):
+        """
+        :Method: flush
+
+        :Description: Waits until every request sent so far has been answered
+
+        :returns: None
+        """
+        while self.futures:
+            await self.settle(self.futures[-1])
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Stops watching the port, and cleans up the blocking transport underneath
+
+        :returns: None
+        """
+        self.unwatch()
+        self.channel.cleanup()
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+
+class AsyncPiSoC(object):
+    """
+    :Class:
+
+        The asyncio counterpart of :class:`~pisoc.PiSoC`. Connecting to the board and learning what is on it is done with the blocking API, by :class:`~pisoc.PiSoC` itself;
+        afterwards :attr:`commChannel` is an :class:`AsyncTransport` over the same port. Use :meth:`connect` to do the blocking part in a worker thread.
+
+        With *session* set, the :class:`~pisoc.PiSoC` session is returned, holding its own :class:`AsyncTransport` as its *asyncChannel*, so several boards can be used from one event loop.
+
+        Component constructors still use the blocking API. Their *ReadAsync* methods, in the classes below, use the :class:`AsyncTransport` of the component's *board*, found by :meth:`transport`.
+    """
+    commChannel = None
+
+    def __new__(self, protocol = None, com_port = '/dev/ttyAMA0', baud = 9600, log_level = None, window = 1, loop = None, session = False):
+        """
+        :Method: __new__
+
+        :Description: Takes the same parameters as :meth:`pisoc.PiSoC.__new__`, and also the event loop to run on.
+
+        :returns: The session: a new PiSoC object if *session* is True, otherwise the :class:`~pisoc.PiSoC` class
+
+        :Example:
+
+            >>> boards = [AsyncPiSoC('UART', com_port = port, session = True) for port in ('/dev/ttyUSB0', '/dev/ttyUSB1')]
+            >>> pins = [AsyncDigitalPin(2, 0, 'input', board = b) for b in boards]
+        """
+        board = PiSoC(protocol, com_port, baud, log_level, window, session = session)
+        board.asyncChannel = AsyncTransport(board.commChannel, loop, board)
+        if not session:
+            self.commChannel = board.asyncChannel
+        return board
+
+    @staticmethod
+    def transport(board):
+        """
+        :Method: transport
+
+        :Description: Finds the :class:`AsyncTransport` of a board
+
+        :param board: The :class:`~pisoc.PiSoC` class, or a PiSoC session
+
+        :returns: The AsyncTransport made for *board* by :class:`AsyncPiSoC`
+
+        :raises: ValueError if *board* was not connected by :class:`AsyncPiSoC`
+        """
+        channel = getattr(board, 'asyncChannel', None)
+        if channel is None or channel.board is not board: #a session would otherwise find the PiSoC class's transport
+            raise ValueError('This board was not connected with AsyncPiSoC, so it cannot be read asynchronously.')
+        return channel
+
+    @classmethod
+    async def connect(cls, *args, **kwargs):
+        """
+        :Method: connect
+
+        :Description: Constructs the AsyncPiSoC in a worker thread, so that the event loop keeps running while the board is found and its build information is read.
+
+        :returns: What the constructor returns
+        """
+        loop = kwargs.get('loop') or asyncio.get_event_loop()
+        kwargs['loop'] = loop
+        return await loop.run_in_executor(None, functools.partial(cls, *args, **kwargs))
+
+
+class AsyncDigitalPin(DigitalPin):
+    """
+    :Class:
+
+        A :class:`~pisoc.digital.DigitalPin` with an awaitable :meth:`ReadAsync`
+    """
+    async def ReadAsync(self):
+        """
+        :Method: ReadAsync
+
+        :Description: Coroutine version of :meth:`~pisoc.digital.DigitalPin.Read`
+
+        :returns: boolean value (True/False) which indicates the state of the DigitalPin as HIGH/LOW, respectively
+        """
+        cmd = 0x00
+        dat = (self.port<<4) | (self.pin<<1)
+        self.state = bool(await AsyncPiSoC.transport(self.board).receive_data(self.address, cmd, dat))
+        return self.state
+
+
+class AsyncCapSense(CapSense):
+    """
+    :Class:
+
+        A :class:`~pisoc.analog.CapSense` with an awaitable :meth:`ReadAsync`
+    """
+    async def ReadAsync(self):
+        """
+        :Method: ReadAsync
+
+        :Description: Coroutine version of :meth:`~pisoc.analog.CapSense.Read`
+
+        :returns: A boolean (True or False) value when the output is determined to be touched or not touched, respectively.
+        """
+        cmd = 0x18
+        return bool(await AsyncPiSoC.transport(self.board).receive_data(self.address, cmd, self.pin, Hformat = []))
+
+
+class AsyncADC(ADC):
+    """
+    :Class:
+
+        An :class:`~pisoc.analog.ADC` with an awaitable :meth:`ReadAsync`
+    """
+    async def ReadAsync(self):
+        """
+        :Method: ReadAsync
+
+        :Description: Coroutine version of :meth:`~pisoc.analog.ADC.Read`. While a SAR conversion is running, other tasks run between checks of :meth:`~pisoc.analog.ADC.IsEndConversion`.
+
+        :returns: Digital value which represents the result of the most recent AD conversion
+
+        :raises: :class:`~pisoc.ConversionTimeout` if the conversion did not finish within *conversion_timeout* seconds
+        """
+        channel = AsyncPiSoC.transport(self.board)
+        if self.type != 'DELSIG':
+            await channel.send_data(self.address, 0x04)
+            deadline = time.time() + self.conversion_timeout
+            wait = 0.0001
+            while not await channel.receive_data(self.address, 0x08):
+                if time.time() > deadline:
+                    await channel.send_data(self.address, 0x05)
+                    raise ConversionTimeout('Timed out waiting for the %s ADC to finish converting.'%self.type)
+                await asyncio.sleep(wait)
+                wait = min(2*wait, 0.01)
+            counts = int(await channel.receive_data(self.address, 0x0A))
+            await channel.send_data(self.address, 0x05)
+        else:
+            counts = int(await channel.receive_data(self.address, 0x0D))
+
+        if counts<0:
+            self.polarity = -1
+        else:
+            self.polarity = 1
+
+        return counts
+
+
+class AsyncRangeFinder(RangeFinder):
+    """
+    :Class:
+
+        A :class:`~pisoc.digital.RangeFinder` with an awaitable :meth:`ReadRawAsync`
+    """
+    async def ReadRawAsync(self):
+        """
+        :Method: ReadRawAsync
+
+        :Description: Coroutine version of :meth:`~pisoc.digital.RangeFinder.ReadRaw`. If *poll_frequency* was given, other tasks run until the next poll is allowed.
+
+        :returns: The length of time, in microseconds, that it took for the ping to echo back to the ultrasonic ranger.
+        """
+        cmd = 0x00
+        wait = self.poll_period - (time.time() - self.time_since_last_poll)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self.time_since_last_poll = time.time()
+        reading = await AsyncPiSoC.transport(self.board).receive_data(self.address, cmd, self.packed_dat)
+        self.raw = reading
+        if reading == PiSoC.BAD_PARAM:
+            logging.error("Timeout occured waiting for signal pin to be asserted; verify connection.")
+        return reading
@@ -40,7 +40,7 @@ class CapSense(object):
     |
 
     """
-    def __init__(self, pin, threshold = 6):
+    def __init__(self, pin, threshold = 6, board = None):
         """
         :Method:
 
@@ -65,6 +65,10 @@ class CapSense(object):
 
         :type threshold: int
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the sensor is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
@@ -75,10 +79,11 @@ class CapSense(object):
             :meth:`Read` is only valid when SmartSense is enabled in firmware, which by default it is not.
 
         """
-        if PiSoC.CAPSENSE_SENSOR_NUM is 0:
+        self.board = PiSoC if board is None else board
+        if self.board.CAPSENSE_SENSOR_NUM == 0:
             raise ValueError('Error: No CapSense pins found. Verify your schematic on the PiSoC is correct, or try resetting the PiSoC and trying again.')
-        elif pin not in range(PiSoC.CAPSENSE_SENSOR_NUM):
-            raise ValueError('Invalid CapSense sensor number chosen: Valid range is between 0 and %d'%(PiSoC.CAPSENSE_SENSOR_NUM - 1))
+        elif pin not in range(self.board.CAPSENSE_SENSOR_NUM):
+            raise ValueError('Invalid CapSense sensor number chosen: Valid range is between 0 and %d'%(self.board.CAPSENSE_SENSOR_NUM - 1))
         else:
             self.pin = pin
             self.address = PiSoC.CAPSENSE_REGISTER
@@ -104,7 +109,7 @@ class CapSense(object):
 
         """
         cmd = 0x00
-        self.baseline = PiSoC.commChannel.receive_data(self.address,cmd, self.pin, self.threshold, Hformat = [])
+        self.baseline = self.board.commChannel.receive_data(self.address,cmd, self.pin, self.threshold, Hformat = [])
         logging.debug("CapSense sensor %d calibrated with baseline %d"%(self.pin, self.baseline))
   
         self.__running = True
@@ -144,7 +149,7 @@ class CapSense(object):
             This will affect functionality of *all* CapSense sensors, use it only if this is intended.
         """
         cmd = 0x01
-        PiSoC.commChannel.receive_data(self.address,cmd)
+        self.board.commChannel.receive_data(self.address,cmd)
         self.__running = False
 
     def Sleep(self):
@@ -167,7 +172,7 @@ class CapSense(object):
             This will affect functionality of *all* CapSense sensors, use it only if this is intended.
         """
         cmd = 0x02
-        PiSoC.commChannel.receive_data(self.address,cmd)
+        self.board.commChannel.receive_data(self.address,cmd)
 
     def Wakeup(self):
         """
@@ -188,7 +193,7 @@ class CapSense(object):
             This will affect functionality of *all* CapSense sensors, use it only if this is intended.
         """
         cmd = 0x03
-        PiSoC.commChannel.receive_data(self.address,cmd)
+        self.board.commChannel.receive_data(self.address,cmd)
 
     def Read(self):
         """
@@ -207,7 +212,7 @@ class CapSense(object):
         """
         cmd = 0x18
         val = self.pin
-        return bool(PiSoC.commChannel.receive_data(self.address,cmd, val, Hformat = [], delay = 0.03))
+        return bool(self.board.commChannel.receive_data(self.address,cmd, val, Hformat = [], delay = 0.03))
 
     def ReadRaw(self):
         """
@@ -226,7 +231,7 @@ class CapSense(object):
         """
         cmd = 0x0F
         val = self.pin
-        return PiSoC.commChannel.receive_data(self.address, cmd, val, Hformat = [])
+        return self.board.commChannel.receive_data(self.address, cmd, val, Hformat = [])
 
     def is_touched(self, bitmap = None):
         """
@@ -253,7 +258,7 @@ class CapSense(object):
 
         if bitmap is None:
             cmd = 0xFD
-            result = PiSoC.commChannel.receive_data(self.address, cmd, self.pin, Hformat = [])
+            result = self.board.commChannel.receive_data(self.address, cmd, self.pin, Hformat = [])
         else:
             result = (bitmap>>self.pin)&0x01
             
@@ -275,7 +280,7 @@ class CapSense(object):
             The n-th bit of this value will be *1* if pin n is touched, or *0* if pin n is not touched. Bit-0 is the LSB of the returned result.
         """
         cmd = 0xFF
-        return PiSoC.commChannel.receive_data(self.address, cmd, self.pin, Hformat = [])
+        return self.board.commChannel.receive_data(self.address, cmd, self.pin, Hformat = [])
 
 
 class AnalogPin(object):
@@ -293,7 +298,7 @@ class AnalogPin(object):
     |
 
     """
-    def __init__(self, pin):
+    def __init__(self, pin, board = None):
         """
         :Method:
 
@@ -310,13 +315,18 @@ class AnalogPin(object):
 
         :type pin: int
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the pin is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
         """
+        self.board = PiSoC if board is None else board
 
-        if int(pin) not in range(PiSoC.ANALOG_IN_NUM):
-            raise ValueError('Invalid Pin for Analog input specified. Only %d analog inputs available.' %PiSoC.ANALOG_IN_NUM)
+        if int(pin) not in range(self.board.ANALOG_IN_NUM):
+            raise ValueError('Invalid Pin for Analog input specified. Only %d analog inputs available.' %self.board.ANALOG_IN_NUM)
         else:
             self.pin = pin
 
@@ -344,7 +354,7 @@ class AnalogPin(object):
 
         """
         cmd = 0x00
-        counts = int(PiSoC.commChannel.receive_data(self.address, cmd, self.pin))
+        counts = int(self.board.commChannel.receive_data(self.address, cmd, self.pin))
         return counts
     def ReadVolts(self, precision = 2, counts = None):
         """
@@ -377,7 +387,7 @@ class AnalogPin(object):
         """
         cmd = 0x01
         if counts is None:
-            return round((float(((PiSoC.commChannel.receive_data(self.address,cmd, self.pin))/1000000.0))), precision)
+            return round((float(((self.board.commChannel.receive_data(self.address,cmd, self.pin))/1000000.0))), precision)
         else:
             return round(float(float(counts - self.__offset)/self.__max_counts)*5.0, precision)
 
@@ -403,7 +413,7 @@ class AnalogPin(object):
         """
         cmd = 0x02
         self.__offset = counts
-        PiSoC.commChannel.send_data(self.address, cmd, counts)
+        self.board.commChannel.send_data(self.address, cmd, counts)
 
     def SetResolution(self, resolution):
         """
@@ -431,7 +441,7 @@ class AnalogPin(object):
         self.__max_counts = pow(2,self.__resolution)
 
         cmd = 0x03
-        PiSoC.commChannel.send_data(self.address, cmd, resolution)
+        self.board.commChannel.send_data(self.address, cmd, resolution)
 
 
 
@@ -455,7 +465,7 @@ class ADC(object):
 
     """
 
-    def __init__(self, c_type):
+    def __init__(self, c_type, board = None):
         """
         :Method:
 
@@ -465,6 +475,8 @@ class ADC(object):
 
             Constructs and initializes an ADC object for use of a SAR or DELSIG ADC  
 
+            The *conversion_timeout* attribute is how many seconds :meth:`Read` waits for a SAR conversion to finish before raising :class:`~pisoc.ConversionTimeout`. It defaults to 1.0.
+
         :param c_type: Specifies the type of ADC to be used. Valid arguments are:
 
             * 'DELSIG'- This is for the Delta sigma ADC, which has resolution up to 20 bits, but a slower conversion rate
@@ -472,32 +484,38 @@ class ADC(object):
 
         :type c_type: str
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the ADC is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
         """
+        self.board = PiSoC if board is None else board
 
         self.type = c_type
 
         if self.type == 'DELSIG':
-            if not PiSoC.DELSIG:
+            if not self.board.DELSIG:
                 raise ValueError('Delta-Sigma ADC not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.DELSIG_ADC_CONTROL
         elif self.type == 'SAR0':
-            if not PiSoC.SAR0:
+            if not self.board.SAR0:
                 raise ValueError('SAR0 ADC not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.SAR_ADC0_CONTROL
         elif self.type == 'SAR1':
-            if not PiSoC.SAR1:
+            if not self.board.SAR1:
                 raise ValueError('SAR1 ADC not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.SAR_ADC1_CONTROL
         else:
             raise ValueError('Invalid ADC type: Choose "DELSIG" "SAR0" or "SAR1"')
         self.polarity = 1
+        self.conversion_timeout = 1.0
 
-        if self.address in PiSoC.REGISTERS_IN_USE:
+        if self.address in self.board.REGISTERS_IN_USE:
             logging.warning('Attempting to initialize object at register %d which is already in use.' %self.address)
-        PiSoC.REGISTERS_IN_USE.append(self.address)
+        self.board.REGISTERS_IN_USE.append(self.address)
 
         self.__running = False
 
@@ -519,7 +537,7 @@ class ADC(object):
         """
         cmd = 0x00
         data = (self.address, cmd)
-        PiSoC.commChannel.send_data(*data)
+        self.board.commChannel.send_data(*data)
         self.__running =True
 
     def Stop(self):
@@ -538,7 +556,7 @@ class ADC(object):
         """
         cmd = 0x01
         data = (self.address, cmd)
-        PiSoC.commChannel.send_data(*data)
+        self.board.commChannel.send_data(*data)
         self.__runnning = False
 
     def is_running(self):
@@ -592,7 +610,7 @@ class ADC(object):
             raise ValueError('Invalid Gain Value for DELSIG ADC: Accepts 1, 2, 4, or 8')
 
         data = (self.address, cmd, gain)
-        PiSoC.commChannel.send_data(*data)
+        self.board.commChannel.send_data(*data)
 
     def SetResolution(self, resolution):
         """
@@ -631,7 +649,7 @@ class ADC(object):
             raise ValueError('Invalid resolution specified: valid entries are 8, 10, or 12')
 
         cmd = 0x03
-        PiSoC.commChannel.send_data(self.address, cmd, resolution)
+        self.board.commChannel.send_data(self.address, cmd, resolution)
 
     def StartConvert(self):
         """
@@ -653,7 +671,7 @@ class ADC(object):
         elif self.type == 'DELSIG':
             cmd = 0x03
 
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
     def StopConvert(self):
         """
@@ -675,7 +693,7 @@ class ADC(object):
         elif self.type == 'DELSIG':
             cmd = 0x04
 
-        PiSoC.commChannel.send_data(self.address,cmd)
+        self.board.commChannel.send_data(self.address,cmd)
 
     def GetResult(self):
         """
@@ -693,7 +711,7 @@ class ADC(object):
         """
 
         cmd = 0x0A
-        counts = int(PiSoC.commChannel.receive_data(self.address, cmd))
+        counts = int(self.board.commChannel.receive_data(self.address, cmd))
 
         if counts<0:
             self.polarity = -1
@@ -712,20 +730,29 @@ class ADC(object):
         :Description:
 
             Simplifies the reading process by starting conversion, waiting for conversion to complete, stopping conversion, and returing the result, when called.
+            While it waits, the conversion is checked with a growing delay between checks, and it gives up waiting after *conversion_timeout* seconds.
 
         :returns:
 
             Digital value which represents the result of the most recent AD conversion 
+
+        :raises: :class:`~pisoc.ConversionTimeout` if the conversion did not finish within *conversion_timeout* seconds
         """
         if self.type != 'DELSIG':
             self.StartConvert()
+            deadline = time.time() + self.conversion_timeout
+            wait = 0.0001
             while not self.IsEndConversion():
-                pass
+                if time.time() > deadline:
+                    self.StopConvert()
+                    raise ConversionTimeout('Timed out waiting for the %s ADC to finish converting.'%self.type)
+                sleep(wait)
+                wait = min(2*wait, 0.01)
             counts = self.GetResult()
             self.StopConvert()
         else:
             cmd = 0x0D
-            counts = int(PiSoC.commChannel.receive_data(self.address, cmd))
+            counts = int(self.board.commChannel.receive_data(self.address, cmd))
 
         if counts<0:
             self.polarity = -1
@@ -753,7 +780,7 @@ class ADC(object):
         elif self.type == "SAR0" or self.type == "SAR1":
             cmd = 0x08
 
-        return bool(int(PiSoC.commChannel.receive_data(self.address,cmd)))
+        return bool(int(self.board.commChannel.receive_data(self.address,cmd)))
 
     def SetOffset(self, offset):
         """
@@ -780,7 +807,7 @@ class ADC(object):
         elif self.type == "SAR0" or self.type == "SAR1":
             cmd = 0x0B
 
-        PiSoC.commChannel.send_data(self.address,cmd, offset)
+        self.board.commChannel.send_data(self.address,cmd, offset)
 
     def SetGain(self, gain):
         """
@@ -813,7 +840,7 @@ class ADC(object):
             gain*=10 #SAR takes gain in counts per 10 volts
             cmd = 0x0C
 
-        PiSoC.commChannel.send_data(self.address,cmd, gain)
+        self.board.commChannel.send_data(self.address,cmd, gain)
 
     def CountsTo_Volts(self, counts):
         """
@@ -841,7 +868,7 @@ class ADC(object):
             cmd = 0x0D
 
         counts*=self.polarity
-        return self.polarity*(float(((PiSoC.commChannel.receive_data(self.address,cmd, counts))/1000000.0)))
+        return self.polarity*(float(((self.board.commChannel.receive_data(self.address,cmd, counts))/1000000.0)))
 
     def Sleep(self):
         """
@@ -862,7 +889,7 @@ class ADC(object):
         elif self.type == "SAR0" or self.type == "SAR1":
             cmd = 0x10
 
-        PiSoC.commChannel.send_data(self.address,cmd)
+        self.board.commChannel.send_data(self.address,cmd)
 
     def Wakeup(self):
         """
@@ -883,7 +910,7 @@ class ADC(object):
         elif self.type == "SAR0" or self.type == "SAR1":
             cmd = 0x11
 
-        PiSoC.commChannel.send_data(self.address,cmd)
+        self.board.commChannel.send_data(self.address,cmd)
 
 class IDAC(object):
     """
@@ -901,7 +928,7 @@ class IDAC(object):
     |
 
     """
-    def __init__(self, channel):
+    def __init__(self, channel, board = None):
         """
         :Method:
 
@@ -915,28 +942,33 @@ class IDAC(object):
 
         :type channel: int
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the IDAC is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
         """
+        self.board = PiSoC if board is None else board
         self.channel = channel
 
         if self.channel == 0:
-            if not PiSoC.IDAC0:
+            if not self.board.IDAC0:
                 raise ValueError('IDAC0 not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.IDAC0_CONTROL
-            self.full_range = PiSoC.IDAC0_RANGE
-       	elif self.channel == 1:
-            if not PiSoC.IDAC1:
+            self.full_range = self.board.IDAC0_RANGE
+        elif self.channel == 1:
+            if not self.board.IDAC1:
                 raise ValueError('IDAC1 not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.IDAC1_CONTROL
-            self.full_range = PiSoC.IDAC1_RANGE
+            self.full_range = self.board.IDAC1_RANGE
         else:
             raise ValueError('Invalid channel: Only two IDACs available; choose 0 or 1.')
 
-        if self.address in PiSoC.REGISTERS_IN_USE:
+        if self.address in self.board.REGISTERS_IN_USE:
             logging.warning('Attempting to initialize object at register %d which is already in use.' %self.address)
-        PiSoC.REGISTERS_IN_USE.append(self.address)
+        self.board.REGISTERS_IN_USE.append(self.address)
         self.__running = False
 
     def Start(self):
@@ -954,7 +986,7 @@ class IDAC(object):
             None
         """
         cmd = 0x00
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = True
 
     def Stop(self):
@@ -972,7 +1004,7 @@ class IDAC(object):
             None
         """
         cmd = 0x01
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = False
 
     def is_running(self):
@@ -1017,7 +1049,7 @@ class IDAC(object):
         else:
             raise ValueError('Invalid Speed: Input "HIGH" or "LOW"')
 
-        PiSoC.commChannel.send_data(self.address, cmd, val)
+        self.board.commChannel.send_data(self.address, cmd, val)
 
     def SetPolarity(self,polarity):
         """
@@ -1045,7 +1077,7 @@ class IDAC(object):
         else:
             raise ValueError('Invalid Polarity: Input "SOURCE" or "SINK"')
 
-        PiSoC.commChannel.send_data(self.address, cmd, val)
+        self.board.commChannel.send_data(self.address, cmd, val)
 
 
     def SetRange(self, mode):
@@ -1080,7 +1112,7 @@ class IDAC(object):
         elif mode == 2:
             self.full_range = 2.04
 
-        PiSoC.commChannel.send_data(self.address, cmd, mode)
+        self.board.commChannel.send_data(self.address, cmd, mode)
 
 
     def SetValue(self, value):
@@ -1109,7 +1141,7 @@ class IDAC(object):
         if value not in range(256):
             raise ValueError('Invalid IDAC Value: Input integer values between 0(min) and 255(max)')
 
-        PiSoC.commChannel.send_data(self.address, cmd, value)
+        self.board.commChannel.send_data(self.address, cmd, value)
 
     def SetCurrent(self, m_amps):
         """
@@ -1153,7 +1185,7 @@ class IDAC(object):
             None
         """
         cmd = 0x06
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
     def Wakeup(self):
         """
@@ -1170,7 +1202,7 @@ class IDAC(object):
             None
         """
         cmd = 0x07
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
 class VDAC(object):
     """
@@ -1185,7 +1217,7 @@ class VDAC(object):
             >>> My_VDAC       = VDAC(0)
             >>> My_other_VDAC = VDAC(1)
     """
-    def __init__(self, channel):
+    def __init__(self, channel, board = None):
         """
         :Method:
 
@@ -1199,29 +1231,34 @@ class VDAC(object):
 
             Determines which VDAC is to be utilized. *0* for the first VDAC, output is on P0[1]. Second VDAC not available by default.
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the VDAC is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
         """
+        self.board = PiSoC if board is None else board
 
         self.channel = channel
 
         if self.channel == 0:
-            if not PiSoC.VDAC0:
+            if not self.board.VDAC0:
                 raise ValueError('VDAC0 not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.VDAC0_CONTROL
-            self.full_range = PiSoC.VDAC0_RANGE
+            self.full_range = self.board.VDAC0_RANGE
         elif self.channel == 1:
-            if not PiSoC.VDAC1:
+            if not self.board.VDAC1:
                 raise ValueError('VDAC1 not found on PSoC Creator program, verify that it is in your schematic and named correctly')
             self.address = PiSoC.VDAC1_CONTROL
-            self.full_range = PiSoC.VDAC1_RANGE
+            self.full_range = self.board.VDAC1_RANGE
         else:
             raise ValueError('Invalid channel: Only two VDACs available; choose 0 or 1')
 
-        if self.address in PiSoC.REGISTERS_IN_USE:
+        if self.address in self.board.REGISTERS_IN_USE:
             logging.warning('Attempting to initialize object at register %d which is already in use.' %self.address)
-        PiSoC.REGISTERS_IN_USE.append(self.address)
+        self.board.REGISTERS_IN_USE.append(self.address)
         self.__running = False
 
     def Start(self):
@@ -1239,7 +1276,7 @@ class VDAC(object):
             None
         """
         cmd = 0x00
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = True
 
     def Stop(self):
@@ -1257,7 +1294,7 @@ class VDAC(object):
             None
         """
         cmd = 0x01
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = False
 
     def is_running(self):
@@ -1301,7 +1338,7 @@ class VDAC(object):
         else:
             raise ValueError('Invalid Speed: Input "HIGH" or "LOW"')
 
-        PiSoC.commChannel.send_data(self.address, cmd, val)
+        self.board.commChannel.send_data(self.address, cmd, val)
 
     def SetRange(self,mode):
         """
@@ -1334,7 +1371,7 @@ class VDAC(object):
         else:
             raise ValueError('Invalid Range: Input "HIGH" for 4.080V range or "LOW" for 1.020V range')
 
-        PiSoC.commChannel.send_data(self.address, cmd, val)
+        self.board.commChannel.send_data(self.address, cmd, val)
 
     def SetVoltage(self, volts):
         """
@@ -1390,7 +1427,7 @@ class VDAC(object):
         if value not in range(256):
             raise ValueError('Invalid VDAC Value: Input values between 0(min) and 255(max)')
 
-        PiSoC.commChannel.send_data(self.address, cmd, value)
+        self.board.commChannel.send_data(self.address, cmd, value)
 
 
     def Sleep(self):
@@ -1408,7 +1445,7 @@ class VDAC(object):
             None
         """
         cmd = 0x05
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
     def Wakeup(self):
         """
@@ -1426,7 +1463,7 @@ class VDAC(object):
         """
 
         cmd = 0x06
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
 class WaveDAC(object):
     """
@@ -1441,7 +1478,7 @@ class WaveDAC(object):
             >>> My_Wave = WaveDAC()
     """
 
-    def __init__(self):
+    def __init__(self, board = None):
         """
         :Method:
 
@@ -1451,12 +1488,17 @@ class WaveDAC(object):
 
             Constructs and initializes an WaveDAC object 
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the WaveDAC is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
         """
+        self.board = PiSoC if board is None else board
 
-        if not PiSoC.WAVEDAC:
+        if not self.board.WAVEDAC:
                 raise ValueError('Wave DAC not found on PSoC Creator program, verify that it is in your schematic and named correctly')
         self.master_clk = 3000000 #might want to automate....
         self.frequency = 250000
@@ -1466,9 +1508,9 @@ class WaveDAC(object):
         self.waveType = 'SINE'
         self.address = PiSoC.WAVEDAC_CONTROL
 
-        if self.address in PiSoC.REGISTERS_IN_USE:
+        if self.address in self.board.REGISTERS_IN_USE:
             logging.warning('Attempting to initialize object at register %d which is already in use.' %self.address)
-        PiSoC.REGISTERS_IN_USE.append(self.address)
+        self.board.REGISTERS_IN_USE.append(self.address)
         self.__running = False
 
     def Start(self):
@@ -1486,7 +1528,7 @@ class WaveDAC(object):
             None
         """
         cmd = 0x00
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = True
 
     def Stop(self):
@@ -1504,7 +1546,7 @@ class WaveDAC(object):
             None
         """
         cmd = 0x01
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = False
 
     def is_running(self):
@@ -1551,7 +1593,7 @@ class WaveDAC(object):
             raise ValueError('Invalid Speed: Choose "HIGH" or "LOW"')
 
 
-        PiSoC.commChannel.send_data(self.address, cmd, val)
+        self.board.commChannel.send_data(self.address, cmd, val)
 
     def GenerateWave(self, waveType, amplitude = 4.0, dc_bias = 0.0):
         """
@@ -1595,8 +1637,8 @@ class WaveDAC(object):
         self.amplitude = int(255/4.0*float(amplitude))
         self.dcBias = int(255/4.0*float(dc_bias))
 
-        PiSoC.commChannel.send_data(self.address, cmd, val, self.amplitude, self.dcBias, Hformat = [])
-        #PiSoC.commChannel.send_data((val, self.amplitude, self.dcBias))
+        self.board.commChannel.send_data(self.address, cmd, val, self.amplitude, self.dcBias, Hformat = [])
+        #self.board.commChannel.send_data((val, self.amplitude, self.dcBias))
 
 
     def SetValue(self, val):
@@ -1621,7 +1663,7 @@ class WaveDAC(object):
         if val not in range(256):
             raise ValueError('Invalid WaveDAC Value: Input integer between 0(min) and 255(max)')
         else:
-            PiSoC.commChannel.send_data(self.address,cmd,val)
+            self.board.commChannel.send_data(self.address,cmd,val)
 
     def Sleep(self):
         """
@@ -1638,7 +1680,7 @@ class WaveDAC(object):
             None
         """
         cmd = 0x0B
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
     def Wakeup(self):
         """
@@ -1655,7 +1697,7 @@ class WaveDAC(object):
             None
         """
         cmd = 0x0C
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
 
     def SetFrequency(self, frequency):
@@ -1686,7 +1728,7 @@ class WaveDAC(object):
             frequency = 0.46
 
         divider = int((self.master_clk/(frequency*100.0)) + 0.5)
-        self.divider_value = (PiSoC.commChannel.receive_data(self.address, cmd, divider)) + 1
+        self.divider_value = (self.board.commChannel.receive_data(self.address, cmd, divider)) + 1
 
     def GetFrequency(self):
         """
@@ -1719,7 +1761,7 @@ class WaveDAC(object):
             None
         """
         cmd = 0xFD
-        PiSoC.commChannel.send_data(self.address,cmd)
+        self.board.commChannel.send_data(self.address,cmd)
 
     def StopClock(self):
         """
@@ -1736,6 +1778,6 @@ class WaveDAC(object):
             None
         """
         cmd = 0xFE
-        PiSoC.commChannel.send_data(self.address,cmd)
+        self.board.commChannel.send_data(self.address,cmd)
 
 
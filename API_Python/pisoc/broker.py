@@ -0,0 +1,444 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Lets several local processes share one PiSoC. A :class:`Broker` owns the PiSoC's transport and serves client processes over a Unix domain socket;
+clients construct the PiSoC with the "BROKER" protocol, which gives them a :class:`BrokerClient` as :attr:`PiSoC.commChannel`, and then use the components as usual.
+
+The broker can be started from the command line:
+
+    python -m pisoc.broker --protocol PC --path /tmp/pisoc.sock
+
+:Example:
+
+    >>> from pisoc import *
+    >>> PiSoC('BROKER')
+    >>> led = DigitalPin(12, 0, 'output')
+    >>> led.Toggle()
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import os
+import json
+import errno
+import select
+import socket
+import logging
+import argparse
+from pisoc import *
+
+#exceptions which the broker passes on to the client whose request raised them; others are raised as RuntimeError. LostConnection is left out,
+#since a client raises it when its own connection to the broker is lost.
+ERRORS = dict((cls.__name__, cls) for cls in (ValueError, TypeError, IndexError, KeyError, RuntimeError, ClosedPortException, DeadlineMissed))
+
+def error_reply(e):
+    """
+    :Function: error_reply
+
+    :Description: Makes the reply which tells a client that its request raised *e*, naming the class of the exception so that :class:`BrokerClient` can raise the same one
+
+    :param e: The exception
+    :type e: Exception
+
+    :returns: dict to send to the client
+    """
+    name = type(e).__name__
+    return {'error': str(e) if name in ERRORS else '%s: %s'%(name, e), 'type': name}
+
+
+class Broker(object):
+    """
+    :Class:
+
+        Owns :attr:`PiSoC.commChannel` on behalf of every client connected to its socket. The PiSoC is only queried once, by :func:`~pisoc.build_info`, and what was learned
+        is sent to each client when it connects, so clients start without talking to the board.
+
+        Requests are handled in rounds: everything the clients have sent when the broker wakes up is dispatched together. Writes in a round are collected into
+        :class:`~pisoc.Batch` frames, and identical reads from different clients, with no write between them, are answered by a single request to the PiSoC, if they are status reads named
+        in :attr:`MERGED_READS`, which have no effect on the PiSoC. Other reads, such as those which calibrate a CapSense sensor, change a PWM clock, or start or collect an ADC conversion, are all made.
+        Replies are sent once the round's frames have been answered, so a client's write has been made when its call returns.
+
+        Resets are not passed on, since they would reset the components other clients are using.
+
+        Client sockets are non-blocking. Replies are queued for each client and written as its socket has room, so a client which stops reading does not hold up the others;
+        it is disconnected once more than :attr:`MAX_BACKLOG` bytes of replies are waiting for it.
+    """
+    MAX_BACKLOG = 1<<20
+
+    MERGED_READS = frozenset([(PiSoC.GPIO_REGISTER, 0x00), (PiSoC.GPIO_REGISTER, 0x04)] + #DigitalPin.Read and ReadBitmap
+                             [(PiSoC.CHECK_BUILD, cmd) for cmd in (0x00, 0x01, 0x02, 0x03, 0x04, 0x07, 0x08, 0x09, 0x0B, 0x0D)]) #what the firmware build has
+
+    def __init__(self, path = PiSoC.BROKER_PATH, protocol = None, com_port = '/dev/ttyAMA0', baud = 9600, log_level = None, window = 1):
+        """
+        :Method: __init__
+
+        :Description: Connects to the PiSoC, as :meth:`pisoc.PiSoC.__new__` does with the same parameters, and then listens on *path*
+
+        :param path: Path of the Unix domain socket to serve. Defaults to :attr:`PiSoC.BROKER_PATH`.
+        :type path: str
+
+        :returns: None
+
+        :raises: RuntimeError if another broker is already serving *path*
+        """
+        PiSoC(protocol, com_port, baud, log_level, window)
+        self.topology = get_topology()
+        self.path = path
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except socket.error:
+                os.unlink(path) #left behind by a broker which did not shut down cleanly
+            else:
+                raise RuntimeError("A PiSoC broker is already serving %s"%path)
+            finally:
+                probe.close()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(8)
+        self.clients = dict()
+        self.backlogs = dict()
+        self.running = False
+        logging.info('PiSoC broker listening on %s'%path)
+
+    def serve_forever(self, poll_interval = 0.5):
+        """
+        :Method: serve_forever
+
+        :Description: Serves clients until :meth:`shutdown` is called
+
+        :param poll_interval: Longest time, in seconds, to wait for a client before checking whether to stop
+        :type poll_interval: float
+
+        :returns: None
+        """
+        self.running = True
+        try:
+            while self.running:
+                self.serve_once(poll_interval)
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """
+        :Method: shutdown
+
+        :Description: Makes :meth:`serve_forever` return, after the round it is handling
+
+        :returns: None
+        """
+        self.running = False
+
+    def serve_once(self, timeout = None):
+        """
+        :Method: serve_once
+
+        :Description: Waits for clients to connect or send requests, and handles one round of them
+
+        :param timeout: Longest time to wait, in seconds. Waits forever if None.
+        :type timeout: float
+
+        :returns: None
+        """
+        readable, writable = select.select([self.server] + list(self.clients), [sock for sock in self.backlogs if self.backlogs[sock]], [], timeout)[:2]
+        for sock in writable:
+            if sock in self.clients:
+                self.send(sock)
+        requests = []
+        for sock in readable:
+            if sock is self.server:
+                self.accept()
+                continue
+            if sock not in self.clients:
+                continue
+            try:
+                chunk = sock.recv(4096)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                chunk = b''
+            if not chunk:
+                self.drop(sock)
+                continue
+            buf = self.clients[sock]
+            buf.extend(bytearray(chunk))
+            while b'\n' in buf:
+                pos = buf.index(b'\n')
+                line = bytes(buf[:pos])
+                del buf[:pos + 1]
+                try:
+                    requests.append((sock, self.parse(line)))
+                except ValueError as e: #answered in turn, so the client's replies stay in order
+                    logging.warning('PiSoC broker: bad request from a client: %s'%e)
+                    requests.append((sock, e))
+        if requests:
+            self.dispatch(requests)
+
+    def parse(self, line):
+        """
+        :Method: parse
+
+        :Description: Decodes one line sent by a client, and checks that it is a request the broker can make
+
+        :param line: The line, without its newline
+        :type line: bytes
+
+        :returns: The request, as a dict
+
+        :raises: ValueError if the line is not valid JSON, or is not a well-formed request
+        """
+        msg = json.loads(line.decode('utf-8')) #JSON and Unicode decoding errors are ValueErrors
+        if not isinstance(msg, dict):
+            raise ValueError('a request must be a JSON object')
+        method = msg.get('method')
+        if method not in ('send_data', 'receive_data', 'flush'):
+            raise ValueError('unknown method: %r'%(method,))
+        args = msg.setdefault('args', [])
+        Hformat = msg.setdefault('Hformat', [2])
+        for name, value in (('args', args), ('Hformat', Hformat)):
+            if not isinstance(value, list) or not all(isinstance(x, int) and not isinstance(x, bool) for x in value):
+                raise ValueError('%s must be a list of integers'%name)
+        if method != 'flush' and not args:
+            raise ValueError('%s needs an address'%method)
+        return msg
+
+    def accept(self):
+        sock = self.server.accept()[0]
+        sock.setblocking(False)
+        self.clients[sock] = bytearray()
+        self.backlogs[sock] = bytearray()
+        self.reply(sock, {'topology': self.topology})
+        logging.debug('PiSoC broker: client connected (%d connected)'%len(self.clients))
+
+    def drop(self, sock):
+        del self.clients[sock]
+        del self.backlogs[sock]
+        sock.close()
+        logging.debug('PiSoC broker: client disconnected (%d connected)'%len(self.clients))
+
+    def reply(self, sock, msg):
+        backlog = self.backlogs[sock]
+        backlog.extend(bytearray((json.dumps(msg) + '\n').encode('utf-8')))
+        self.send(sock)
+        if sock in self.clients and len(backlog) > self.MAX_BACKLOG:
+            logging.warning('PiSoC broker: dropping a client which is not reading its replies')
+            self.drop(sock)
+
+    def send(self, sock):
+        backlog = self.backlogs[sock]
+        try:
+            sent = sock.send(bytes(backlog))
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.drop(sock)
+            return
+        del backlog[:sent]
+
+    def dispatch(self, requests):
+        """
+        :Method: dispatch
+
+        :Description: Makes the requests of one round on the PiSoC, in the order they arrived, and sends the replies
+
+        :param requests: (socket, message) pairs. The message is the ValueError raised by :meth:`parse` for a request which could not be read.
+        :type requests: list
+
+        :returns: None
+        """
+        replies = []
+        reads = dict()
+        try:
+            with PiSoC.batch() as batch:
+                for sock, msg in requests:
+                    try:
+                        replies.append((sock, self.handle(batch, reads, sock, msg)))
+                    except (ClosedPortException, LostConnection):
+                        raise
+                    except Exception as e: #only this client's request failed
+                        logging.warning('PiSoC broker: request %r failed: %r'%(msg, e))
+                        replies.append((sock, error_reply(e)))
+        except (ClosedPortException, LostConnection) as e:
+            logging.error('PiSoC broker: %s'%e)
+            replies = [(sock, error_reply(e)) for sock, msg in requests] #the round's writes may not have been made
+        for sock, msg in replies:
+            if sock in self.clients:
+                self.reply(sock, msg)
+
+    def handle(self, batch, reads, sock, msg):
+        if isinstance(msg, ValueError):
+            return error_reply(ValueError('Bad request: %s'%msg))
+        method = msg.get('method')
+        args = tuple(msg.get('args', ()))
+        Hformat = msg.get('Hformat', [2])
+        if method == 'send_data':
+            reads.clear()
+            if args[:1] == (PiSoC.RESET_ADDRESS,):
+                logging.info('PiSoC broker: not passing on a reset from a client')
+            else:
+                batch.send_data(*args, Hformat = Hformat)
+            return {'result': None}
+        elif method == 'receive_data':
+            key = (args, tuple(Hformat))
+            if key in reads and sock not in reads[key][1] and args[:2] in Broker.MERGED_READS:
+                resp = reads[key][0]
+                reads[key][1].add(sock)
+            else:
+                resp = batch.receive_data(*args, Hformat = Hformat)
+                reads[key] = (resp, set([sock]))
+            return {'result': resp}
+        elif method == 'flush':
+            batch.flush()
+            batch.channel.flush()
+            return {'result': None}
+        return error_reply(ValueError('Unknown request: %s'%method))
+
+    def close(self):
+        """
+        :Method: close
+
+        :Description: Disconnects every client, removes the socket, and cleans up the PiSoC's transport
+
+        :returns: None
+        """
+        for sock in list(self.clients):
+            self.drop(sock)
+        self.server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        PiSoC.commChannel.cleanup()
+
+
+class BrokerClient(object):
+    """
+    :Class:
+
+        Transport which sends each request to a :class:`Broker` and waits for its reply. It is created by :meth:`pisoc.PiSoC.__new__` for the "BROKER" protocol,
+        and holds the topology the broker sent, which is used in place of :func:`~pisoc.build_info`.
+
+        A request which fails at the broker raises the same exception in the client, if it is one of those in :data:`ERRORS`, or else RuntimeError. :class:`~pisoc.LostConnection` is only raised
+        when the connection to the broker is lost.
+    """
+    def __init__(self, path = PiSoC.BROKER_PATH):
+        """
+        :Method: __init__
+
+        :Description: Connects to the broker serving *path*
+
+        :param path: Path of the broker's Unix domain socket
+        :type path: str
+
+        :returns: None
+
+        :raises: :class:`~pisoc.ClosedPortException` if no broker is serving *path*
+        """
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except socket.error as e:
+            raise ClosedPortException("Can't connect to a PiSoC broker at %s: %s"%(path, e))
+        self.stream = self.sock.makefile('rb')
+        self.topology = self.read_reply()['topology']
+
+    def read_reply(self):
+        line = self.stream.readline()
+        if not line:
+            raise LostConnection("The PiSoC broker closed the connection")
+        return json.loads(line.decode('utf-8'))
+
+    def request(self, method, args = (), Hformat = (2,)):
+        msg = {'method': method, 'args': list(args), 'Hformat': list(Hformat)}
+        try:
+            self.sock.sendall((json.dumps(msg) + '\n').encode('utf-8'))
+        except socket.error:
+            raise LostConnection("Lost connection to the PiSoC broker")
+        reply = self.read_reply()
+        if 'error' in reply:
+            raise ERRORS.get(reply.get('type'), RuntimeError)(reply['error'])
+        return reply['result']
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Has the broker send data to the PiSoC, as :meth:`~pisoc.UART.send_data` does
+
+        :returns: None
+        """
+        self.request('send_data', args, kwargs.get('Hformat', [2]))
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Has the broker request data from the PiSoC, as :meth:`~pisoc.UART.receive_data` does
+
+        :returns: The response from the PiSoC
+        """
+        return self.request('receive_data', args, kwargs.get('Hformat', [2]))
+
+    def set_window(self, window):
+        logging.debug('The window is chosen by the PiSoC broker.')
+        return 1
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Waits until the broker has had every request sent so far answered by the PiSoC
+
+        :returns: None
+        """
+        self.request('flush')
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Disconnects from the broker. The PiSoC is not reset, since other clients may still be using it.
+
+        :returns: None
+        """
+        self.stream.close()
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Shares one PiSoC between local processes')
+    parser.add_argument('--path', default = PiSoC.BROKER_PATH, help = 'Unix domain socket to serve')
+    parser.add_argument('--protocol', default = None, help = 'PC, USB, PI, UART, I2C or LOOPBACK; detected if not given')
+    parser.add_argument('--com-port', default = '/dev/ttyAMA0')
+    parser.add_argument('--baud', type = int, default = 9600)
+    parser.add_argument('--window', type = int, default = 1)
+    parser.add_argument('--log-level', default = 'info', choices = ['debug', 'info', 'warn', 'error'])
+    opts = parser.parse_args()
+    broker = Broker(opts.path, opts.protocol, opts.com_port, opts.baud, opts.log_level, opts.window)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Holds back writes to the PiSoC, so that only the last of several writes to the same component is sent. The :class:`Coalescer` is created by :meth:`pisoc.PiSoC.coalesce`,
+which is when this module is loaded.
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import time
+import logging
+import threading
+import collections
+from pisoc import *
+
+
+class Coalescer(object):
+    """
+    :Class:
+
+        Holds back writes to the PiSoC and sends them at most :attr:`max_rate` times a second, so that a loop which updates an actuator faster than it can usefully change does not saturate the link.
+        Writes are keyed by their address and command, and by the pin for a :class:`~pisoc.digital.DigitalPin`, as well as by how they are formatted; a write which is superseded by another with the same key before it is sent is dropped,
+        and counted in :attr:`elided`. The writes which are sent are the last one made for each key, in the order in which each key was first written
+        since the writes were last sent, so that, for example, a pin's drive mode still goes out before a value written to it afterwards. It is created with :meth:`~pisoc.PiSoC.coalesce`, and stands in for the
+        session's :attr:`~pisoc.PiSoC.commChannel` while its *with* block runs.
+
+        A read first sends the writes held back for the same address, so a component always reads back what was written to it. Writes held back for other addresses are not sent by a read;
+        use :meth:`flush` when one component must see what was written to another. Writes which cannot be repeated or dropped, such as :meth:`~pisoc.digital.DigitalPin.Toggle`, are held back in order but never dropped.
+
+        Held back writes are sent by a background thread once they are due, and together in one frame when the firmware supports batches.
+    """
+    def __init__(self, board = None, max_rate = 50):
+        """
+        :Method: __init__
+
+        :param board: The session whose writes are coalesced. Defaults to the :class:`~pisoc.PiSoC` class itself.
+
+        :param max_rate: Largest number of times a second that held back writes are sent
+        :type max_rate: float
+        """
+        if max_rate <= 0:
+            raise ValueError('The rate at which writes are sent must be positive')
+        self.board = PiSoC if board is None else board
+        self.channel = None
+        self.max_rate = float(max_rate)
+        self.pending = collections.OrderedDict()
+        self.elided = 0
+        self.sent = 0
+        self.due = 0
+        self.error = None
+        self.closed = True
+        self.clock = getattr(time, 'monotonic', time.time)
+        self.cond = threading.Condition(threading.RLock())
+        self.thread = None
+
+    def __enter__(self):
+        self.channel = self.board.commChannel
+        self.closed = False
+        self.thread = threading.Thread(target = self.run, name = 'PiSoC coalescer')
+        self.thread.daemon = True
+        self.thread.start()
+        self.board.commChannel = self
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            with self.cond:
+                self.closed = True
+                self.cond.notify()
+            self.thread.join()
+            self.flush()
+        finally:
+            self.board.commChannel = self.channel
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def key(self, args, kwargs):
+        """
+        :Method: key
+
+        :Description: Decides which writes supersede each other. Writes sent with a different *Hformat* or *delay* do not supersede each other.
+
+        :returns: The key for a write, or None if it must be sent as it is
+        """
+        if args[0] in (PiSoC.RESET_ADDRESS, PiSoC.BATCH_REGISTER, PiSoC.CHECK_BUILD, PiSoC.TEST_REGISTER):
+            return None
+        options = (tuple(kwargs.get('Hformat', [2])), kwargs.get('delay'))
+        if args[0] == PiSoC.GPIO_REGISTER:
+            if len(args) < 3 or args[1] == 0x02: #a toggle depends on the one before it
+                return object()
+            return (args[0], args[1], (args[2]>>1)&0x7F) + options #the port and pin
+        return (args[0], args[1] if len(args) > 1 else None) + options
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Holds back a write, replacing any write with the same key which has not been sent yet. Writes are sent straight away if none have been for 1/:attr:`max_rate` seconds.
+
+        :param args: Ordered list of data to be sent to the pisoc, as for :meth:`~pisoc.UART.send_data`
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :returns: None
+        """
+        key = self.key(args, kwargs)
+        with self.cond:
+            self.check()
+            if key is None:
+                self.send_pending()
+                return self.channel.send_data(*args, **kwargs)
+            superseded = self.pending.get(key)
+            if superseded is not None:
+                self.elided+=1
+                if getattr(self.board, 'METRICS', None) is not None:
+                    self.board.METRICS.note(superseded[0], 'elided')
+            self.pending[key] = (args, kwargs) #a superseded write is replaced where it was, so writes go out in the order their keys were first written
+            if self.clock() >= self.due:
+                self.send_pending()
+            else:
+                self.cond.notify()
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Sends the writes held back for the same address, and then sends a request for data to the PiSoC.
+
+        :param args: Ordered list of data to be sent to the pisoc, as for :meth:`~pisoc.UART.receive_data`
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :returns: The response from the PiSoC
+        """
+        with self.cond:
+            self.check()
+            if args[0] in (PiSoC.RESET_ADDRESS, PiSoC.BATCH_REGISTER):
+                self.send_pending()
+            else:
+                self.send_pending(args[0])
+            return self.channel.receive_data(*args, **kwargs)
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Sends every write which is held back, whether or not it is due, and waits until the transport underneath has sent them.
+
+        :returns: None
+        """
+        with self.cond:
+            self.check()
+            self.send_pending()
+            if hasattr(self.channel, 'flush'):
+                self.channel.flush()
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Drops the writes held back, stops the background thread, and cleans up the transport underneath
+
+        :returns: None
+        """
+        with self.cond:
+            self.pending.clear()
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.channel.cleanup()
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def send_pending(self, addr = None):
+        commands = [key for key in self.pending if addr is None or self.pending[key][0][0] == addr]
+        if addr is None:
+            self.due = self.clock() + 1.0/self.max_rate
+        if not commands:
+            return
+        writes = [self.pending.pop(key) for key in commands]
+        self.sent+=len(writes)
+        if len(writes) == 1 or not self.board.FEATURES&PiSoC.FEATURE_BATCH:
+            for args, kwargs in writes:
+                self.channel.send_data(*args, **kwargs)
+            return
+        batch = Batch(self.board)
+        batch.channel = self.channel
+        for args, kwargs in writes:
+            batch.send_data(*args, **kwargs)
+        batch.flush()
+
+    def run(self):
+        with self.cond:
+            while not self.closed:
+                if not self.pending:
+                    self.cond.wait()
+                    continue
+                wait = self.due - self.clock()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                try:
+                    self.send_pending()
+                except Exception as e: #raised to the next caller instead
+                    logging.error('Could not send held back writes: %s'%e)
+                    self.pending.clear()
+                    self.error = e
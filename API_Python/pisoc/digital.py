@@ -49,7 +49,7 @@ class DigitalPin(object):
 
     """
 
-    def __init__(self, port, pin, configuration = None):
+    def __init__(self, port, pin, configuration = None, board = None):
         """
         :Method:
 
@@ -82,6 +82,10 @@ class DigitalPin(object):
                     Sets pin as resitive pull up/down
 
         :type configuration: str
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the pin is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
@@ -91,25 +95,26 @@ class DigitalPin(object):
             GPIO pins unavailable to the firmware will raise a *ValueError*. Verify valid **port** and **pin** assignments using the info qualifier when PiSoC is constructed.
 
         """
+        self.board = PiSoC if board is None else board
 
         self.address = PiSoC.GPIO_REGISTER
 
 
-        if int(port) not in PiSoC.GPIO.keys():
-            msg  = 'Invalid port: Port numbers found on PiSoC are %s'%", ".join( str(c) for c in PiSoC.GPIO.keys() )
+        if int(port) not in self.board.GPIO.keys():
+            msg  = 'Invalid port: Port numbers found on PiSoC are %s'%", ".join( str(c) for c in self.board.GPIO.keys() )
             raise ValueError(msg) 
         else:
             self.port = int(port)
 
-        if int(pin) not in PiSoC.GPIO[self.port]:
-            msg = 'Invalid pin: the second argument should be the pin number relative to the desired port. Valid entries on this port are %s'%", ".join(str(c) for c in PiSoC.GPIO[self.port])
+        if int(pin) not in self.board.GPIO[self.port]:
+            msg = 'Invalid pin: the second argument should be the pin number relative to the desired port. Valid entries on this port are %s'%", ".join(str(c) for c in self.board.GPIO[self.port])
             raise ValueError(msg)
         else:
             self.pin = int(pin)
 
         i = 0
-        for _port in sorted(PiSoC.GPIO):
-            for _pin in PiSoC.GPIO[_port]:
+        for _port in sorted(self.board.GPIO):
+            for _pin in self.board.GPIO[_port]:
                 if _port == self.port and _pin == self.pin:
                     self.pin_absolute = i
                     break
@@ -174,7 +179,7 @@ class DigitalPin(object):
             raise ValueError('Invalid pin configuration')
         if not self.config is None:
             dat = (self.config<<8)|(self.port<<4) | (self.pin<<1)
-            PiSoC.commChannel.send_data(self.address,cmd,dat)
+            self.board.commChannel.send_data(self.address,cmd,dat)
             self.Read()
 
     def Write(self, val):
@@ -200,7 +205,7 @@ class DigitalPin(object):
 
         cmd = 0x01
         dat = (self.port<<4) | (self.pin<<1) | (int(val)&0x01)
-        PiSoC.commChannel.send_data(self.address,cmd,dat)
+        self.board.commChannel.send_data(self.address,cmd,dat)
         self.state = val
 
     def Toggle(self):
@@ -222,7 +227,7 @@ class DigitalPin(object):
         #self.Write(val)
         cmd = 0x02
         dat = (self.port<<4) | (self.pin<<1)
-        PiSoC.commChannel.send_data(self.address,cmd,dat)
+        self.board.commChannel.send_data(self.address,cmd,dat)
 
     def Read(self, bitmap = None, port = False):
         """
@@ -260,7 +265,7 @@ class DigitalPin(object):
 
         else:
             dat = (self.port<<4) | (self.pin<<1)
-            self.state = bool(PiSoC.commChannel.receive_data(self.address, cmd, dat))
+            self.state = bool(self.board.commChannel.receive_data(self.address, cmd, dat))
         return self.state
     def get_port_state(self):
         """
@@ -284,7 +289,7 @@ class DigitalPin(object):
 
         """
         #cmd = 0x05 TODO. Firmware bug appears to make this not work. Workaround is to derive port state from gpio_bitmap
-        #return PiSoC.commChannel.receive_data(self.address, cmd, self.port<<4)
+        #return self.board.commChannel.receive_data(self.address, cmd, self.port<<4)
 
 
         bitmap = self.get_gpio_bitmap()
@@ -292,8 +297,8 @@ class DigitalPin(object):
         i = 0
         j = 0
         result = 0
-        for _port in sorted(PiSoC.GPIO):
-            for _pin in PiSoC.GPIO[_port]:
+        for _port in sorted(self.board.GPIO):
+            for _pin in self.board.GPIO[_port]:
                 if _port == self.port:
                     result |= ((bitmap >> i) << j)
                     j+=1
@@ -325,7 +330,7 @@ class DigitalPin(object):
 
         """
         cmd = 0x04
-        return PiSoC.commChannel.receive_data(self.address, cmd)
+        return self.board.commChannel.receive_data(self.address, cmd)
 
 class PWM(object):
     """
@@ -341,7 +346,7 @@ class PWM(object):
 
     |
     """
-    def __init__(self, channel, frequency = None, duty_cycle = None):
+    def __init__(self, channel, frequency = None, duty_cycle = None, board = None):
         """
         :Method:
 
@@ -369,16 +374,21 @@ class PWM(object):
 
         :type duty_cycle: float
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the PWM is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
 
         """
+        self.board = PiSoC if board is None else board
 
-        if channel not in range(PiSoC.PWM_NUM ):
-            raise ValueError('Invalid PWM Channel specified, valid entires are 0 through %d' %PiSoC.PWM_NUM)
-        for key in PiSoC.PWM_clks:
-            for i in PiSoC.PWM_clks[key][2]:
+        if channel not in range(self.board.PWM_NUM ):
+            raise ValueError('Invalid PWM Channel specified, valid entires are 0 through %d' %self.board.PWM_NUM)
+        for key in self.board.PWM_clks:
+            for i in self.board.PWM_clks[key][2]:
                 if int(channel) ==  i[0]:
                     addr_str = "PiSoC.PWM_REGISTER"+str(channel)
                     setattr(self, 'address', eval(addr_str))
@@ -386,8 +396,8 @@ class PWM(object):
                     self.resolution_in_bits = int(i[1])
         self.channel = channel
         self.max_num = pow(2,self.resolution_in_bits) - 1
-        self.max_clk = PiSoC.PWM_clks[self.clk_number][0]
-        self.min_clk = int(PiSoC.PWM_clks[self.clk_number][0]/65535) + 1
+        self.max_clk = self.board.PWM_clks[self.clk_number][0]
+        self.min_clk = int(self.board.PWM_clks[self.clk_number][0]/65535) + 1
         self.Start()
         self.period = self.ReadPeriod()
         self.cmp = self.ReadCompare()
@@ -401,9 +411,9 @@ class PWM(object):
         
 
 
-        if self.address in PiSoC.REGISTERS_IN_USE:
+        if self.address in self.board.REGISTERS_IN_USE:
             logging.warning('Attempting to initialize object at register %d which is already in use.' %self.address)
-        PiSoC.REGISTERS_IN_USE.append(self.address)
+        self.board.REGISTERS_IN_USE.append(self.address)
 
     def __repr__(self):
         return "PWM(channel=%r, frequency=%r, duty_cycle=%r)"%(self.channel, round(self.GetFrequency(), 2), round(self.GetDutyCycle(), 2))
@@ -422,7 +432,7 @@ class PWM(object):
             None
         """
         cmd = 0x00
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = True
 
     def is_running(self):
@@ -458,7 +468,7 @@ class PWM(object):
 
         """
         cmd = 0x01
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__running = False
 
     def WritePeriod(self, period):
@@ -498,7 +508,7 @@ class PWM(object):
             self.cmp = int(self.period)
             self.WriteCompare(self.cmp)
 
-        PiSoC.commChannel.send_data(self.address, cmd, self.period)
+        self.board.commChannel.send_data(self.address, cmd, self.period)
 
     def ReadPeriod(self):
         """
@@ -516,7 +526,7 @@ class PWM(object):
 
         """
         cmd = 0x0D
-        self.period = PiSoC.commChannel.receive_data(self.address, cmd)
+        self.period = self.board.commChannel.receive_data(self.address, cmd)
         return self.period
 
     def WriteCompare(self, cmp): #todo change cmp to a different variable name. 
@@ -554,7 +564,7 @@ class PWM(object):
             self.period = self.cmp
             self.WritePeriod(self.period)
 
-        PiSoC.commChannel.send_data(self.address, cmd, self.cmp)
+        self.board.commChannel.send_data(self.address, cmd, self.cmp)
 
     def ReadCompare(self):
         """
@@ -576,7 +586,7 @@ class PWM(object):
 
         """
         cmd = 0x0F
-        self.cmp = PiSoC.commChannel.receive_data(self.address, cmd)
+        self.cmp = self.board.commChannel.receive_data(self.address, cmd)
         return self.cmp
 
     def ClearFIFO(self):
@@ -599,7 +609,7 @@ class PWM(object):
 
         """
         cmd = 0x18
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
 
     def Sleep(self):
         """
@@ -617,7 +627,7 @@ class PWM(object):
 
         """
         cmd = 0x19
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__sleeping = True
 
     def Wakeup(self):
@@ -636,7 +646,7 @@ class PWM(object):
 
         """
         cmd = 0x1A
-        PiSoC.commChannel.send_data(self.address, cmd)
+        self.board.commChannel.send_data(self.address, cmd)
         self.__sleeping = False
 
     def SetClocks(self, frequency):
@@ -681,8 +691,8 @@ class PWM(object):
             logging.warning("Attempted to set PWM clock frequency greater than 2.526 MHz; this frequency cannot be gauranteed within a tolerance of 5%. Get the actual frequency with the GetClocks() method")
 
         cmd = 0xFF
-        attempt_divider = int((PiSoC.PWM_clks[self.clk_number][0]/float(frequency)) + 0.5)
-        PiSoC.PWM_clks[self.clk_number][1] = (PiSoC.commChannel.receive_data(self.address,cmd, attempt_divider)) + 1
+        attempt_divider = int((self.board.PWM_clks[self.clk_number][0]/float(frequency)) + 0.5)
+        self.board.PWM_clks[self.clk_number][1] = (self.board.commChannel.receive_data(self.address,cmd, attempt_divider)) + 1
 
     def GetClocks(self, precision = 2):
         """
@@ -705,7 +715,7 @@ class PWM(object):
             Floating point value which represents the source clock frequency for this PWM in Hertz.
 
         """
-        return round(((PiSoC.PWM_clks[self.clk_number][0])/float((PiSoC.PWM_clks[self.clk_number][1]))), precision)
+        return round(((self.board.PWM_clks[self.clk_number][0])/float((self.board.PWM_clks[self.clk_number][1]))), precision)
 
     def GetClockDivider(self):
         """
@@ -723,7 +733,7 @@ class PWM(object):
 
         """
 
-        return PiSoC.PWM_clks[self.clk_number][1]
+        return self.board.PWM_clks[self.clk_number][1]
 
     def SetClockDivider(self, divider):
         """
@@ -754,7 +764,7 @@ class PWM(object):
         divider = int(divider + .5)
         if divider<0 or divider>65535:
             raise ValueError('Invalide range for SetClockDivider() method')
-        PiSoC.PWM_clks[self.clk_number][1] = (PiSoC.commChannel.receive_data(self.address,cmd, divider)) + 1
+        self.board.PWM_clks[self.clk_number][1] = (self.board.commChannel.receive_data(self.address,cmd, divider)) + 1
 
     #eventually move this algorithm to psoc side for greater portability...
     def SetFrequency(self,freq, max_error = 5, min_period = 10):
@@ -830,7 +840,7 @@ class PWM(object):
                 err_chk_strt = False
             else:
                 div_cur = div_cur + shift
-                clk_new = PiSoC.PWM_clks[self.clk_number][0]/div_cur
+                clk_new = self.board.PWM_clks[self.clk_number][0]/div_cur
                 if div_cur<1:
                     div_cur = 1
                     logging.warning('Could not achieve desired frequency within tolerance')
@@ -1015,7 +1025,7 @@ class Servo(object):
 
         |
     """
-    def __init__(self, channel, min_pulse = 1.0, max_pulse = 2.0, min_angle = 0, max_angle = 180):
+    def __init__(self, channel, min_pulse = 1.0, max_pulse = 2.0, min_angle = 0, max_angle = 180, board = None):
         """
         :Method:
         :Description:
@@ -1056,6 +1066,10 @@ class Servo(object):
 
         :type max_angle: float
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which drives the servo. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
@@ -1066,6 +1080,7 @@ class Servo(object):
             This is advised against though, because servos are very particular about the construction of their data signals. 
             If you change the wrong parameter of the PWM signal, you might damage the motor.
         """
+        self.board = PiSoC if board is None else board
 
         self.min_pulse = float(min_pulse)
         self.max_pulse = float(max_pulse)
@@ -1077,7 +1092,7 @@ class Servo(object):
         self.angle_range = float(max_angle-min_angle)
 
 
-        self.servo_PWM = PWM(self.channel)
+        self.servo_PWM = PWM(self.channel, board = self.board)
         if abs(self.servo_PWM.GetFrequency() - 50) > 1:
             self.servo_PWM.SetClockDivider(8)
             self.servo_PWM.WritePeriod(60000)
@@ -1286,7 +1301,7 @@ class RangeFinder(object):
 
     """
 
-    def __init__(self, signal, trigger = None, delay_us = 10, timeout_us = 30000, poll_frequency = None):
+    def __init__(self, signal, trigger = None, delay_us = 10, timeout_us = 30000, poll_frequency = None, board = None):
         """
         :Method:
 
@@ -1335,11 +1350,16 @@ class RangeFinder(object):
 
         :type poll_frequency: float
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the ranger is connected to. Defaults to the session of *signal*.
+
+        :type board: PiSoC
+
         :returns:
 
             None
 
         """
+        self.board = signal.board if board is None else board
 
 
         self.signal_pin = signal.pin
@@ -1403,7 +1423,7 @@ class RangeFinder(object):
         cmd = 0x01
         if ((timeout_us>65535) or (timeout_us<=0)):
             raise ValueError('Timeout must be between 1 and 65535 microseconds: provided %d' %timeout_us)
-        PiSoC.commChannel.send_data(self.address, cmd, timeout_us)
+        self.board.commChannel.send_data(self.address, cmd, timeout_us)
         self.timeout = timeout_us
 
     def SetDelay(self, delay_us):
@@ -1435,7 +1455,7 @@ class RangeFinder(object):
         cmd = 0x02
         if (delay_us>63 or delay_us<=0):
             raise ValueError('Delay must be between 1 and 63 microseconds: provided %d' %delay_us)
-        PiSoC.commChannel.send_data(self.address, cmd, delay_us)
+        self.board.commChannel.send_data(self.address, cmd, delay_us)
 
     def ReadRaw(self):
         """
@@ -1453,10 +1473,11 @@ class RangeFinder(object):
 
         """
         cmd = 0x00
-        while not self.is_ready():
-            pass
+        wait = self.poll_period - (time.time() - self.time_since_last_poll)
+        if wait > 0: #sleep until the next poll is allowed, rather than spinning on is_ready()
+            time.sleep(wait)
         self.time_since_last_poll = time.time()
-        reading = PiSoC.commChannel.receive_data(self.address, cmd, self.packed_dat, delay = 0.05)
+        reading = self.board.commChannel.receive_data(self.address, cmd, self.packed_dat, delay = 0.05)
         self.raw = reading
         if reading == PiSoC.BAD_PARAM:
             logging.error("Timeout occured waiting for signal pin to be asserted; verify connection.")
@@ -1572,7 +1593,7 @@ class NeoPixelShield(object):
             >>> shield = NeoPixelShield()
 
     """
-    def __init__(self):
+    def __init__(self, board = None):
         """
         :Method:
 
@@ -1583,10 +1604,15 @@ class NeoPixelShield(object):
             Defines the register address for the striplight controller used by the NeoPixels, 
             and it defines 140 colors as class attributes, named according to their standardized HTML and CSS names 
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the shield is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
         """
+        self.board = PiSoC if board is None else board
         self.address = PiSoC.STRIPLIGHT_REGISTER
         self.AliceBlue = 0xfff0f8
         self.AntiqueWhite = 0xd7faeb
@@ -1748,7 +1774,7 @@ class NeoPixelShield(object):
             None
         """
         cmd = 0x00
-        PiSoC.commChannel.receive_data(self.address, cmd)
+        self.board.commChannel.receive_data(self.address, cmd)
         self.__running = True
 
 
@@ -1783,7 +1809,7 @@ class NeoPixelShield(object):
             None
         """
         cmd = 0x01
-        PiSoC.commChannel.receive_data(self.address, cmd)
+        self.board.commChannel.receive_data(self.address, cmd)
         self.__running = False
 
     def RGB_to_hex(self, RGB):
@@ -1874,7 +1900,7 @@ class NeoPixelShield(object):
         if column not in range(8):
             raise ValueError('NeoPixel shield only has 8 rows available, choose 0-7')
 
-        PiSoC.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, row, column, Hformat = [])
+        self.board.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, row, column, Hformat = [])
 
     def ClearPixel(self, row, column):
         """
@@ -1951,7 +1977,7 @@ class NeoPixelShield(object):
         if color<0:
             logging.warning("Color value must be positive. Adjusting input to meet this requirement (0x000000)")
             color = 0
-        PiSoC.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, pixelnum, Hformat = [])
+        self.board.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, pixelnum, Hformat = [])
 
     def DrawRow(self, row, color):
         """
@@ -2003,7 +2029,7 @@ class NeoPixelShield(object):
                 row = 4
                 logging.warning("row must be less than or equal to 4. Setting to 4.")
 
-        PiSoC.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, row, Hformat = [])
+        self.board.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, row, Hformat = [])
 
     def ClearRow(self, row):
         """
@@ -2077,7 +2103,7 @@ class NeoPixelShield(object):
                 column = 7
                 logging.warning("column must be less than or equal to 7. Setting to 7.")
 
-        PiSoC.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, column, Hformat = [])
+        self.board.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, column, Hformat = [])
 
     def ClearColumn(self, column):
         """
@@ -2127,7 +2153,7 @@ class NeoPixelShield(object):
             self.Clear()
         elif brightness in range(1, 6):
             dim_level = 5 - brightness
-            PiSoC.commChannel.receive_data(self.address, cmd, dim_level)
+            self.board.commChannel.receive_data(self.address, cmd, dim_level)
         else:
             logging.warning('Brightness level must be between 0 and 5.')
 
@@ -2154,7 +2180,7 @@ class NeoPixelShield(object):
         """
 
         cmd = 0x07
-        PiSoC.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, Hformat = [])
+        self.board.commChannel.receive_data(self.address, cmd, color>>16, (color>>8)&0xFF, color&0xFF, Hformat = [])
 
     def Clear(self):
         """
@@ -2184,7 +2210,7 @@ class Tone(object):
 
                 >>> Note = Tone(0)
     """
-    def __init__(self, channel):
+    def __init__(self, channel, board = None):
         """
         :Method:
 
@@ -2198,12 +2224,17 @@ class Tone(object):
 
         :type channel: int
 
+        :param board: Optional parameter. The :class:`~pisoc.PiSoC` session which the Tone is on. Defaults to the session configured on the :class:`~pisoc.PiSoC` class itself.
+
+        :type board: PiSoC
+
         :returns:
 
             None
 
         """
-        self.tone_PWM = PWM(channel)
+        self.board = PiSoC if board is None else board
+        self.tone_PWM = PWM(channel, board = self.board)
         self.channel = channel
         self.tone_PWM.ReadPeriod()
         self.cmp = self.tone_PWM.ReadCompare()
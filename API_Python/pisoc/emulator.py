@@ -0,0 +1,853 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import os
+import re
+import time
+import random
+import select
+import struct
+import argparse
+import threading
+from pisoc import *
+from pisoc.pipeline import ResponsePipeline
+
+
+class VirtualPiSoC(object):
+    """
+    :Class:
+
+        A stand-in for the firmware's command dispatcher (*Python_rxByte*, *Python_execute*, *Python_parser* and *readData*), so that the API can be exercised without a PiSoC.
+        Bytes written to it are assembled into frames exactly as the firmware does, and each frame is answered with a 4 byte response, or a 7 byte one when responses are framed.
+        When frames are checked, a frame whose CRC fails, or which arrives ahead of the sequence number expected next, is answered with RESEND. A frame whose sequence number was answered
+        recently is answered again from :attr:`answers` without being executed.
+        The UART's baud rate is kept in :attr:`baud`, and changed by CheckBuild 0x10 as it is by the firmware, for a bus clock of :attr:`BUS_CLOCK`.
+
+        CHECK_BUILD, TEST_REGISTER, GPIO, PWM and BATCH_REGISTER commands are modelled, and ADC reads return the counts set in :attr:`adc` for the ADC's address. Commands to the other components which the virtual board has are recorded in :attr:`registers` and answered with GOOD,
+        and commands to components it does not have are answered with BAD_PARAM, as they are by the firmware.
+
+    :Example:
+
+        >>> from pisoc import *
+        >>> PiSoC('LOOPBACK', log_level = 'info')
+        >>> with PiSoC.batch():
+        ...     for i in range(4):
+        ...         PWM(i).WriteCompare(100)
+
+    """
+    FIRMWARE_MAJOR_VERSION  = 2
+    FIRMWARE_MINOR_VERSION  = 0
+    MAX_RX_BUFFER_SIZE      = 60
+    RX_QUEUE_DEPTH          = 8
+    FEATURES                = PiSoC.FEATURE_PIPELINE|PiSoC.FEATURE_BATCH|PiSoC.FEATURE_FRAMED|PiSoC.FEATURE_UNACKED|PiSoC.FEATURE_CHECKED|PiSoC.FEATURE_BAUD
+    SEQ_CACHE_DEPTH         = 16
+    BUS_CLOCK               = 24000000
+    UART_OVERSAMPLE         = 8
+
+    WAITING                 = 0
+    XFER_IN_PROGRESS        = 1
+    XFER_REQUESTED          = 2
+
+    FRAME_PLAIN             = 0
+    FRAME_OK                = 1
+    FRAME_CORRUPT           = 2
+
+    def __init__(self, pwm_num = 12, gpio = None, analog = 0xFF, analog_pins = 6, capsense_sensors = 0):
+        """
+        :Method: __init__
+
+        :Description: Describes the virtual board. The defaults resemble the standard PiSoC build.
+
+        :param pwm_num: Number of PWM channels. Every 4 channels share one 16-bit clock.
+        :type pwm_num: int
+
+        :param gpio: Maps a port number to a list of the pins available on that port. Defaults to ports 2, 3, 4, 5 and 12.
+        :type gpio: dict
+
+        :param analog: The bit mask of analog components returned by CheckBuild 0x00
+        :type analog: int
+
+        :param analog_pins: Number of pins on the sequenced SAR ADC
+        :type analog_pins: int
+
+        :param capsense_sensors: Number of CapSense sensors
+        :type capsense_sensors: int
+        """
+        if gpio is None:
+            gpio = {2:range(8), 3:range(8), 4:range(8), 5:range(8), 12:range(8)}
+        self.pwm_num = pwm_num
+        self.gpio = dict((port, list(pins)) for port, pins in gpio.items())
+        self.analog = analog|(analog_pins<<8)|(capsense_sensors<<14)
+        self.clk_num = (pwm_num + 3)//4
+        self.build_fingerprint = None
+        self.reset()
+        self.fingerprint()
+
+    def reset(self):
+        """
+        :Method: reset
+
+        :Description: Returns the virtual board to its power on state, as a software reset does on the PiSoC.
+
+        :returns: None
+        """
+        self.state = self.WAITING
+        self.frame = bytearray()
+        self.length = 0
+        self.output = bytearray()
+        self.framed = False
+        self.checked = False
+        self.seq = 0
+        self.next_seq = 1
+        self.status = self.FRAME_PLAIN
+        self.answers = [None]*self.SEQ_CACHE_DEPTH
+        self.unacked = False
+        self.error_count = 0
+        self.error_command = (0, 0)
+        self.baud = PiSoC.DEFAULT_BAUD
+        self.confirmed_baud = PiSoC.DEFAULT_BAUD
+        self.next_baud = None
+        self.pins = dict(((port, pin), 0) for port in self.gpio for pin in self.gpio[port])
+        self.pwm = [dict(running = False, period = 0xFFFF, compare = 0) for i in range(self.pwm_num)]
+        self.dividers = [24 for i in range(self.clk_num)]
+        self.registers = dict()
+        self.adc = dict()
+        self.extra = []
+        self.history = []
+        self.frames_received = 0
+
+    def write(self, data):
+        """
+        :Method: write
+
+        :Description: Receives bytes from the host. Every complete frame is executed immediately, and its response is appended to :attr:`output`.
+
+        :param data: Bytes sent by the host
+        :type data: str, bytearray, or list of ints
+
+        :returns: Number of bytes received
+        """
+        data = bytearray(data)
+        for byte in data:
+            frame = self.rx_byte(byte)
+            if frame is not None:
+                self.output+=self.respond(frame)
+                self.switch_baud()
+        return len(data)
+
+    def switch_baud(self):
+        """
+        :Method: switch_baud
+
+        :Description: Switches to the baud rate proposed by CheckBuild 0x10, once its response has been sent, as *Python_sendData* does
+
+        :returns: True if the rate was changed
+        """
+        if self.next_baud is None:
+            return False
+        self.baud, self.next_baud = self.next_baud, None
+        return True
+
+    def line_error(self):
+        """
+        :Method: line_error
+
+        :Description: Takes a framing error, as happens when the host sends at another baud rate. Until the rate in use has been confirmed, the board goes back to the last rate which was.
+
+        :returns: None
+        """
+        if self.baud != self.confirmed_baud:
+            self.baud = self.confirmed_baud
+            self.state = self.WAITING
+
+    def respond(self, frame):
+        """
+        :Method: respond
+
+        :Description: Executes a complete frame, and encodes its response as it is sent by *Python_sendData*
+
+        :param frame: The frame, as returned by :meth:`rx_byte`
+        :type frame: bytearray
+
+        :returns: The response bytes, which are empty if the command does not respond, or if the frame started with :attr:`PiSoC.UNACKED_MAGIC`
+        """
+        status, seq = self.status, self.seq
+        self.extra = []
+        if status == self.FRAME_CORRUPT:
+            if self.unacked:
+                self.count_error(frame)
+                return bytearray()
+            return self.pack(frame, PiSoC.RESEND, seq)
+        checked = status == self.FRAME_OK and not self.unacked
+        if checked:
+            ahead = (seq - self.next_seq)&0xFF
+            if 0 < ahead < 0x80: #an earlier frame was lost, and has to be executed first
+                return self.pack(frame, PiSoC.RESEND, seq)
+            answer = self.answers[seq%self.SEQ_CACHE_DEPTH]
+            if ahead and answer is not None and answer[0] == seq:
+                return self.pack(frame, answer[1], seq)
+            if not ahead:
+                self.next_seq = (seq + 1)&0xFF
+        response = self.execute(frame)
+        if self.unacked:
+            if response == PiSoC.BAD_PARAM:
+                self.count_error(frame)
+            response = None
+        if checked:
+            self.answers[seq%self.SEQ_CACHE_DEPTH] = (seq, response) if response is not None and not self.extra else None
+        if response is None:
+            return bytearray()
+        return self.pack(frame, response, seq)
+
+    def pack(self, frame, response, seq):
+        header = (frame[0] if frame else 0, frame[1] if len(frame) > 1 else 0)
+        data = bytearray()
+        if self.checked:
+            data+=bytearray([PiSoC.MAGIC, seq, header[0], header[1]])
+        elif self.framed:
+            data+=bytearray([PiSoC.MAGIC, header[0], header[1]])
+        data+=struct.pack('I', response&0xFFFFFFFF)
+        data+=struct.pack('<%dI'%len(self.extra), *self.extra)
+        if self.checked:
+            crc = crc16(data)
+            data+=bytearray([crc&0xFF, crc>>8])
+        return data
+
+    def count_error(self, frame):
+        self.error_count = min(self.error_count + 1, 0xFFFF)
+        self.error_command = (frame[0] if frame else 0, frame[1] if len(frame) > 1 else 0)
+
+    def read(self, size = 1):
+        """
+        :Method: read
+
+        :Description: Takes up to *size* bytes of response data
+
+        :returns: The bytes which were taken
+        """
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def rx_byte(self, byte):
+        """
+        :Method: rx_byte
+
+        :Description: Runs one byte through the frame state machine ( MAGIC or UNACKED_MAGIC, length, data ), as *Python_rxByte* does.
+
+            When frames are checked, the sequence number and CRC are taken off the frame and checked, and the result is kept in :attr:`seq` and :attr:`status` for :meth:`respond`.
+            A frame which fails its CRC but is the plain CheckBuild 0x0C request is taken as a plain frame, so a host which does not know that frames are checked can still turn checking off.
+
+        :returns: The frame, without its MAGIC and length bytes, if this byte completed one. Otherwise None.
+        """
+        if self.state == self.XFER_IN_PROGRESS:
+            self.frame.append(byte)
+            if len(self.frame) == self.length:
+                self.state = self.WAITING
+                self.frames_received+=1
+                self.seq, self.status = 0, self.FRAME_PLAIN
+                if not self.checked:
+                    return self.frame
+                magic = PiSoC.UNACKED_MAGIC if self.unacked else PiSoC.MAGIC
+                if len(self.frame) >= 4 and crc16(bytearray([magic, self.length]) + self.frame[:-2]) == self.frame[-2]|(self.frame[-1]<<8):
+                    self.seq, self.status = self.frame[0], self.FRAME_OK
+                    return self.frame[1:-2]
+                if self.length == 4 and self.frame[:2] == bytearray([PiSoC.CHECK_BUILD, 0x0C]):
+                    return self.frame
+                self.seq, self.status = self.frame[0], self.FRAME_CORRUPT
+                return self.frame[1:-2]
+        elif self.state == self.XFER_REQUESTED:
+            if byte == 0 or byte >= self.MAX_RX_BUFFER_SIZE:
+                self.state = self.WAITING
+            else:
+                self.length = byte
+                self.frame = bytearray()
+                self.state = self.XFER_IN_PROGRESS
+        elif byte in (PiSoC.MAGIC, PiSoC.UNACKED_MAGIC):
+            self.unacked = byte == PiSoC.UNACKED_MAGIC
+            self.state = self.XFER_REQUESTED
+        return None
+
+    def execute(self, vals):
+        """
+        :Method: execute
+
+        :Description: Executes one frame, as *Python_execute* does. Frames sent to BATCH_REGISTER are unpacked and executed in order, and answered once.
+
+        :param vals: The frame, starting with its address
+        :type vals: bytearray
+
+        :returns: The 32-bit response, or None if the command does not respond
+        """
+        self.extra = []
+        if vals[0] != PiSoC.BATCH_REGISTER:
+            return self.read_data(vals)
+        count = vals[1] if len(vals) > 1 else 0
+        if count > PiSoC.MAX_BATCH_COMMANDS:
+            return PiSoC.BAD_PARAM
+        pos = 2
+        failures = 0
+        executed = 0
+        for i in range(count):
+            length = vals[pos] if pos < len(vals) else 0
+            if length < 2 or pos + 1 + length > len(vals):
+                break
+            if self.read_data(vals[pos + 1:pos + 1 + length]) == PiSoC.BAD_PARAM:
+                failures|=(0x01<<i)
+            pos+=length + 1
+            executed+=1
+        self.extra = []
+        return (executed<<16)|failures
+
+    def read_data(self, vals):
+        """
+        :Method: read_data
+
+        :Description: Decodes and executes a single command, as *Python_parser* and *readData* do.
+
+        :param vals: The command, starting with its address
+        :type vals: bytearray
+
+        :returns: The 32-bit response, or None if the command does not respond
+        """
+        vals = vals + bytearray(4)
+        addr, cmd = vals[0], vals[1]
+        dat = (vals[3]<<8)|vals[2]
+        self.history.append((addr, cmd, dat))
+        if addr == PiSoC.CHECK_BUILD:
+            return self.check_build(cmd, dat)
+        elif addr == PiSoC.TEST_REGISTER:
+            return vals[min(cmd, 59) + 2] if min(cmd, 59) + 2 < len(vals) else 0
+        elif addr == PiSoC.GPIO_REGISTER:
+            return self.gpio_control(cmd, (dat>>4)&0x0F, (dat>>1)&0x07, dat)
+        elif PiSoC.PWM_REGISTER0 <= addr < PiSoC.PWM_REGISTER0 + self.pwm_num:
+            return self.pwm_control(addr - PiSoC.PWM_REGISTER0, cmd, dat)
+        elif addr == PiSoC.RESET_ADDRESS:
+            self.reset()
+            return None
+        elif addr in (PiSoC.DELSIG_ADC_CONTROL, PiSoC.SAR_ADC0_CONTROL, PiSoC.SAR_ADC1_CONTROL) and self.has_component(addr):
+            return self.adc_control(addr, cmd, dat)
+        elif self.has_component(addr):
+            self.registers[(addr, cmd)] = dat
+            return PiSoC.GOOD
+        return PiSoC.BAD_PARAM
+
+    def has_component(self, addr):
+        masks = {
+            PiSoC.DELSIG_ADC_CONTROL : 0x01,
+            PiSoC.SAR_ADC0_CONTROL   : 0x01<<1,
+            PiSoC.SAR_ADC1_CONTROL   : 0x01<<2,
+            PiSoC.VDAC0_CONTROL      : 0x01<<3,
+            PiSoC.VDAC1_CONTROL      : 0x01<<4,
+            PiSoC.IDAC0_CONTROL      : 0x01<<5,
+            PiSoC.IDAC1_CONTROL      : 0x01<<6,
+            PiSoC.WAVEDAC_CONTROL    : 0x01<<7,
+            PiSoC.ANALOG_IN_REGISTER : 0x3F<<8,
+            PiSoC.CAPSENSE_REGISTER  : 0x3F<<14,
+            }
+        return bool(self.analog&masks.get(addr, 0)) or addr in (PiSoC.RANGE_FINDER, PiSoC.STRIPLIGHT_REGISTER)
+
+    def check_build(self, cmd, val):
+        if cmd == 0x00:
+            return self.analog
+        elif cmd == 0x01:
+            return (self.pwm_num<<4)|self.clk_num
+        elif cmd in (0x02, 0x03, 0x04):
+            ports = {0x02:(0, 2, 3), 0x03:(4, 5, 6), 0x04:(12, 15)}[cmd]
+            word = 0
+            for i, port in enumerate(ports):
+                for pin in self.gpio.get(port, []):
+                    word|=(0x01<<pin)<<(8*i)
+            return word
+        elif cmd == 0x07:
+            if val >= self.clk_num:
+                return 0
+            return self.dividers[val]|(0x01<<16)|((val + 1)<<19)
+        elif cmd == 0x08:
+            word = 0
+            for j in range(4):
+                channel = 4*val + j
+                if channel < self.pwm_num:
+                    word|=((channel//4 + 1)|(0x01<<4))<<(5*j)
+            return word
+        elif cmd == 0x09:
+            return (self.FIRMWARE_MAJOR_VERSION<<8)|self.FIRMWARE_MINOR_VERSION
+        elif cmd == 0x0A:
+            return len(self.pins)
+        elif cmd == 0x0B:
+            return self.FEATURES|(self.RX_QUEUE_DEPTH<<16)
+        elif cmd == 0x0C and self.FEATURES&PiSoC.FEATURE_FRAMED:
+            checked = val == 2 and bool(self.FEATURES&PiSoC.FEATURE_CHECKED)
+            if checked: #the host counts from 1 again
+                self.answers = [None]*self.SEQ_CACHE_DEPTH
+                self.next_seq = 1
+            self.framed, self.checked = bool(val), checked
+            return PiSoC.GOOD
+        elif cmd == 0x0D:
+            return self.fingerprint()
+        elif cmd == 0x0E:
+            self.extra = [self.check_build(query, 0) for query in (0x00, 0x01, 0x02, 0x03, 0x04, 0x09, 0x0B, 0x0D)]
+            self.extra+=[self.check_build(0x07, i) for i in range(self.clk_num)]
+            self.extra+=[self.check_build(0x08, i) for i in range((self.pwm_num + 3)//4)]
+            return len(self.extra)
+        elif cmd == 0x0F:
+            word = (self.error_command[0]<<24)|(self.error_command[1]<<16)|self.error_count
+            self.error_count = 0
+            return word
+        elif cmd == 0x10 and self.FEATURES&PiSoC.FEATURE_BAUD:
+            baud = 100*val
+            if baud == self.baud: #the host confirms the rate it switched to
+                self.confirmed_baud = baud
+                return PiSoC.GOOD
+            divider = (self.BUS_CLOCK + baud*self.UART_OVERSAMPLE//2)//(baud*self.UART_OVERSAMPLE) if baud else 0
+            if divider < 1 or divider > 0xFFFF or 50*abs(self.BUS_CLOCK//(divider*self.UART_OVERSAMPLE) - baud) > baud:
+                return PiSoC.BAD_PARAM
+            self.next_baud = baud
+            return PiSoC.GOOD
+        return PiSoC.BAD_PARAM
+
+    def fingerprint(self):
+        if self.build_fingerprint is not None: #it describes the build, not the dividers set since
+            return self.build_fingerprint
+        word = 2166136261
+        for cmd, count in ((0x00, 1), (0x01, 1), (0x02, 1), (0x03, 1), (0x04, 1), (0x07, self.clk_num), (0x08, (self.pwm_num + 3)//4), (0x09, 1), (0x0B, 1)):
+            for val in range(count):
+                for byte in bytearray(struct.pack('<I', self.check_build(cmd, val))):
+                    word = ((word^byte)*16777619)&0xFFFFFFFF
+        self.build_fingerprint = word or 1
+        return self.build_fingerprint
+
+    def adc_control(self, addr, cmd, val):
+        if cmd == (0x07 if addr == PiSoC.DELSIG_ADC_CONTROL else 0x08): #IsEndConversion; conversions finish at once
+            return 1
+        elif cmd == 0x0A or (cmd == 0x0D and addr == PiSoC.DELSIG_ADC_CONTROL):
+            return self.adc.get(addr, 0)
+        self.registers[(addr, cmd)] = val
+        return PiSoC.GOOD
+
+    def gpio_control(self, cmd, port, pin, val):
+        if cmd == 0x04:
+            word = 0
+            for i, key in enumerate(sorted(self.pins)[:32]):
+                word|=self.pins[key]<<i
+            return word
+        if (port, pin) not in self.pins:
+            return PiSoC.BAD_PARAM
+        if cmd == 0x00:
+            return self.pins[(port, pin)]
+        elif cmd == 0x01:
+            self.pins[(port, pin)] = val&0x01
+        elif cmd == 0x02:
+            self.pins[(port, pin)]^=0x01
+        elif cmd != 0x03:
+            return PiSoC.BAD_PARAM
+        return PiSoC.GOOD
+
+    def pwm_control(self, channel, cmd, val):
+        pwm = self.pwm[channel]
+        if cmd in (0x00, 0x1A):
+            pwm['running'] = True
+        elif cmd in (0x01, 0x19):
+            pwm['running'] = False
+        elif cmd == 0x0C:
+            pwm['period'] = val
+        elif cmd == 0x0D:
+            return pwm['period']
+        elif cmd == 0x0E:
+            pwm['compare'] = val
+        elif cmd == 0x0F:
+            return pwm['compare']
+        elif cmd == 0xFF:
+            self.dividers[channel//4] = max(val, 1)
+            return self.dividers[channel//4] - 1
+        else:
+            return PiSoC.BAD_PARAM
+        return PiSoC.GOOD
+
+
+@memoized
+def baud_constants():
+    """
+    Maps the termios speed constants, such as B115200, to the baud rates they stand for. Only POSIX hosts have termios, so it is imported when a :class:`PtyPiSoC` first needs it.
+    """
+    import termios
+    return dict((getattr(termios, name), int(name[1:])) for name in dir(termios) if re.match(r'B\d+$', name))
+
+
+def flip_bits(data, noise, rand):
+    """
+    :Function: flip_bits
+
+    :Description: Flips one bit, at random, in each byte of *data* which is chosen with a chance of *noise*
+
+    :returns: *data*, which is changed in place
+    """
+    if noise:
+        for i in range(len(data)):
+            if rand.random() < noise:
+                data[i]^=0x01<<rand.randrange(8)
+    return data
+
+
+class LoopbackSerial(object):
+    """
+    :Class:
+
+        Gives a :class:`VirtualPiSoC` the parts of the pyserial interface which the transports use, so that it can take the place of a serial port.
+        With *noise*, bits are flipped at random in both directions, as on a bad line.
+        Bytes written at a :attr:`baudrate` other than the board's, or faster than *max_baud*, do not arrive, and the board takes a framing error instead.
+    """
+    def __init__(self, board = None, noise = 0.0, seed = None, max_baud = None):
+        self.board = board if board is not None else VirtualPiSoC()
+        self.timeout = None
+        self.baudrate = PiSoC.DEFAULT_BAUD
+        self.max_baud = max_baud
+        self.open_state = True
+        self.noise = noise
+        self.random = random.Random(seed)
+
+    def write(self, data):
+        if self.baudrate != self.board.baud or (self.max_baud and self.baudrate > self.max_baud):
+            self.board.line_error()
+            return len(data)
+        data = flip_bits(bytearray(data), self.noise, self.random)
+        start = len(self.board.output)
+        count = self.board.write(data)
+        self.board.output[start:] = flip_bits(self.board.output[start:], self.noise, self.random)
+        return count
+
+    def read(self, size = 1):
+        return self.board.read(size)
+
+    def inWaiting(self):
+        return len(self.board.output)
+
+    def flushInput(self):
+        del self.board.output[:]
+
+    def flushOutput(self):
+        pass
+
+    def isOpen(self):
+        return self.open_state
+
+    def open(self):
+        self.open_state = True
+
+    def close(self):
+        self.open_state = False
+
+
+class Loopback(UART):
+    """
+    :Class:
+
+        A UART transport which is connected to a :class:`VirtualPiSoC` instead of a serial port. It is chosen with *PiSoC('LOOPBACK')*.
+    """
+    def __init__(self, board = None, noise = 0.0, seed = None):
+        """
+        :Method: __init__
+
+        :param board: The virtual board to talk to. A new :class:`VirtualPiSoC` is created if none is given.
+        :type board: VirtualPiSoC
+
+        :param noise: Chance of each byte having a bit flipped, in either direction
+        :type noise: float
+
+        :param seed: Seeds the noise, so that a run can be repeated
+        """
+        self.com = 'loopback'
+        self.baudr = 115200
+        self.ser = LoopbackSerial(board, noise, seed)
+        self.board = self.ser.board
+        self.encoder = FrameEncoder()
+        self.pipeline = ResponsePipeline(self.ser, encoder = self.encoder)
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Resets the virtual board and closes the loopback port
+
+        :returns: None
+        """
+        self.pipeline.drain()
+        self.board.reset()
+        self.ser.close()
+
+
+class VirtualSpiDev(object):
+    """
+    :Class:
+
+        Stands in for *spidev.SpiDev*, with a :class:`VirtualPiSoC` as the SPI slave, so that :class:`~pisoc.SPI` can be used without a PiSoC.
+        Transfers are clocked as they are by the firmware built with USE_SPI: while the bytes sent are run through the frame state machine, MAGIC and the oldest response which is ready are
+        clocked out, or if none is, the status register, with :attr:`PiSoC.BUSY` set while frames are waiting to be answered. A response is ready *latency* seconds after its frame arrived.
+
+    :Example:
+
+        >>> from pisoc import *
+        >>> from pisoc.emulator import VirtualSpiDev
+        >>> PiSoC.commChannel = SPI(spi = VirtualSpiDev())
+    """
+    def __init__(self, board = None, latency = 0):
+        """
+        :Method: __init__
+
+        :param board: The virtual board to talk to. A new :class:`VirtualPiSoC` is created if none is given.
+        :type board: VirtualPiSoC
+
+        :param latency: Seconds each frame takes to execute
+        :type latency: float
+        """
+        self.board = board if board is not None else VirtualPiSoC()
+        self.latency = latency
+        self.responses = []
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.bits_per_word = 8
+        self.bus = self.device = None
+        self.transfers = 0
+        self.clock = getattr(time, 'monotonic', time.time)
+
+    def open(self, bus, device):
+        self.bus, self.device = bus, device
+
+    def close(self):
+        self.bus = self.device = None
+
+    def xfer2(self, data, speed_hz = 0, delay_usecs = 0, bits_per_word = 0):
+        """
+        :Method: xfer2
+
+        :Description: Clocks *data* in, and as many bytes out, with chip select held for the whole transfer
+
+        :returns: list of the bytes clocked out
+        """
+        if self.bus is None:
+            raise IOError('The SPI device is not open')
+        now = self.clock()
+        self.transfers+=1
+        if self.responses and self.responses[0][0] <= now and len(data) >= PiSoC.SPI_TRANSFER_SIZE:
+            miso = bytearray([PiSoC.MAGIC]) + self.responses.pop(0)[1]
+        else:
+            miso = bytearray([PiSoC.BUSY if self.responses else 0])
+        for byte in bytearray(data):
+            frame = self.board.rx_byte(byte)
+            if frame is not None:
+                response = self.board.respond(frame)
+                if response: #the firmware only clocks out the response word
+                    self.responses.append((now + self.latency, response[:4]))
+        miso+=bytearray(len(data))
+        return list(miso[:len(data)])
+
+
+class PtyPiSoC(object):
+    """
+    :Class:
+
+        Serves a :class:`VirtualPiSoC` on a pseudo-terminal, so that anything which opens a serial port, such as :class:`~pisoc.UART`, can talk to it as it would to a PiSoC.
+        Bytes are delayed as they would be on a serial line at *baud*, and each command can be given a latency, to stand in for the time the firmware takes to execute it.
+
+    :Example:
+
+        >>> from pisoc import *
+        >>> from pisoc.emulator import PtyPiSoC
+        >>> virtual = PtyPiSoC(baud = 115200, latency = 0.0002, command_latency = {PiSoC.CHECK_BUILD: 0.001})
+        >>> virtual.start()
+        >>> PiSoC('UART', com_port = virtual.port)
+
+    """
+    def __init__(self, board = None, baud = 115200, latency = 0, command_latency = None, noise = 0.0, seed = None):
+        """
+        :Method: __init__
+
+        :param board: The virtual board to serve. A new :class:`VirtualPiSoC` is created if none is given.
+        :type board: VirtualPiSoC
+
+        :param baud: Baud rate of the simulated serial line, with 10 bits sent per byte. 0 sends bytes without delay.
+        :type baud: int
+
+        :param latency: Seconds taken to execute a command which has no latency of its own in *command_latency*
+        :type latency: float
+
+        :param command_latency: Maps an address, or an (address, command) pair, to the seconds taken to execute it. A pair takes precedence over its address.
+        :type command_latency: dict
+
+        :param noise: Chance of each byte having a bit flipped, in either direction
+        :type noise: float
+
+        :param seed: Seeds the noise, so that a run can be repeated
+        """
+        self.board = board if board is not None else VirtualPiSoC()
+        self.baud = baud
+        self.latency = latency
+        self.command_latency = dict(command_latency or {})
+        self.noise = noise
+        self.random = random.Random(seed)
+        try:
+            import pty, tty
+        except ImportError:
+            raise ImportError("PtyPiSoC needs a host with pseudo-terminals; use Loopback elsewhere")
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.lock = threading.Lock() #keeps the board from being reset by the host while a frame executes
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        :Method: start
+
+        :Description: Starts serving the virtual board in a daemon thread
+
+        :returns: The path of the pseudo-terminal, to be given to :class:`~pisoc.UART`
+        """
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target = self.serve_forever)
+            self.thread.daemon = True
+            self.thread.start()
+        return self.port
+
+    def serve_forever(self):
+        """
+        :Method: serve_forever
+
+        :Description: Reads frames from the pseudo-terminal and answers them, until :meth:`close` is called
+
+        :returns: None
+        """
+        self.running = True
+        while self.running:
+            if not select.select([self.master], [], [], 0.1)[0]:
+                continue
+            try:
+                data = bytearray(os.read(self.master, 256))
+            except OSError:
+                break
+            self.throttle(len(data))
+            rate = self.line_rate()
+            if rate is not None and rate != self.board.baud: #the host is sending at another rate
+                with self.lock:
+                    self.board.line_error()
+                    self.follow_baud()
+                continue
+            for byte in flip_bits(data, self.noise, self.random):
+                with self.lock:
+                    frame = self.board.rx_byte(byte)
+                    if frame is None:
+                        continue
+                    delay = self.delay(frame)
+                    if delay > 0:
+                        time.sleep(delay)
+                    response = self.board.respond(frame)
+                if response:
+                    self.throttle(len(response))
+                    os.write(self.master, bytes(flip_bits(response, self.noise, self.random)))
+                with self.lock:
+                    if self.board.switch_baud():
+                        self.follow_baud()
+
+    def delay(self, frame):
+        if not frame:
+            return self.latency
+        addr = frame[0]
+        cmd = frame[1] if len(frame) > 1 else 0
+        return self.command_latency.get((addr, cmd), self.command_latency.get(addr, self.latency))
+
+    def line_rate(self):
+        """
+        :Method: line_rate
+
+        :Description: Finds the baud rate which the host has set on the pseudo-terminal
+
+        :returns: The baud rate, or None if it is not known
+        """
+        import termios
+        try:
+            return baud_constants().get(termios.tcgetattr(self.slave)[5])
+        except termios.error:
+            return None
+
+    def follow_baud(self):
+        if self.baud:
+            self.baud = self.board.baud
+
+    def throttle(self, size):
+        if self.baud:
+            time.sleep(10.0*size/self.baud)
+
+    def close(self):
+        """
+        :Method: close
+
+        :Description: Stops serving, and closes the pseudo-terminal
+
+        :returns: None
+        """
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Serves a virtual PiSoC on a pseudo-terminal')
+    parser.add_argument('--baud', type = int, default = 115200, help = 'simulated line rate; 0 for none')
+    parser.add_argument('--latency', type = float, default = 0, help = 'seconds taken by each command')
+    parser.add_argument('--command-latency', action = 'append', default = [], metavar = 'ADDR[:CMD]=SECONDS', help = 'latency of one address or command, e.g. 0xFE:0x0E=0.002')
+    parser.add_argument('--pwm-num', type = int, default = 12)
+    parser.add_argument('--noise', type = float, default = 0.0, help = 'chance of each byte having a bit flipped, e.g. 0.001')
+    parser.add_argument('--seed', type = int, default = None)
+    opts = parser.parse_args()
+    command_latency = dict()
+    for item in opts.command_latency:
+        key, seconds = item.split('=')
+        key = tuple(int(part, 0) for part in key.split(':'))
+        command_latency[key if len(key) > 1 else key[0]] = float(seconds)
+    virtual = PtyPiSoC(VirtualPiSoC(pwm_num = opts.pwm_num), opts.baud, opts.latency, command_latency, opts.noise, opts.seed)
+    print(virtual.port)
+    try:
+        virtual.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    virtual.close()
+
+if __name__ == '__main__':
+    main()
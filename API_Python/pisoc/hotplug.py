@@ -0,0 +1,209 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Watches a directory of device nodes, such as /dev, for devices which appear and disappear, so that a PiSoC which is unplugged and plugged back in can be reopened as soon as its port returns.
+
+On Linux, the directory is watched with inotify, so a change is noticed as soon as udev makes it. Elsewhere, or if inotify cannot be used, the directory is listed every
+:attr:`HotplugWatcher.POLL_INTERVAL` seconds.
+
+:Example:
+
+    >>> from pisoc import *
+    >>> PiSoC('PC', hotplug = True)
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import os
+import errno
+import select
+import struct
+import logging
+import threading
+
+IN_ATTRIB       = 0x00000004
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_NONBLOCK     = 0o4000
+IN_CLOEXEC      = 0o2000000
+IN_EVENT        = struct.Struct('iIII')
+
+IN_APPEARED     = IN_CREATE|IN_MOVED_TO|IN_ATTRIB #udev sets a node's permissions just after creating it
+IN_DISAPPEARED  = IN_DELETE|IN_MOVED_FROM
+
+
+def inotify():
+    """
+    :Function: inotify
+
+    :Description: Loads the inotify calls from the C library
+
+    :returns: The C library, or None if it does not have inotify
+    """
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+    return libc
+
+
+class HotplugWatcher(object):
+    """
+    :Class:
+
+        Calls *callback* from a background thread whenever a device node in *path* appears or disappears. Only the nodes in *names* are reported, or every node if *names* is None.
+        A node which is created and then has its permissions set is reported as appearing twice; callbacks should not mind.
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, path, callback, names = None):
+        """
+        :Method: __init__
+
+        :param path: The directory to watch, such as /dev
+        :type path: str
+
+        :param callback: Called with the name of the node, and True if it appeared or False if it disappeared
+        :type callback: function
+
+        :param names: The names of the nodes to report
+        :type names: list
+        """
+        self.path = path
+        self.callback = callback
+        self.names = None if names is None else set(names)
+        self.thread = None
+        self.running = False
+        self.fd = None
+        self.wake = None
+        self.orphaned = False
+        self.present = None
+
+    def start(self):
+        """
+        :Method: start
+
+        :Description: Starts watching, in a daemon thread
+
+        :returns: True if inotify is used, or False if the directory is polled
+        """
+        libc = inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK|IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, self.path.encode(), IN_APPEARED|IN_DISAPPEARED) >= 0:
+                self.fd = fd
+            else:
+                logging.debug('Cannot watch %s with inotify; it will be polled.'%self.path)
+                if fd >= 0:
+                    os.close(fd)
+        self.present = self.listing() if self.fd is None else None
+        self.wake = os.pipe()
+        self.running = True
+        self.thread = threading.Thread(target = self.run if self.fd is not None else self.poll, name = 'pisoc-hotplug')
+        self.thread.daemon = True
+        self.thread.start()
+        return self.fd is not None
+
+    def stop(self):
+        """
+        :Method: stop
+
+        :Description: Stops watching, and waits for the thread to finish, unless it is the thread calling
+
+        :returns: None
+        """
+        if not self.running:
+            return
+        self.running = False
+        os.write(self.wake[1], b'\0')
+        if self.thread is threading.current_thread(): #called by the callback; the thread closes the pipe as it finishes
+            self.orphaned = True
+            return
+        self.thread.join()
+        for fd in self.wake:
+            os.close(fd)
+
+    def run(self):
+        try:
+            while self.running:
+                readable = select.select([self.fd, self.wake[0]], [], [])[0]
+                if self.fd not in readable:
+                    continue
+                try:
+                    data = os.read(self.fd, 4096)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                pos = 0
+                while pos + IN_EVENT.size <= len(data):
+                    wd, mask, cookie, length = IN_EVENT.unpack_from(data, pos)
+                    name = data[pos + IN_EVENT.size:pos + IN_EVENT.size + length].rstrip(b'\0').decode('utf-8', 'replace')
+                    pos+=IN_EVENT.size + length
+                    self.report(name, not mask&IN_DISAPPEARED)
+        finally:
+            self.close()
+
+    def poll(self):
+        try:
+            present = self.present
+            while self.running:
+                if select.select([self.wake[0]], [], [], self.POLL_INTERVAL)[0]:
+                    continue
+                now = self.listing()
+                for name in sorted(now - present):
+                    self.report(name, True)
+                for name in sorted(present - now):
+                    self.report(name, False)
+                present = now
+        finally:
+            self.close()
+
+    def listing(self):
+        try:
+            names = set(os.listdir(self.path))
+        except OSError:
+            names = set()
+        return names if self.names is None else names&self.names
+
+    def report(self, name, present):
+        if self.names is not None and name not in self.names:
+            return
+        try:
+            self.callback(name, present)
+        except Exception:
+            logging.exception('Handling %s %s failed'%(os.path.join(self.path, name), 'appearing' if present else 'disappearing'))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.orphaned:
+            for fd in self.wake:
+                os.close(fd)
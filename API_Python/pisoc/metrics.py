@@ -0,0 +1,205 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Counts the calls made to the PiSoC for each address and command. :class:`MeteredTransport` is used by :class:`~pisoc.PiSoC` when it is constructed with *metrics* set,
+which is when this module is loaded.
+
+:Example:
+
+    >>> from pisoc import *
+    >>> PiSoC('PC', metrics = True)
+    >>> PiSoC.stats()
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import time
+import threading
+from pisoc import *
+
+
+class Metrics(object):
+    """
+    :Class:
+
+        Counts what is sent to the PiSoC, per (address, command) pair: calls, bytes each way, retries, responses of :attr:`~pisoc.PiSoC.BAD_PARAM`, and a histogram of how long calls took.
+        It is filled in by a :class:`MeteredTransport`, and read with :meth:`~pisoc.PiSoC.stats`.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = dict()
+
+    def entry(self, args):
+        key = (args[0], args[1] if len(args) > 1 else 0)
+        entry = self.commands.get(key)
+        if entry is None:
+            entry = self.commands[key] = dict(calls = 0, bytes_out = 0, bytes_in = 0, retries = 0, bad_param = 0, total_us = 0.0, max_us = 0.0, histogram_us = dict())
+        return entry
+
+    def record(self, args, seconds, bytes_out, bytes_in, bad = False):
+        """
+        :Method: record
+
+        :Description: Counts one call
+
+        :param args: The command, starting with its address and command bytes
+        :param seconds: How long the call took
+        :param bytes_out: Bytes written to the PiSoC
+        :param bytes_in: Bytes read back
+        :param bad: True if the PiSoC answered with BAD_PARAM
+
+        :returns: None
+        """
+        us = 1e6*seconds
+        bucket = 1
+        while bucket < us:
+            bucket*=2
+        with self.lock:
+            entry = self.entry(args)
+            entry['calls']+=1
+            entry['bytes_out']+=bytes_out
+            entry['bytes_in']+=bytes_in
+            entry['bad_param']+=bool(bad)
+            entry['total_us']+=us
+            entry['max_us'] = max(entry['max_us'], us)
+            entry['histogram_us'][bucket] = entry['histogram_us'].get(bucket, 0) + 1
+
+    def note(self, args, field, count = 1):
+        """
+        :Method: note
+
+        :Description: Adds to one of the counts for a command, such as *retries* or *bad_param*. Transports use it for what happens underneath a call.
+
+        :returns: None
+        """
+        with self.lock:
+            entry = self.entry(args)
+            entry[field] = entry.get(field, 0) + count
+
+    def snapshot(self, reset = False):
+        """
+        :Method: snapshot
+
+        :Description: Copies the counts, keyed by names such as "PWM_REGISTER3/0x0E"
+
+        :param reset: When True, the counts are cleared once they have been copied
+        :type reset: bool
+
+        :returns: dict of dicts. Each holds the counts for a command, with its *addr* and *cmd*, its *bad_param_rate*, and its *mean_us*.
+            *histogram_us* maps the upper bound of each bucket, in microseconds, to the number of calls which took up to that long.
+        """
+        with self.lock:
+            commands = self.commands
+            if reset:
+                self.commands = dict()
+        stats = dict()
+        for (addr, cmd), entry in sorted(commands.items()):
+            entry = dict(entry, histogram_us = dict(entry['histogram_us']), addr = addr, cmd = cmd)
+            entry['bad_param_rate'] = float(entry['bad_param'])/entry['calls'] if entry['calls'] else 0.0
+            entry['mean_us'] = entry['total_us']/entry['calls'] if entry['calls'] else 0.0
+            stats['%s/0x%02X'%(register_name(addr), cmd)] = entry
+        return stats
+
+    def reset(self):
+        """
+        :Method: reset
+
+        :Description: Clears the counts
+
+        :returns: None
+        """
+        with self.lock:
+            self.commands = dict()
+
+
+def register_name(addr):
+    """
+    :Function: register_name
+
+    :Description: Names an address after its attribute on :class:`~pisoc.PiSoC`, such as PWM_REGISTER3 or GPIO_REGISTER
+
+    :returns: The name, or the address in hex if it has none
+    """
+    for name in sorted(vars(PiSoC)):
+        if (name.endswith('_CONTROL') or '_REGISTER' in name or name in ('RANGE_FINDER', 'CHECK_BUILD', 'RESET_ADDRESS')) and getattr(PiSoC, name) == addr:
+            return name
+    return '0x%02X'%addr
+
+
+class MeteredTransport(object):
+    """
+    :Class:
+
+        Counts the calls made on a transport in a :class:`Metrics`, and otherwise passes them through. It is used as :attr:`~pisoc.PiSoC.commChannel` when the PiSoC is constructed with *metrics* set.
+
+        Call times include any waiting done by the transport underneath, so with a window larger than 1 a write is timed until it is sent, not until it is acknowledged.
+    """
+    def __init__(self, channel, metrics = None):
+        """
+        :Method: __init__
+
+        :param channel: The transport to count calls on
+        :param metrics: Where to count them. A new :class:`Metrics` is made if none is given.
+        :type metrics: Metrics
+        """
+        self.channel = channel
+        self.metrics = metrics if metrics is not None else Metrics()
+        inner = channel
+        while not hasattr(type(inner), 'metrics') and 'channel' in vars(inner): #the transport which retries is underneath any threading
+            inner = inner.channel
+        inner.metrics = self.metrics
+        if getattr(inner, 'pipeline', None) is not None:
+            inner.pipeline.metrics = self.metrics
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def call(self, method, args, kwargs):
+        pipeline = getattr(self.channel, 'pipeline', None)
+        bytes_in = 4 if pipeline is None else 10 if pipeline.checked else 7 if pipeline.framed else 4
+        Hformat = kwargs.get('Hformat', [2])
+        bytes_out = 2 + sum([2 if (x in Hformat or args[x] > 255) else 1 for x in range(len(args))]) #counted rather than packed, since the transport's encoder belongs to whichever thread does its I/O
+        t0 = time.time()
+        resp = getattr(self.channel, method)(*args, **kwargs)
+        self.metrics.record(args, time.time() - t0, bytes_out, bytes_in, resp == PiSoC.BAD_PARAM)
+        return resp
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Sends data to the PiSoC, as :meth:`~pisoc.UART.send_data` does, and counts it. A write which the PiSoC rejects is counted when the transport learns of it.
+
+        :returns: None
+        """
+        return self.call('send_data', args, kwargs)
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Requests data from the PiSoC, as :meth:`~pisoc.UART.receive_data` does, and counts it
+
+        :returns: The response from the PiSoC
+        """
+        return self.call('receive_data', args, kwargs)
@@ -0,0 +1,605 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Keeps track of the requests written to a serial stream whose responses have not been read yet. The UART, SPI and USB UART transports each create a :class:`ResponsePipeline`
+when they are constructed, so this module is only loaded once one of them is used.
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import struct
+import time
+import logging
+import collections
+from pisoc import *
+
+
+class ResponsePipeline(object):
+    """
+    :Class:
+
+        Keeps track of requests which have been written to a serial stream but whose responses have not been read yet.
+        The PiSoC answers every frame with one 32-bit word, in the order the frames were received, so responses are matched to requests in order from a single incremental reader.
+        It is used by :class:`~pisoc.UART` and :class:`~pisoc.USB_UART` when their window is larger than 1, or when responses are framed.
+
+        In framed mode each response is preceded by :attr:`~pisoc.PiSoC.MAGIC` and the address and command it answers. A reader which finds anything else in front of the response it expects
+        skips ahead to the next copy of that header, so stale bytes are dropped without flushing the port. The port is only flushed when no header can be found, or when the stream times out.
+
+        In checked mode, frames in both directions also carry a sequence number and end with a :func:`crc16`. A request is written as MAGIC, length, sequence number, the command, and the CRC;
+        its response is MAGIC, sequence number, address, command, the response word, any further words, and the CRC. A response which fails its CRC is skipped. A request whose response is lost,
+        because it was corrupted, because a later request was answered first, or because the PiSoC answered :attr:`~pisoc.PiSoC.RESEND`, is sent again on its own, up to :attr:`~pisoc.PiSoC.MAX_RESENDS` times.
+        The PiSoC executes requests in the order of their sequence numbers: one which arrives after an earlier request was lost is answered with RESEND, so that requests which are sent again
+        are still executed in the order they were first sent. The PiSoC also remembers its recent responses by sequence number, so a request which it has already executed is answered again
+        rather than executed twice.
+    """
+    metrics = None
+
+    def __init__(self, ser, window = 1, encoder = None):
+        """
+        :Method: __init__
+
+        :Description: Constructs a pipeline on top of an open serial object
+
+        :param ser: pyserial object which frames are written to and responses are read from
+        :type ser: serial.Serial
+
+        :param window: Maximum number of requests which may be waiting for a response at any time
+        :type window: int
+
+        :param encoder: The :class:`~pisoc.FrameEncoder` of the transport which owns the pipeline, used for the requests the pipeline makes itself. A new one is made if None.
+        :type encoder: FrameEncoder
+
+        :returns: None
+        """
+        self.ser = ser
+        self.window = window
+        self.encoder = FrameEncoder() if encoder is None else encoder
+        self.board = PiSoC
+        self.framed = False
+        self.checked = False
+        self.want_checked = False
+        self.seq = 0
+        self.sent = 0
+        self.timeout = None
+        self.resyncing = False
+        self.unacked = False
+        self.unsynced = 0
+        self.pending = collections.deque()
+        self.buf = bytearray()
+        self.skipped = 0
+        self.lost = False
+
+    def submit(self, data, args, check = False, callback = None, block = False):
+        """
+        :Method: submit
+
+        :Description: Writes a prepared frame without waiting for its response. If the window is full, the oldest response is read first.
+
+        :param data: Prepared frame, in the form accepted by the serial object's write method
+        :param args: The arguments which produced the frame; used for logging
+        :type args: tuple
+
+        :param check: When True, the response is expected to be :attr:`~pisoc.PiSoC.GOOD` and a warning is logged if it is not, as is done for :meth:`send_data`
+        :type check: bool
+
+        :param callback: Optional function which is called with the response once it has been read
+        :type callback: function
+
+        :param block: When True, the response word is a count of further words which follow it, and the response is the list of those words. See :meth:`~pisoc.UART.receive_block`.
+        :type block: bool
+
+        :returns: list which will hold the response once it has been read. Pass it to :meth:`wait`.
+        """
+        while len(self.pending) >= self.window:
+            self.read_next()
+        seq = self.seq if self.checked else None
+        data = self.frame(data)
+        self.sent+=1
+        slot = [args, check, None, callback, block, data, seq, 0, None, self.sent] #the last five are for checked mode: frame, sequence number, resends, answer, and when it was last sent
+        self.ser.write(data)
+        self.pending.append(slot)
+        return slot
+
+    def frame(self, data, seq = None):
+        """
+        :Method: frame
+
+        :Description: In checked mode, adds a sequence number and a CRC to a prepared frame. Otherwise the frame is returned as it is.
+
+        :param data: Prepared frame, starting with its MAGIC and length bytes
+        :param seq: The sequence number. The next one is taken if None.
+        :type seq: int
+
+        :returns: The frame to write
+        """
+        if not self.checked:
+            return data
+        if seq is None:
+            seq, self.seq = self.seq, (self.seq + 1)&0xFF
+        frame = bytearray(data)
+        frame[1]+=3
+        frame.insert(2, seq)
+        crc = crc16(frame)
+        frame.append(crc&0xFF)
+        frame.append(crc>>8)
+        return bytes(frame)
+
+    def wait(self, slot):
+        """
+        :Method: wait
+
+        :Description: Reads responses, in order, until the response for *slot* has arrived.
+
+        :param slot: value returned by :meth:`submit`
+        :type slot: list
+
+        :returns: The unpacked response to that request
+        """
+        while slot[2] is None:
+            self.read_next()
+        return slot[2]
+
+    def drain(self):
+        """
+        :Method: drain
+
+        :Description: Reads every outstanding response, so that all requests sent so far are known to have been processed by the PiSoC.
+
+        :returns: None
+        """
+        while self.pending:
+            self.read_next()
+
+    def resize(self, window):
+        """
+        :Method: resize
+
+        :Description: Changes how many requests may be in flight. Outstanding responses are read before the change is made.
+            The window is limited by what the firmware reports it can queue; firmware which cannot queue frames only allows a window of 1.
+
+        :param window: Requested number of requests in flight
+        :type window: int
+
+        :returns: The window which will actually be used
+        """
+        window = max(int(window), 1)
+        if window > 1 and not self.board.FEATURES&PiSoC.FEATURE_PIPELINE:
+            logging.warning('The firmware on this PiSoC cannot queue requests. Only one request will be in flight at a time.')
+            window = 1
+        elif window > self.board.RX_QUEUE_DEPTH:
+            logging.warning('The firmware on this PiSoC can only queue %d requests. The window has been limited to %d.'%(self.board.RX_QUEUE_DEPTH, self.board.RX_QUEUE_DEPTH))
+            window = self.board.RX_QUEUE_DEPTH
+        self.drain()
+        self.window = window
+        return window
+
+    def reset(self, ser):
+        """
+        :Method: reset
+
+        :Description: Attaches the pipeline to a newly opened serial object. Requests which were still outstanding on the old one are given :attr:`~pisoc.PiSoC.BAD_PARAM`.
+
+        :param ser: The new pyserial object
+        :type ser: serial.Serial
+
+        :returns: None
+        """
+        self.fail_pending()
+        del self.buf[:]
+        self.framed = False
+        self.checked = False
+        self.unsynced = 0
+        self.ser = ser
+
+    def set_framed(self, framed, checked = None):
+        """
+        :Method: set_framed
+
+        :Description: Asks the PiSoC to start or stop framing its responses. Turning framing off is always attempted, since the PiSoC may still be framing responses for an earlier connection;
+            firmware which does not support framing simply rejects the request.
+
+        :param framed: True to frame responses
+        :type framed: bool
+
+        :param checked: True to also check frames in both directions; see :class:`ResponsePipeline`. It is remembered, and if None, the last choice is used, so that framing is checked again
+            when it is turned back on after a reconnection.
+        :type checked: bool
+
+        :returns: True if responses are now framed
+        """
+        self.drain()
+        if checked is None:
+            checked = self.want_checked
+        self.want_checked = checked
+        if framed and not self.board.FEATURES&PiSoC.FEATURE_FRAMED:
+            logging.warning('The firmware on this PiSoC cannot frame its responses.')
+            framed = False
+        checked = checked and framed
+        if checked and not self.board.FEATURES&PiSoC.FEATURE_CHECKED:
+            logging.warning('The firmware on this PiSoC cannot check its frames.')
+            checked = False
+        args = (PiSoC.CHECK_BUILD, 0x0C, 2 if checked else int(framed))
+        was_checked, self.checked = self.checked, False
+        slot = self.submit(self.encoder.encode(args).tobytes(), args) #the request is sent in the old format,
+        if checked: #and the PiSoC starts counting sequence numbers again
+            slot[6], self.seq = 0, 1
+            if not was_checked:
+                self.timeout = self.ser.timeout
+                if self.timeout is None or self.timeout > PiSoC.RESEND_TIMEOUT: #a lost response is sent again rather than waited on
+                    self.ser.timeout = PiSoC.RESEND_TIMEOUT
+        elif was_checked:
+            self.ser.timeout = self.timeout
+        self.framed, self.checked = framed, checked #and its response already arrives in the new format.
+        if self.wait(slot) != PiSoC.GOOD and framed:
+            logging.warning('The PiSoC did not start framing its responses.')
+            if self.checked:
+                self.ser.timeout = self.timeout
+            self.framed = self.checked = False
+            self.ser.flushInput()
+        return self.framed
+
+    def set_unacked(self, unacked):
+        """
+        :Method: set_unacked
+
+        :Description: Turns unacknowledged writes on or off. While they are on, writes are sent with :meth:`post` and failures are only learned of at the next :meth:`sync`.
+            Turning them off syncs first.
+
+        :param unacked: True to stop waiting for writes to be acknowledged
+        :type unacked: bool
+
+        :returns: True if writes are now unacknowledged
+        """
+        if unacked and not self.board.FEATURES&PiSoC.FEATURE_UNACKED:
+            logging.warning('The firmware on this PiSoC acknowledges every write.')
+            unacked = False
+        if not unacked:
+            self.sync()
+        self.unacked = unacked
+        return unacked
+
+    def post(self, data):
+        """
+        :Method: post
+
+        :Description: Writes a frame which starts with :attr:`~pisoc.PiSoC.UNACKED_MAGIC`, which the PiSoC executes without answering. Nothing is added to the pending requests.
+            Since the PiSoC can only queue :attr:`~pisoc.PiSoC.RX_QUEUE_DEPTH` frames, and would drop any more, :meth:`sync` is called once that many frames may be waiting.
+
+        :param data: Prepared frame
+        :returns: None
+        """
+        self.ser.write(self.frame(data, 0)) #the PiSoC does not number the frames it does not answer
+        self.unsynced+=1
+        if self.unsynced >= max(self.board.RX_QUEUE_DEPTH - 1, 1):
+            self.sync()
+
+    def sync(self):
+        """
+        :Method: sync
+
+        :Description: Waits for every outstanding response, and if unacknowledged writes have been sent since the last sync, reads and clears the PiSoC's count of those which failed (CheckBuild 0x0F).
+            A warning is logged if any did, naming the last of them.
+
+        :returns: The number of unacknowledged writes which failed, or were dropped, since the last sync
+        """
+        self.drain()
+        if not self.unsynced:
+            return 0
+        self.unsynced = 0
+        args = (PiSoC.CHECK_BUILD, 0x0F)
+        result = self.wait(self.submit(self.encoder.encode(args).tobytes(), args))
+        if result == PiSoC.BAD_PARAM:
+            return 0
+        count, addr, cmd = result&0xFFFF, (result>>24)&0xFF, (result>>16)&0xFF
+        if count:
+            logging.warning("%d unacknowledged writes failed on the PiSoC; the last was %s,%s" %(count, hex(addr), hex(cmd)))
+            if self.metrics is not None:
+                self.metrics.note((addr, cmd), 'bad_param', count)
+        return count
+
+    def parse_response(self, args, block = False):
+        """
+        :Method: parse_response
+
+        :Description: Takes the response for *args* out of the bytes which have already been read, without reading from the port. In framed mode, bytes in front of the header for *args* are dropped.
+            If no header turns up within 64 bytes, the stream is considered lost: the input buffer is flushed and :attr:`lost` is set.
+
+        :param args: The arguments of the request being answered
+        :type args: tuple
+
+        :param block: True if the response is a count of words which follow it
+        :type block: bool
+
+        :returns: The unpacked response, or None if more bytes are needed. For a block, the list of words, or :attr:`~pisoc.PiSoC.BAD_PARAM` if the PiSoC rejected the request.
+        """
+        size = 7 if self.framed else 4
+        if self.framed:
+            pos = self.buf.find(bytearray([PiSoC.MAGIC, args[0]&0xFF, args[1]&0xFF if len(args) > 1 else 0]))
+            if pos != 0:
+                drop = pos if pos > 0 else max(len(self.buf) - 2, 0) #the last two bytes could be the start of a header
+                del self.buf[:drop]
+                self.skipped+=drop
+                if self.skipped > 64:
+                    logging.debug("Lost track of the PiSoC's responses; flushing the port.")
+                    self.skipped = 0
+                    self.lost = True
+                    del self.buf[:]
+                    self.ser.flushInput()
+                    return None
+        if len(self.buf) < size:
+            return None
+        if self.skipped:
+            logging.debug("Skipped %d stale bytes in front of a response."%self.skipped)
+            self.skipped = 0
+        resp = struct.unpack('I', bytes(self.buf[size - 4:size]))[0]
+        if block and resp != PiSoC.BAD_PARAM:
+            if len(self.buf) < size + 4*resp:
+                return None
+            words = list(struct.unpack('<%dI'%resp, bytes(self.buf[size:size + 4*resp])))
+            del self.buf[:size + 4*resp]
+            return words
+        del self.buf[:size]
+        return int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
+
+    def read_response(self, args, block = False):
+        """
+        :Method: read_response
+
+        :Description: Reads from the port until the response for *args* has arrived
+
+        :param args: The arguments of the request being answered
+        :type args: tuple
+
+        :param block: True if the response is a count of words which follow it
+        :type block: bool
+
+        :returns: The unpacked response, or None if the stream timed out or could not be resynchronised. The input buffer is flushed in that case.
+        """
+        self.lost = False
+        while True:
+            resp = self.parse_response(args, block)
+            if resp is not None or self.lost:
+                return resp
+            chunk = self.ser.read(max((7 if self.framed else 4) - len(self.buf), self.ser.inWaiting(), 1))
+            if not chunk:
+                logging.debug("Lost connection to PiSoC temporarily.")
+                del self.buf[:]
+                self.ser.flushInput()
+                return None
+            self.buf.extend(bytearray(chunk))
+
+    def poll(self):
+        """
+        :Method: poll
+
+        :Description: Reads whatever the port already holds, without waiting, and hands out every response which is complete.
+
+        :returns: None
+        """
+        waiting = self.ser.inWaiting()
+        if waiting:
+            self.buf.extend(bytearray(self.ser.read(waiting)))
+        self.lost = False
+        if self.checked:
+            self.parse_checked()
+            self.settle()
+            return
+        while self.pending:
+            resp = self.parse_response(self.pending[0][0], self.pending[0][4])
+            if resp is None:
+                if self.lost:
+                    self.fail_pending()
+                return
+            self.complete(resp)
+
+    def read_next(self):
+        """
+        :Method: read_next
+
+        :Description: Reads one response from the stream and gives it to the oldest outstanding request.
+            If the stream times out or cannot be resynchronised, every outstanding request is given :attr:`~pisoc.PiSoC.BAD_PARAM`, since the position of the stream can no longer be trusted.
+
+        :returns: None
+        """
+        if not self.pending:
+            return
+        if self.checked:
+            self.read_checked()
+            return
+        resp = self.read_response(self.pending[0][0], self.pending[0][4])
+        if resp is None:
+            self.fail_pending()
+            return
+        self.complete(resp)
+
+    def read_checked(self):
+        """
+        :Method: read_checked
+
+        :Description: Reads from the port, in checked mode, until the oldest outstanding request has been answered. Requests whose responses were lost are sent again as that is found out,
+            and if nothing arrives within the port's timeout, :attr:`~pisoc.PiSoC.RESYNC_SIZE` zeros are written, to finish any frame which the PiSoC took a corrupted length for, and every unanswered
+            request is sent again.
+
+        :returns: None
+        """
+        self.lost = False
+        while self.pending[0][8] is None and not self.lost:
+            self.parse_checked()
+            if self.pending[0][8] is not None or self.lost:
+                break
+            chunk = self.ser.read(max(10 - len(self.buf), self.ser.inWaiting(), 1))
+            if not chunk:
+                logging.debug("The PiSoC did not answer; sending the unanswered requests again.")
+                self.ser.write(bytes(bytearray(PiSoC.RESYNC_SIZE))) #finishes any frame which the PiSoC took a corrupted length for
+                charge = True
+                for slot in list(self.pending):
+                    if slot[8] is None and not self.lost:
+                        self.resend(slot, charge)
+                        charge = False
+                continue
+            self.buf.extend(bytearray(chunk))
+        self.settle()
+
+    def parse_checked(self):
+        """
+        :Method: parse_checked
+
+        :Description: Takes every complete response out of the bytes which have already been read, in checked mode, and gives each to the outstanding request with its sequence number.
+            Responses which fail their CRC are skipped a byte at a time, and responses which no outstanding request is waiting for are dropped. Since the PiSoC answers requests in the order it
+            receives them, an answer means that requests which were last sent before the one answered, and have no answer of their own, were lost; they are sent again.
+
+        :returns: None
+        """
+        while True:
+            pos = self.buf.find(bytearray([PiSoC.MAGIC]))
+            if pos != 0:
+                drop = pos if pos > 0 else len(self.buf)
+                del self.buf[:drop]
+                self.skipped+=drop
+            if len(self.buf) < 10:
+                return
+            seq = self.buf[1]
+            resp = struct.unpack('<I', bytes(self.buf[4:8]))[0]
+            slot = None
+            for pending in self.pending:
+                if pending[6] == seq:
+                    slot = pending
+                    break
+            size = 10
+            if slot is not None and slot[4] and resp not in (PiSoC.BAD_PARAM, PiSoC.RESEND) and resp <= PiSoC.MAX_BLOCK_WORDS:
+                size+=4*resp
+            if len(self.buf) < size:
+                return
+            if crc16(self.buf[:size - 2]) != self.buf[size - 2]|(self.buf[size - 1]<<8):
+                del self.buf[:1]
+                self.skipped+=1
+                continue
+            header = (self.buf[2], self.buf[3])
+            words = list(struct.unpack('<%dI'%((size - 10)//4), bytes(self.buf[8:size - 2])))
+            del self.buf[:size]
+            if self.skipped:
+                logging.debug("Skipped %d corrupted or stale bytes in front of a response."%self.skipped)
+                self.skipped = 0
+            if slot is None or slot[8] is not None:
+                continue #an answer to a request which was sent again, or to one which has been given up on
+            if resp == PiSoC.RESEND: #the request was corrupted on its way to the PiSoC, or an earlier one was
+                self.resend(slot, self.first_unanswered() is slot)
+                continue
+            if header != (slot[0][0]&0xFF, slot[0][1]&0xFF if len(slot[0]) > 1 else 0):
+                continue
+            if slot[4] and resp != PiSoC.BAD_PARAM:
+                slot[8] = words
+            else:
+                slot[8] = int(resp) if resp<=PiSoC.MAX_RESPONSE_SIZE else int(resp - 0xFFFFFFFF)
+            for earlier in list(self.pending):
+                if earlier is slot:
+                    break
+                if earlier[8] is None and earlier[9] < slot[9]:
+                    self.resend(earlier)
+
+    def first_unanswered(self):
+        for slot in self.pending:
+            if slot[8] is None:
+                return slot
+        return None
+
+    def resend(self, slot, charge = True):
+        """
+        :Method: resend
+
+        :Description: Sends a request again, in checked mode, with the sequence number it was first sent with. If it has already been sent :attr:`~pisoc.PiSoC.MAX_RESENDS` more times, :attr:`lost` is set instead.
+
+        :param charge: False if the request is only sent again because an earlier one was, in which case it does not count towards :attr:`~pisoc.PiSoC.MAX_RESENDS`
+        :type charge: bool
+
+        :returns: None
+        """
+        if charge:
+            if slot[7] >= PiSoC.MAX_RESENDS:
+                logging.debug("Gave up on:%s\n\rafter sending it %d times"%(','.join([hex(c) for c in list(slot[0])]), slot[7] + 1))
+                self.lost = True
+                return
+            slot[7]+=1
+        if self.metrics is not None:
+            self.metrics.note(slot[0], 'retries')
+        self.sent+=1
+        slot[9] = self.sent
+        self.ser.write(slot[5])
+
+    def settle(self):
+        """
+        :Method: settle
+
+        :Description: Completes outstanding requests, in order, for as long as the oldest has been answered. If the stream was lost, every outstanding request is given :attr:`~pisoc.PiSoC.BAD_PARAM`,
+            and checking is turned on again, so that the PiSoC and the host count sequence numbers from the same place.
+
+        :returns: None
+        """
+        if self.lost:
+            del self.buf[:]
+            self.ser.flushInput()
+            self.fail_pending()
+            if self.checked and not self.resyncing: #the PiSoC is still waiting for the requests which were given up on
+                self.resyncing = True
+                try:
+                    self.set_framed(True, True)
+                finally:
+                    self.resyncing = False
+            return
+        while self.pending and self.pending[0][8] is not None:
+            self.complete(self.pending[0][8])
+
+    def complete(self, resp):
+        """
+        :Method: complete
+
+        :Description: Gives *resp* to the oldest outstanding request
+
+        :returns: None
+        """
+        slot = self.pending.popleft()
+        if slot[1] and resp != PiSoC.GOOD:
+            if self.metrics is not None:
+                self.metrics.note(slot[0], 'bad_param')
+            logging.warning("Sent:%s\n\rGot: %s (%s) in send_data which likely indicates a bad parameter" %(','.join([hex(c) for c in list(slot[0])]),str(int(resp)), hex(resp)))
+        elif resp == PiSoC.BAD_PARAM:
+            logging.debug("Sent:%s\n\rGot: %s (%s) in receive_data which indicates a bad parameter" %(','.join([hex(c) for c in list(slot[0])]),str(int(resp)), hex(resp)))
+        self.resolve(slot, resp)
+
+    def fail_pending(self):
+        """
+        :Method: fail_pending
+
+        :Description: Gives :attr:`~pisoc.PiSoC.BAD_PARAM` to every outstanding request
+
+        :returns: None
+        """
+        if self.pending:
+            logging.debug("%d requests were not answered."%len(self.pending))
+        while self.pending:
+            self.resolve(self.pending.popleft(), PiSoC.BAD_PARAM)
+
+    def resolve(self, slot, resp):
+        slot[2] = resp
+        if slot[3] is not None:
+            slot[3](resp)
@@ -0,0 +1,431 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Lets several threads share one PiSoC. :class:`ThreadedTransport` hands every request to a single I/O thread, and :class:`Scheduler` sends them by priority.
+They are used by :class:`~pisoc.PiSoC` when it is constructed with *threaded* or *scheduled* set, which is when this module is loaded.
+
+:Example:
+
+    >>> from pisoc import *
+    >>> PiSoC('PC', window = 4, threaded = True)
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import time
+import threading
+import itertools
+import contextlib
+from pisoc import *
+
+
+class Request(object):
+    """
+    :Class:
+
+        The result of a request given to a :class:`ThreadedTransport`. It is a small stand-in for :class:`concurrent.futures.Future`, which is used instead when it is available.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.callbacks = []
+
+    def set_running_or_notify_cancel(self):
+        return True
+
+    def done(self):
+        return self.event.is_set()
+
+    def result(self, timeout = None):
+        """
+        :Method: result
+
+        :Description: Waits for the request to be answered
+
+        :param timeout: Longest time to wait, in seconds. Waits forever if None.
+        :type timeout: float
+
+        :returns: The value the transport returned for the request. An exception raised by the transport is raised again here.
+        """
+        if not self.event.wait(timeout):
+            raise RuntimeError('Timed out waiting for the PiSoC to answer a request')
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def add_done_callback(self, fn):
+        if self.done():
+            fn(self)
+        else:
+            self.callbacks.append(fn)
+
+    def set_result(self, value):
+        self.value = value
+        self.finish()
+
+    def set_exception(self, error):
+        self.error = error
+        self.finish()
+
+    def finish(self):
+        self.event.set()
+        for fn in self.callbacks:
+            fn(self)
+
+@memoized
+def queue_module():
+    """
+    :Function: queue_module
+
+    :Description: Imports the queue module, which is only needed once a :class:`ThreadedTransport` is started
+
+    :returns: queue, or Queue on Python 2
+    """
+    try:
+        import queue
+    except ImportError:
+        import Queue as queue
+    return queue
+
+@memoized
+def future_class():
+    """
+    :Function: future_class
+
+    :Description: Finds the class of the futures returned by :meth:`ThreadedTransport.submit`. concurrent.futures is only imported once a future is needed.
+
+    :returns: :class:`concurrent.futures.Future` where it is available, otherwise :class:`Request`
+    """
+    try:
+        from concurrent.futures import Future
+    except ImportError:
+        return Request
+    return Future
+
+
+class ThreadedTransport(object):
+    """
+    :Class:
+
+        Makes a transport safe to use from several threads. A single I/O thread owns the transport underneath, and every request is handed to it through a bounded queue, so
+        frames from different threads can never be interleaved on the wire or given each other's responses. It is used as :attr:`~pisoc.PiSoC.commChannel` when the PiSoC is constructed with *threaded* set.
+
+        :meth:`send_data` and :meth:`receive_data` block their caller until the request is answered, so component classes work unchanged. :meth:`submit` returns a future instead.
+        When the queue is full, callers wait for room in it, which keeps a fast producer from running ahead of the board.
+
+        On a UART or USB UART transport with a window larger than 1, the I/O thread keeps up to a window of requests in flight, and only waits for a response when nothing else is queued.
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> PiSoC('PC', window = 4, threaded = True)
+            >>> pins = [DigitalPin(2, i, 'input') for i in range(8)]
+            >>> futures = [PiSoC.commChannel.submit('receive_data', pin.address, 0x00, (pin.port<<4)|(pin.pin<<1)) for pin in pins]
+            >>> states = [bool(future.result()) for future in futures]
+    """
+    queue_class = 'Queue' #the class in queue_module() which holds the requests
+
+    def __init__(self, channel, depth = 64):
+        """
+        :Method: __init__
+
+        :Description: Starts the I/O thread for *channel*
+
+        :param channel: The transport which the I/O thread will own. It should not be used directly afterwards.
+
+        :param depth: Largest number of requests which may be queued for the I/O thread
+        :type depth: int
+
+        :returns: None
+        """
+        self.channel = channel
+        self.encoder = FrameEncoder() #used by the I/O thread only
+        self.requests = getattr(queue_module(), self.queue_class)(max(int(depth), 1))
+        self.closed = False
+        self.thread = threading.Thread(target = self.run, name = 'PiSoC I/O')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        :Method: submit
+
+        :Description: Queues a call to one of the transport's methods, to be made by the I/O thread
+
+        :param method: Name of the method, such as "send_data" or "receive_data"
+        :type method: str
+
+        :param args: Arguments for the method
+        :type args: `unpacked iterable <https://docs.python.org/2/tutorial/controlflow.html#unpacking-argument-lists>`__
+
+        :param block: If False, :class:`queue.Full` is raised when the queue is full, rather than waiting for room. Defaults to True.
+        :type block: bool
+
+        :param timeout: Longest time to wait for room in the queue, in seconds, before :class:`queue.Full` is raised. Waits forever if None.
+        :type timeout: float
+
+        :returns: A future which will hold the method's return value
+        """
+        block = kwargs.pop('block', True)
+        timeout = kwargs.pop('timeout', None)
+        if self.closed:
+            raise ClosedPortException('The I/O thread for this PiSoC has been stopped')
+        future = future_class()()
+        if threading.current_thread() is self.thread: #a callback on the I/O thread; queueing would wait on itself.
+            self.call(future, method, args, kwargs)
+        else:
+            self.enqueue((future, method, args, kwargs), block, timeout)
+        return future
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Has the I/O thread send data to the PiSoC, as :meth:`~pisoc.UART.send_data` does, and waits for it to be done
+
+        :returns: None
+        """
+        return self.submit('send_data', *args, **kwargs).result()
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Has the I/O thread request data from the PiSoC, as :meth:`~pisoc.UART.receive_data` does, and waits for the response
+
+        :returns: The response from the PiSoC
+        """
+        return self.submit('receive_data', *args, **kwargs).result()
+
+    def set_window(self, window):
+        return self.submit('set_window', window).result()
+
+    def set_framed(self, framed, checked = None):
+        return self.submit('set_framed', framed, checked).result()
+
+    def set_unacked(self, unacked):
+        return self.submit('set_unacked', unacked).result()
+
+    def negotiate_baud(self, rates = None):
+        return self.submit('negotiate_baud', rates).result()
+
+    def set_baud(self, baud):
+        return self.submit('set_baud', baud).result()
+
+    def sync(self):
+        return self.submit('sync').result()
+
+    def flush(self):
+        """
+        :Method: flush
+
+        :Description: Waits until every request queued so far has been answered by the PiSoC
+
+        :returns: None
+        """
+        return self.submit('flush').result()
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Lets the I/O thread finish the requests already queued, stops it, and cleans up the transport underneath
+
+        :returns: None
+        """
+        if self.closed:
+            return
+        future = self.submit('cleanup')
+        self.closed = True
+        self.enqueue(None)
+        future.result()
+        self.thread.join()
+
+    def enqueue(self, item, block = True, timeout = None):
+        self.requests.put(item, block, timeout)
+
+    def dequeue(self, block):
+        return self.requests.get(block)
+
+    def run(self):
+        pipeline = getattr(self.channel, 'pipeline', None)
+        while True:
+            try:
+                item = self.dequeue(pipeline is None or not pipeline.pending)
+            except queue_module().Empty:
+                pipeline.read_next() #nothing else to send; wait for the oldest response.
+                continue
+            if item is None:
+                return
+            future, method, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                self.call(future, method, args, kwargs)
+
+    def call(self, future, method, args, kwargs):
+        pipeline = getattr(self.channel, 'pipeline', None)
+        try:
+            if pipeline is not None and pipeline.window > 1 and method in ('send_data', 'receive_data') and not (pipeline.unacked or pipeline.unsynced):
+                check = method == 'send_data'
+                data = self.encoder.encode(args, kwargs.get('Hformat', [2])).tobytes()
+                pipeline.submit(data, args, check, callback = lambda resp: future.set_result(None if check else resp))
+            else:
+                future.set_result(getattr(self.channel, method)(*args, **kwargs))
+        except Exception as e:
+            if pipeline is not None:
+                pipeline.fail_pending()
+            if not future.done():
+                future.set_exception(e)
+
+
+class Scheduler(ThreadedTransport):
+    """
+    :Class:
+
+        A :class:`ThreadedTransport` which sends queued requests by priority rather than in the order they were made. A slow stream of low priority traffic from one thread, such as a
+        :class:`~pisoc.digital.NeoPixelShield` redraw, then does not hold up a :meth:`~pisoc.digital.Servo.SetAngle` from another. It is used as :attr:`~pisoc.PiSoC.commChannel` when the PiSoC is
+        constructed with *scheduled* set.
+
+        The I/O thread takes the highest priority request first, and requests of the same priority in the order they were made. A request which is already being sent is never interrupted.
+        Commands to the PWM registers, which drive servos, motors and tones, are :attr:`~pisoc.PiSoC.PRIORITY_HIGH`. NeoPixel commands are :attr:`~pisoc.PiSoC.PRIORITY_LOW`, and everything else is
+        :attr:`~pisoc.PiSoC.PRIORITY_NORMAL`. This can be changed for an address through :attr:`priorities`, for the requests made by a thread with :meth:`using`, or for one request by passing *priority* to
+        :meth:`submit`, :meth:`send_data` or :meth:`receive_data`.
+
+        A request may also be given a *deadline*, in seconds from when it is made, in the same ways. A :attr:`~pisoc.PiSoC.PRIORITY_LOW` request which is still queued at its deadline is stale and is dropped:
+        a write is never sent, and a read raises :class:`~pisoc.DeadlineMissed`. Requests of higher priority are sent late instead. When the PiSoC keeps metrics, both are counted for their command,
+        as *dropped* and *deadline_misses*.
+
+        :Example:
+
+            >>> from pisoc import *
+            >>> PiSoC('PC', scheduled = True, metrics = True)
+            >>> shield = NeoPixelShield()
+            >>> def redraw():
+            ...     with PiSoC.commChannel.using(deadline = 0.05):
+            ...         while True:
+            ...             shield.Fill(shield.Blue)
+            ...             shield.Fill(shield.Red)
+            >>> threading.Thread(target = redraw).start()
+            >>> Servo(0).SetAngle(90)
+            >>> dropped = PiSoC.stats()['STRIPLIGHT_REGISTER/0x07'].get('dropped', 0)
+    """
+    queue_class = 'PriorityQueue'
+
+    def __init__(self, channel, board = None, depth = 64, deadlines = None):
+        """
+        :Method: __init__
+
+        :Description: Starts the I/O thread for *channel*
+
+        :param channel: The transport which the I/O thread will own. It should not be used directly afterwards.
+
+        :param board: The session the transport belongs to, whose metrics count missed deadlines. Defaults to the :class:`~pisoc.PiSoC` class itself.
+
+        :param depth: Largest number of requests which may be queued for the I/O thread
+        :type depth: int
+
+        :param deadlines: Default deadline, in seconds, for the requests of each priority, keyed by priority. Requests have no deadline by default.
+        :type deadlines: dict
+
+        :returns: None
+        """
+        self.board = PiSoC if board is None else board
+        self.deadlines = dict(deadlines or dict())
+        self.priorities = dict((addr, PiSoC.PRIORITY_HIGH) for addr in range(PiSoC.PWM_REGISTER0, PiSoC.PWM_REGISTER12 + 1))
+        self.priorities[PiSoC.STRIPLIGHT_REGISTER] = PiSoC.PRIORITY_LOW
+        self.context = threading.local()
+        self.order = itertools.count()
+        self.clock = getattr(time, 'monotonic', time.time)
+        ThreadedTransport.__init__(self, channel, depth)
+
+    @contextlib.contextmanager
+    def using(self, priority = None, deadline = None):
+        """
+        :Method: using
+
+        :Description: Gives the requests made by the calling thread, inside of a *with* block, a priority or a deadline
+
+        :param priority: :attr:`~pisoc.PiSoC.PRIORITY_HIGH`, :attr:`~pisoc.PiSoC.PRIORITY_NORMAL` or :attr:`~pisoc.PiSoC.PRIORITY_LOW`. The priority of each address is kept if None.
+        :type priority: int
+
+        :param deadline: Seconds from when each request is made until it is stale. The default for its priority is kept if None.
+        :type deadline: float
+
+        :returns: A context manager
+        """
+        saved = getattr(self.context, 'priority', None), getattr(self.context, 'deadline', None)
+        self.context.priority, self.context.deadline = priority, deadline
+        try:
+            yield self
+        finally:
+            self.context.priority, self.context.deadline = saved
+
+    def schedule(self, args, kwargs):
+        priority = kwargs.pop('priority', None)
+        deadline = kwargs.pop('deadline', None)
+        if priority is None:
+            priority = getattr(self.context, 'priority', None)
+        if priority is None:
+            priority = self.priorities.get(args[0] if args else None, PiSoC.PRIORITY_NORMAL)
+        if deadline is None:
+            deadline = getattr(self.context, 'deadline', None)
+        if deadline is None:
+            deadline = self.deadlines.get(priority)
+        return priority, None if deadline is None else self.clock() + deadline
+
+    def note(self, args, field):
+        metrics = getattr(self.board, 'METRICS', None)
+        if metrics is not None and args:
+            metrics.note(args, field)
+
+    def enqueue(self, item, block = True, timeout = None):
+        if item is None: #stopping comes after everything already queued
+            return self.requests.put((PiSoC.PRIORITY_LOW + 1, next(self.order), None, None), block, timeout)
+        future, method, args, kwargs = item
+        priority, deadline = self.schedule(args, kwargs)
+        self.requests.put((priority, next(self.order), deadline, item), block, timeout)
+
+    def dequeue(self, block):
+        while True:
+            priority, order, deadline, item = self.requests.get(block)
+            if item is None or deadline is None:
+                return item
+            future, method, args, kwargs = item
+            if priority < PiSoC.PRIORITY_LOW or self.clock() <= deadline:
+                future.add_done_callback(lambda future: self.clock() > deadline and self.note(args, 'deadline_misses')) #writes in flight are done when acknowledged
+                return item
+            self.note(args, 'dropped')
+            if method == 'receive_data':
+                future.set_exception(DeadlineMissed('%s was stale before it could be sent'%','.join([hex(c) for c in args])))
+            else:
+                future.set_result(None)
+
+    def call(self, future, method, args, kwargs):
+        if 'priority' in kwargs or 'deadline' in kwargs: #a callback on the I/O thread, which skipped the queue
+            kwargs = dict(kwargs)
+            kwargs.pop('priority', None)
+            kwargs.pop('deadline', None)
+        ThreadedTransport.call(self, future, method, args, kwargs)
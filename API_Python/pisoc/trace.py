@@ -0,0 +1,258 @@
+# Copyright (c) 2016 Embedit Electronics
+# Author: Brian Bradley
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Records the traffic between the host and the PiSoC to a trace file, and replays it, so that a real workload can be reproduced on a bench.
+
+A trace starts with the 4 bytes "PSTR" and a version byte. It is followed by one record per command:
+
+    ======  ======  ===============================================================
+    bytes   format  meaning
+    ======  ======  ===============================================================
+    8       <d      seconds since the trace was started, on a monotonic clock
+    4       <f      seconds the command took
+    1       B       flags: 0x01 if the command was a read, 0x02 if a response follows
+    1       B       length of the frame
+    n               the frame, as written to the PiSoC, starting with MAGIC
+    4       <I      the response, if flagged
+    ======  ======  ===============================================================
+
+Traces are only appended to, so a file can hold several runs; each run starts its own timestamps from 0.
+
+A trace can be replayed from the command line:
+
+    python -m pisoc.trace replay piano.trace --protocol LOOPBACK --fast
+
+:Example:
+
+    >>> from pisoc import *
+    >>> PiSoC('PC', record = 'piano.trace')
+"""
+
+__author__ = 'Brian Bradley'
+__version__ = '2.0.1'
+
+import time
+import struct
+import argparse
+import threading
+from pisoc import *
+
+TRACE_MAGIC = b'PSTR'
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct('<dfBB')
+TRACE_RESPONSE = struct.Struct('<I')
+
+FLAG_READ = 0x01
+FLAG_RESPONSE = 0x02
+
+clock = getattr(time, 'monotonic', time.time)
+
+
+class TraceRecorder(object):
+    """
+    :Class:
+
+        Writes every command sent through a transport, and every response it returns, to a trace file, and otherwise passes calls through.
+        It is used as :attr:`PiSoC.commChannel` when the PiSoC is constructed with *record* set to the path of the trace.
+
+        Reads are recorded with their response. Writes are recorded with none: the transport only reports a write's acknowledgement by logging a rejected one.
+    """
+    def __init__(self, channel, path):
+        """
+        :Method: __init__
+
+        :param channel: The transport to record
+        :param path: The trace file, which is created if need be and otherwise appended to
+        :type path: str
+        """
+        self.channel = channel
+        self.path = path
+        self.lock = threading.Lock()
+        self.encoder = FrameEncoder()
+        self.trace = open(path, 'ab')
+        if self.trace.tell() == 0:
+            self.trace.write(TRACE_MAGIC + struct.pack('B', TRACE_VERSION))
+        self.start = clock()
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def record(self, method, args, kwargs):
+        with self.lock: #calls may come from several threads when the transport underneath is threaded
+            frame = self.encoder.encode(args, kwargs.get('Hformat', [2])).tobytes()
+        t0 = clock()
+        resp = getattr(self.channel, method)(*args, **kwargs)
+        elapsed = clock() - t0
+        flags = FLAG_READ if method == 'receive_data' else 0
+        if resp is not None:
+            flags|=FLAG_RESPONSE
+        data = TRACE_HEADER.pack(t0 - self.start, elapsed, flags, len(frame)) + frame
+        if resp is not None:
+            data+=TRACE_RESPONSE.pack(int(resp)&0xFFFFFFFF)
+        with self.lock:
+            if not self.trace.closed:
+                self.trace.write(data)
+        return resp
+
+    def send_data(self, *args, **kwargs):
+        """
+        :Method: send_data
+
+        :Description: Sends data to the PiSoC, as :meth:`~pisoc.UART.send_data` does, and records it
+
+        :returns: None
+        """
+        return self.record('send_data', args, kwargs)
+
+    def receive_data(self, *args, **kwargs):
+        """
+        :Method: receive_data
+
+        :Description: Requests data from the PiSoC, as :meth:`~pisoc.UART.receive_data` does, and records the request and its response
+
+        :returns: The response from the PiSoC
+        """
+        return self.record('receive_data', args, kwargs)
+
+    def cleanup(self):
+        """
+        :Method: cleanup
+
+        :Description: Closes the trace, and cleans up the transport underneath. The reset sent by the transport is not recorded.
+
+        :returns: None
+        """
+        with self.lock:
+            self.trace.close()
+        self.channel.cleanup()
+
+
+def read_trace(path):
+    """
+    :Function: read_trace
+
+    :Description: Reads the records of a trace file
+
+    :param path: The trace file
+    :type path: str
+
+    :returns: A generator of tuples of (timestamp, duration, is_read, frame, response). *frame* is a bytearray, and *response* is None if none was recorded.
+
+    :raises: ValueError if *path* is not a trace, or was written by a newer version
+    """
+    with open(path, 'rb') as f:
+        header = f.read(5)
+        if header[:4] != TRACE_MAGIC:
+            raise ValueError('%s is not a PiSoC trace'%path)
+        if bytearray(header)[4] > TRACE_VERSION:
+            raise ValueError('%s was written by a newer version of the API'%path)
+        while True:
+            data = f.read(TRACE_HEADER.size)
+            if len(data) < TRACE_HEADER.size:
+                return
+            timestamp, duration, flags, length = TRACE_HEADER.unpack(data)
+            frame = bytearray(f.read(length))
+            resp = None
+            if flags&FLAG_RESPONSE:
+                data = f.read(TRACE_RESPONSE.size)
+                if len(data) < TRACE_RESPONSE.size:
+                    return #the recording was cut off mid record
+                resp = TRACE_RESPONSE.unpack(data)[0]
+            if len(frame) < length:
+                return
+            yield timestamp, duration, bool(flags&FLAG_READ), frame, resp
+
+
+def replay(path, channel = None, speed = 1.0):
+    """
+    :Function: replay
+
+    :Description: Sends the commands of a trace to a transport, in order. Each frame is sent byte for byte as it was recorded.
+
+    :param path: The trace file
+    :type path: str
+
+    :param channel: The transport to send to, such as a :class:`~pisoc.UART` or a :class:`~pisoc.emulator.Loopback`. Defaults to :attr:`PiSoC.commChannel`.
+
+    :param speed: How many times faster than recorded to send commands. 1.0 keeps the original pacing, and None or 0 sends them as fast as possible.
+    :type speed: float
+
+    :returns: dict with the number of *commands* and *reads* sent, the *seconds* the replay took, the *recorded_seconds* the trace spans, and the number of reads whose response differed from the recorded one, as *mismatches*
+    """
+    if channel is None:
+        channel = PiSoC.commChannel
+    commands, reads, mismatches = 0, 0, 0
+    recorded_seconds = 0.0
+    start = clock()
+    base = last = None
+    for timestamp, duration, is_read, frame, recorded in read_trace(path):
+        if base is None or timestamp < last: #the first command of a run; pacing starts again from it
+            if base is not None:
+                recorded_seconds+=last - base
+            base, run_start = timestamp, clock()
+        last = timestamp
+        if speed:
+            wait = run_start + (timestamp - base)/speed - clock()
+            if wait > 0:
+                time.sleep(wait)
+        args = list(frame[2:])
+        if is_read:
+            resp = channel.receive_data(*args, Hformat = [])
+            reads+=1
+            if recorded is not None and int(resp)&0xFFFFFFFF != recorded:
+                mismatches+=1
+        else:
+            channel.send_data(*args, Hformat = [])
+        commands+=1
+    if hasattr(channel, 'flush'):
+        channel.flush()
+    if base is not None:
+        recorded_seconds+=last - base
+    return {'commands': commands, 'reads': reads, 'mismatches': mismatches, 'seconds': clock() - start, 'recorded_seconds': recorded_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Shows or replays a PiSoC trace')
+    parser.add_argument('action', choices = ['show', 'replay'])
+    parser.add_argument('trace')
+    parser.add_argument('--protocol', default = None, help = 'PC, USB, PI, UART, I2C or LOOPBACK; detected if not given')
+    parser.add_argument('--com-port', default = '/dev/ttyAMA0')
+    parser.add_argument('--baud', type = int, default = 9600)
+    parser.add_argument('--window', type = int, default = 1)
+    parser.add_argument('--speed', type = float, default = 1.0, help = 'times faster than recorded')
+    parser.add_argument('--fast', action = 'store_true', help = 'send commands as fast as possible')
+    parser.add_argument('--log-level', default = 'warn', choices = ['debug', 'info', 'warn', 'error'])
+    opts = parser.parse_args()
+    if opts.action == 'show':
+        for timestamp, duration, is_read, frame, resp in read_trace(opts.trace):
+            print('%12.6f %9.1fus %-5s %-40s %s'%(timestamp, 1e6*duration, 'read' if is_read else 'write', ' '.join('%02X'%b for b in frame),
+                '' if resp is None else '0x%08X'%resp))
+        return
+    PiSoC(opts.protocol, opts.com_port, opts.baud, opts.log_level, opts.window)
+    try:
+        result = replay(opts.trace, speed = None if opts.fast else opts.speed)
+    finally:
+        PiSoC.cleanup()
+    print('%(commands)d commands (%(reads)d reads) in %(seconds).3fs, recorded over %(recorded_seconds).3fs; %(mismatches)d responses differed'%result)
+
+if __name__ == '__main__':
+    main()
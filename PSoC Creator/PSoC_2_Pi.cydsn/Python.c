@@ -21,9 +21,10 @@ extern volatile xfer_t xferData;
 extern vessel_t vessel;
 extern comms_t comms;
 
-uint8 SPI_txBuffer[SPI_TX_BUFFER_SIZE]  = GET_TX_ARRAY(PISOC_BUSY);
-uint8 rxBuffer[MAX_RX_BUFFER_SIZE]      = {0};
-uint8 Status[SPI_TX_BUFFER_SIZE]        = GET_TX_ARRAY(PISOC_BUSY);
+uint8 SPI_txBuffer[SPI_TX_BUFFER_SIZE]  = {0u};
+uint8 rxQueue[RX_QUEUE_DEPTH][MAX_RX_BUFFER_SIZE] = {{0}};
+bool rxUnacked[RX_QUEUE_DEPTH] = {false};
+uint8 Status[SPI_TX_BUFFER_SIZE]        = {0u};
 
 #define PISOC_STATUS_REGISTER               Status[0]
 #define WRITE_STATUS_REGISTER(byte_val)     PISOC_STATUS_REGISTER = (uint8)byte_val
@@ -45,6 +46,7 @@ uint8 statusTD, txTD, rxTD;
 volatile uint16 SPI_Tx_Out = 0;
 volatile uint16 SPI_Status_Out = 0;
 volatile uint16 SPI_xfer_count = 0;
+volatile bool SPI_Response_Pending = false;  /* SPI_txBuffer holds a response which has not been clocked out yet */
 /*
 uint8 txChannel, rxControlChannel, rxDataChannel;
 uint8 txTD;
@@ -62,9 +64,19 @@ bool UART_Active = false;
 volatile uint8 state = WAITING;
 volatile uint8 data_length = 0;
 volatile uint8 xfer_count = 0;
-volatile bool Rx_Complete = false;
+volatile uint8 rxHead = 0;
+volatile uint8 rxTail = 0;
+volatile bool rxFrameUnacked = false;
+volatile bool UART_Frame_Received = false;
 volatile uint8 SPI_Rx_Status = 0u;
 
+#if defined(USE_SERIAL)
+    uint32 uartBaud = DEFAULT_BAUD;             /* Rate the UART runs at */
+    uint32 confirmedBaud = DEFAULT_BAUD;        /* Last rate the host confirmed; a framing error at any other goes back to it */
+    uint32 nextBaud = 0u;                       /* Rate proposed by CheckBuild 0x10, switched to once its response has been sent */
+    volatile bool baudError = false;            /* A framing error was taken at a rate which is not confirmed */
+#endif
+
 #if defined(USE_I2C)
     uint8 WR_buf[64u]; 
     //uint8 RD_buf[I2C_BUFFER_SIZE];
@@ -114,35 +126,10 @@ void RxCompleteHandler(void){
             {
                 rxData = CY_GET_REG8(SPIS_1_RXDATA_PTR);
                 
-                switch(state){
-                    case XFER_IN_PROGRESS:
-                        xfer_count++;
-                        rxBuffer[xfer_count] = rxData;
-                        if (xfer_count == rxBuffer[0]){
-                            Rx_Complete = true;
-                            state = WAITING;
-                        }
-                        
-                    break;
-                    case XFER_REQUESTED:
-                        rxBuffer[0] = rxData;
-                        xfer_count = 0;
-                        state = XFER_IN_PROGRESS;
-                    break;
-                    case WAITING:
-                        if (rxData == MAGIC_WORD){
-                            state = XFER_REQUESTED;
-                            SET_SR_BIT(BUSY_BIT);
-                        }
-                    break;
-                    default://Undefined State...
-                    break;
-                        
-                        
-                    
-                    
+                if (state == WAITING && rxData == MAGIC_WORD){
+                    SET_SR_BIT(BUSY_BIT);
                 }
-                
+                Python_rxByte(rxData);
                 
                 tmpStatus = SPIS_1_GET_STATUS_RX(SPI_Rx_Status);
                 SPI_Rx_Status = tmpStatus;
@@ -163,6 +150,10 @@ void RxCompleteHandler(void){
             {
                 /* Read receiver status register */
                 readStatus = UART_1_RXSTATUS_REG;
+                
+                if ((readStatus & UART_1_RX_STS_STOP_ERROR) != 0u && uartBaud != confirmedBaud){
+                    baudError = true; //the host is not sending at this rate
+                }
                     
                 if((readStatus & UART_1_RX_STS_FIFO_NOTEMPTY) != 0u)
                 {
@@ -174,30 +165,8 @@ void RxCompleteHandler(void){
                         while(!USBUART_CDCIsReady()){};
                         USBUART_PutChar(rxData);
                     #endif
-                    switch(state)
-                    {
-                        case XFER_IN_PROGRESS:
-                            xfer_count++;
-                            rxBuffer[xfer_count] = rxData;
-                            if (xfer_count == rxBuffer[0]){
-                                Rx_Complete = true;
-                                state = WAITING;
-                            }
-                            
-                        break;
-                        case XFER_REQUESTED:
-                            rxBuffer[0] = rxData;
-                            xfer_count = 0;
-                            state = XFER_IN_PROGRESS;
-                        break;
-                        case WAITING:
-                            if (rxData == MAGIC_WORD){
-                                state = XFER_REQUESTED;
-                            }
-                        break;
-                        default://Undefined State...
-                        break;
-                    
+                    if (Python_rxByte(rxData)){
+                        UART_Frame_Received = true;
                     }
                 }
             }while((readStatus & UART_1_RX_STS_FIFO_NOTEMPTY) != 0u);
@@ -207,10 +176,247 @@ void RxCompleteHandler(void){
     }
 #endif
 
+/****************************************************************************************//**
+*  @brief Runs one received byte through the frame state machine ( MAGIC_WORD, length, data ).
+*         Completed frames are queued, so that a Master device may have several requests in
+*         flight at once. Each queued frame is answered in order by Python_getData.
+*         A frame which starts with UNACKED_MAGIC_WORD instead is executed without an answer,
+*         and if it has to be dropped it is counted as an error; see CheckBuild 0x0F.
+*
+*  @param rxData: the byte which was received from the Master device
+*
+*  @return: true if rxData completed a frame
+*
+*********************************************************************************************/
+bool Python_rxByte(uint8 rxData)
+{
+    uint8 *frame = rxQueue[rxHead];
+    
+    switch(state)
+    {
+        case XFER_IN_PROGRESS:
+            xfer_count++;
+            frame[xfer_count] = rxData;
+            if (xfer_count == frame[0]){
+                state = WAITING;
+                rxUnacked[rxHead] = rxFrameUnacked;
+                if ((uint8)((rxHead + 1u)%RX_QUEUE_DEPTH) != rxTail){
+                    rxHead = (rxHead + 1u)%RX_QUEUE_DEPTH;
+                }
+                else if (rxFrameUnacked){ //the queue is full and the frame is dropped; nobody is waiting for it, so count it
+                    comms.errorCount++;
+                    comms.errorAddr = frame[1];
+                    comms.errorCmd = frame[2];
+                }
+                //else the queue is full and the frame is dropped; the host will time out waiting for it.
+                return true;
+            }
+        break;
+        case XFER_REQUESTED:
+            if (rxData == 0u || rxData >= MAX_RX_BUFFER_SIZE){
+                state = WAITING; //Not a valid length, so this was not really the start of a frame
+                break;
+            }
+            frame[0] = rxData;
+            xfer_count = 0;
+            state = XFER_IN_PROGRESS;
+        break;
+        case WAITING:
+            if (rxData == MAGIC_WORD || rxData == UNACKED_MAGIC_WORD){
+                rxFrameUnacked = (rxData == UNACKED_MAGIC_WORD);
+                state = XFER_REQUESTED;
+            }
+        break;
+        default://Undefined State...
+        break;
+    }
+    return false;
+}
+
+/****************************************************************************************//**
+*  @brief Computes the CRC-16/CCITT-FALSE ( polynomial 0x1021 ) of data, continuing from crc.
+*         A whole frame is checked by starting from 0xFFFF.
+*
+*  @param crc: the CRC of everything before data
+*  @param data: bytes to add to the CRC
+*  @param len: number of bytes in data
+*
+*  @return: the updated CRC
+*
+*********************************************************************************************/
+uint16 Python_crc16(uint16 crc, const uint8 *data, uint8 len)
+{
+    uint8 i, bit;
+    
+    for (i = 0u; i < len; i++)
+    {
+        crc ^= (uint16)data[i]<<8;
+        for (bit = 0u; bit < 8u; bit++)
+        {
+            crc = (crc & 0x8000u) ? (uint16)((crc<<1)^0x1021u) : (uint16)(crc<<1);
+        }
+    }
+    return crc;
+}
+
+/****************************************************************************************//**
+*  @brief In checked mode, a frame is ( MAGIC_WORD, length, seq, addr, cmd, data..., crc_lo, crc_hi ),
+*         with the CRC taken over everything before it. This checks the CRC, takes the seq and
+*         CRC off the frame in xferData.vals, and sets comms.seq and comms.frameStatus:
+*         a frame which failed its CRC, or which arrived ahead of comms.nextSeq because an earlier
+*         one was lost, is answered with RESEND_PARAM and not executed, and a frame which was
+*         answered recently is answered again from the cache. Unacknowledged frames are only
+*         checked, since nothing answers them.
+*         A frame which fails its CRC but is the plain CheckBuild 0x0C request is executed as it is,
+*         so that a host which does not know that frames are checked can always turn checking off.
+*
+*  @param frame: the queued frame, starting with its length
+*
+*********************************************************************************************/
+static void Python_checkFrame(const uint8 *frame)
+{
+    uint8 header[2u];
+    uint8 len = frame[0];
+    uint8 ahead;
+    
+    header[0] = comms.unacked ? UNACKED_MAGIC_WORD : MAGIC_WORD;
+    header[1] = len;
+    if (len >= 4u && Python_crc16(Python_crc16(0xFFFFu, header, 2u), frame + 1, len - 2u) == (uint16)(frame[len - 1u]|(frame[len]<<8))){
+        comms.frameStatus = FRAME_OK;
+    }
+    else if (len == 4u && frame[1] == CHECK_BUILD && frame[2] == 0x0Cu){
+        return;
+    }
+    else{
+        comms.frameStatus = FRAME_CORRUPT;
+    }
+    comms.seq = frame[1];
+    memset((unsigned char*)xferData.vals, 0, sizeof(xferData.vals));
+    if (len > 3u){
+        memcpy((unsigned char*)xferData.vals, frame + 2, (size_t)(len - 3u));
+    }
+    if (comms.frameStatus != FRAME_OK || comms.unacked){
+        return;
+    }
+    ahead = (uint8)(comms.seq - comms.nextSeq);
+    if (ahead == 0u){
+        comms.nextSeq++;
+    }
+    else if (ahead < 0x80u){
+        comms.frameStatus = FRAME_AHEAD;
+    }
+    else if (comms.cacheValid[comms.seq%SEQ_CACHE_DEPTH] && comms.cacheSeq[comms.seq%SEQ_CACHE_DEPTH] == comms.seq){
+        comms.frameStatus = FRAME_REPLAY;
+    }
+    //else it was already executed, but its response is no longer known, so it is executed again.
+}
+
+#if defined(USE_SERIAL)
+/****************************************************************************************//**
+*  @brief Divider of UART_1_IntClock which runs the UART at baud, or 0 if the bus clock
+*         cannot make baud to within 2%.
+*
+*********************************************************************************************/
+static uint32 Python_baudDivider(uint32 baud)
+{
+    uint32 divider, actual;
+    
+    divider = (BCLK__BUS_CLK__HZ + (baud*UART_1_OVER_SAMPLE_COUNT)/2u)/(baud*UART_1_OVER_SAMPLE_COUNT);
+    if (divider == 0u || divider > 0xFFFFu){
+        return 0u;
+    }
+    actual = BCLK__BUS_CLK__HZ/(divider*UART_1_OVER_SAMPLE_COUNT);
+    if (50u*((actual > baud) ? actual - baud : baud - actual) > baud){
+        return 0u;
+    }
+    return divider;
+}
+
+/****************************************************************************************//**
+*  @brief Switches the UART to baud, once the response in its TX FIFO has gone out at the
+*         old rate. Frames which were being received are dropped.
+*
+*********************************************************************************************/
+static void Python_setBaud(uint32 baud)
+{
+    while (0u == (UART_1_ReadTxStatus() & UART_1_TX_STS_FIFO_EMPTY)){};
+    CyDelayUs(10000000u/uartBaud + 1u); //the last byte leaves the shift register
+    
+    UART_1_Stop();
+    UART_1_IntClock_SetDividerValue((uint16)Python_baudDivider(baud));
+    UART_1_ClearRxBuffer();
+    state = WAITING;
+    rxTail = rxHead;
+    baudError = false;
+    uartBaud = baud;
+    UART_1_Start();
+}
+#endif
+
+/****************************************************************************************//**
+*  @brief Handles CheckBuild 0x10. A new rate is switched to after its response has been
+*         sent. The host then checks it with Test_Read, and confirms it by proposing the same
+*         rate again. Until a rate is confirmed, a framing error goes back to the last rate
+*         which was, so a host which could not follow is never locked out.
+*
+*  @param baud: the rate proposed by the host
+*
+*  @return: GOOD_PARAM, or BAD_PARAM if the UART is not in use or cannot run at baud
+*
+*********************************************************************************************/
+uint32 Python_proposeBaud(uint32 baud)
+{
+    #if defined(USE_SERIAL)
+        if (comms.mode != PISOC_PI_MODE || baud == 0u){
+            return BAD_PARAM;
+        }
+        if (baud == uartBaud){
+            confirmedBaud = baud;
+            return GOOD_PARAM;
+        }
+        if (Python_baudDivider(baud) == 0u){
+            return BAD_PARAM;
+        }
+        nextBaud = baud;
+        return GOOD_PARAM;
+    #else
+        (void)baud;
+        return BAD_PARAM;
+    #endif
+}
+
+/****************************************************************************************//**
+*  @brief Moves the oldest queued frame into xferData so that it can be parsed.
+*
+*  @return: true if a frame was waiting
+*
+*********************************************************************************************/
+bool Python_popFrame(void)
+{
+    if (rxTail == rxHead){
+        return false;
+    }
+    memcpy((unsigned char*)xferData.vals, rxQueue[rxTail] + 1, (size_t)rxQueue[rxTail][0]);
+    comms.unacked = rxUnacked[rxTail];
+    comms.seq = 0u;
+    comms.frameStatus = FRAME_PLAIN;
+    if (comms.checked){
+        Python_checkFrame(rxQueue[rxTail]);
+    }
+    rxTail = (rxTail + 1u)%RX_QUEUE_DEPTH;
+    return true;
+}
+
 void TxCompleteHandler(void) //ISR for TX complete..
 {
     //TX_Complete_ClearPending();
     SPI_Tx_Out++;
+    #ifdef USE_SPI
+        if (SPI_Response_Pending){ //the response went out; the host sees the status register until the next one is ready
+            SPI_Response_Pending = false;
+            DMA_Select_Write(0);
+        }
+    #endif
     //GPIO_12_0_Write(!GPIO_12_0_Read());
 }
 
@@ -439,6 +645,70 @@ void Python_parser()
     }
 }
 
+/****************************************************************************************//**
+*  @brief Parses and executes the frame held in xferData, leaving its result in xferData.response.
+*         A frame sent to BATCH_REGISTER holds a count followed by that many length prefixed
+*         commands ( addr, cmd, data... ), which are executed in order. The batch is answered
+*         once, with the number of commands executed in the upper 16 bits of the response and
+*         a bit set in the lower 16 bits for each command which returned BAD_PARAM.
+*
+*********************************************************************************************/
+void Python_execute(void)
+{
+    uint8 batch[MAX_RX_BUFFER_SIZE];
+    uint8 count, len, i;
+    uint8 pos = 2u;
+    uint16 failures = 0u;
+    
+    comms.addr = xferData.vals[0];
+    comms.cmd = xferData.vals[1];
+    comms.extraCount = 0u;
+    
+    if (comms.frameStatus == FRAME_CORRUPT || comms.frameStatus == FRAME_AHEAD){
+        xferData.response.word = RESEND_PARAM;
+        return;
+    }
+    if (comms.frameStatus == FRAME_REPLAY){
+        xferData.response.word = comms.cacheWord[comms.seq%SEQ_CACHE_DEPTH];
+        return;
+    }
+    
+    if (xferData.vals[0] != BATCH_REGISTER){
+        Python_parser();
+        xferData.response.word = GOOD_PARAM;
+        readData();
+        return;
+    }
+    
+    memcpy(batch, (unsigned char*)xferData.vals, MAX_RX_BUFFER_SIZE);
+    count = batch[1];
+    if (count > MAX_BATCH_COMMANDS){
+        xferData.response.word = BAD_PARAM;
+        return;
+    }
+    
+    for (i = 0; i < count; i++)
+    {
+        len = batch[pos];
+        if (len < 2u || pos + 1u + len > MAX_RX_BUFFER_SIZE){
+            break; //Malformed; the host sees fewer commands executed than it sent.
+        }
+        memset((unsigned char*)xferData.vals, 0, sizeof(xferData.vals));
+        memcpy((unsigned char*)xferData.vals, batch + pos + 1u, (size_t)len);
+        
+        Python_parser();
+        xferData.response.word = GOOD_PARAM;
+        readData();
+        if (xferData.response.word == BAD_PARAM){
+            failures |= (uint16)(0x01<<i);
+        }
+        pos += len + 1u;
+    }
+    
+    comms.extraCount = 0u; /* a batch is answered with one word only */
+    xferData.response.word = (((uint32)i)<<16)|failures;
+}
+
 void Python_Initialize(uint8 mode)
 {
         switch(mode)
@@ -536,6 +806,8 @@ void Python_Initialize(uint8 mode)
     void Python_getData(void)
     {   
         uint8 data_len;
+        uint8 i;
+        uint8 usbBuffer[64u];
         timeout_counter = 0;
         timeout_flag = false;
         
@@ -544,23 +816,21 @@ void Python_Initialize(uint8 mode)
             
          
             
-            if (SPI_Rx_Complete){
+            if (rxTail != rxHead && !SPI_Response_Pending){ //a response is only replaced once the host has clocked it out
                 
                 RX_Not_Empty_Disable();
                 
-                SPI_Rx_Complete = false;
-                memcpy(xferData.vals, SPI_rxBuffer + 1, SPI_rxBuffer[0]);
-                comms.DataReady = 1;
                 #ifdef DEBUG_PISOC
     
                  while(!USBUART_CDCIsReady()){};
                 USBUART_PutChar(0xFF);
                 
                 while(!USBUART_CDCIsReady()){};
-                USBUART_PutData(xferData.vals, SPI_rxBuffer[0] );
+                USBUART_PutData(rxQueue[rxTail] + 1, rxQueue[rxTail][0] );
                   while(!USBUART_CDCIsReady()){};
                 USBUART_PutChar(0xFF);
                 #endif
+                comms.DataReady = Python_popFrame();
             }
             
             
@@ -591,14 +861,22 @@ void Python_Initialize(uint8 mode)
             }
             */
          #elif defined USE_SERIAL
-            if (Rx_Complete){
+            if (nextBaud != 0u){ //the response to CheckBuild 0x10 has been queued
+                Python_setBaud(nextBaud);
+                nextBaud = 0u;
+            }
+            else if (baudError){
+                Python_setBaud(confirmedBaud);
+            }
+            if (UART_Frame_Received){
+                UART_Frame_Received = false;
                 if (USB_Active){
                     
                     USBUART_Stop();
                     USB_Active = false;
                 }
-                memcpy((unsigned char*)xferData.vals, rxBuffer + 1, (size_t)rxBuffer[0]);
-                Rx_Complete = false;
+            }
+            if (Python_popFrame()){
                 comms.DataReady = 1;
             }
          #endif
@@ -641,19 +919,53 @@ void Python_Initialize(uint8 mode)
                             }
                         }
                         
-                        data_len = USBUART_GetAll((unsigned char*)xferData.vals);
+                        data_len = USBUART_GetAll(usbBuffer);
                         
-                        if (xferData.vals[0] == MAGIC_WORD)
+                        //A host with several requests in flight may pack more than one frame into a packet,
+                        //or split a frame across packets, so every byte goes through the frame state machine.
+                        for (i = 0; i < data_len; i++)
                         {
-                            memcpy((unsigned char*)xferData.vals, (unsigned char*)xferData.vals + 2, (size_t)xferData.vals[1]);
-                            comms.DataReady = 1;
+                            Python_rxByte(usbBuffer[i]);
                         }
                     }
+                    
+                    if (comms.DataReady == 0 && Python_popFrame())
+                    {
+                        comms.DataReady = 1;
+                    }
                 }
             }
              #endif
     }
     
+/****************************************************************************************//**
+*  @brief Copies the response in xferData into txFrame. In framed mode it is preceded by
+*         MAGIC_WORD and the addr and cmd of the frame it answers, so that a Master device
+*         which has lost its place in the stream can find the start of the next response.
+*         In checked mode the seq of the frame follows MAGIC_WORD, and Python_sendData ends
+*         the response with its CRC.
+*
+*  @param txFrame: buffer of at least 8 bytes
+*
+*  @return: number of bytes to be sent
+*
+*********************************************************************************************/
+static uint8 Python_packResponse(uint8 *txFrame)
+{
+    uint8 len = 0u;
+    
+    if (comms.framed){
+        txFrame[len++] = MAGIC_WORD;
+        if (comms.checked){
+            txFrame[len++] = comms.seq;
+        }
+        txFrame[len++] = comms.addr;
+        txFrame[len++] = comms.cmd;
+    }
+    memcpy(txFrame + len, (unsigned char*)xferData.response.bytes, 4u);
+    return len + 4u;
+}
+
 /****************************************************************************************//**
 *  @brief Writes data back to the Master device when appropriate. 
 *
@@ -664,6 +976,39 @@ void Python_Initialize(uint8 mode)
     
     void Python_sendData(uint8 mode)
     {
+        uint8 txFrame[8u];
+        uint8 txLen = Python_packResponse(txFrame);
+        uint8 crcFrame[2u];
+        uint8 crcLen = 0u;
+        uint16 crc;
+        uint16 extraPos, extraLen;
+        uint8 status = comms.frameStatus;
+        
+        comms.frameStatus = FRAME_PLAIN; //so that an I2C frame is never taken for a checked one
+        if (comms.unacked){ //nobody is waiting for this response; only a failure is kept, for CheckBuild 0x0F
+            comms.unacked = false;
+            comms.extraCount = 0u;
+            if (xferData.response.word == BAD_PARAM || xferData.response.word == RESEND_PARAM){
+                if (comms.errorCount < 0xFFFFu){
+                    comms.errorCount++;
+                }
+                comms.errorAddr = comms.addr;
+                comms.errorCmd = comms.cmd;
+            }
+            return;
+        }
+        if (status == FRAME_OK){ //multi-word responses are not kept, and are executed again if they are asked for again
+            comms.cacheValid[comms.seq%SEQ_CACHE_DEPTH] = (comms.extraCount == 0u);
+            comms.cacheSeq[comms.seq%SEQ_CACHE_DEPTH] = comms.seq;
+            comms.cacheWord[comms.seq%SEQ_CACHE_DEPTH] = xferData.response.word;
+        }
+        if (comms.checked){
+            crc = Python_crc16(0xFFFFu, txFrame, txLen);
+            crc = Python_crc16(crc, (uint8 *)comms.extra, (uint8)(4u*comms.extraCount));
+            crcFrame[0] = (uint8)(crc&0xFFu);
+            crcFrame[1] = (uint8)(crc>>8);
+            crcLen = 2u;
+        }
         timeout_counter = 0;
         timeout_flag = false;
         switch(mode)
@@ -671,7 +1016,10 @@ void Python_Initialize(uint8 mode)
         case PISOC_PI_MODE:
             #if defined(USE_SPI)            /* SPI WRITE HANDLER */
                 
-                memcpy(SPI_txBuffer, xferData.response.bytes, sizeof(xferData.response.bytes)); //Quick! New data!!
+                /* The response is clocked out at the start of the host's next transfer, which also carries its next frame */
+                SPI_txBuffer[0] = MAGIC_WORD;
+                memcpy(SPI_txBuffer + 1, xferData.response.bytes, sizeof(xferData.response.bytes)); //Quick! New data!!
+                SPI_Response_Pending = true;
                 DMA_Select_Write(1);
                 RX_Not_Empty_Enable();
                 CLEAR_SR_BIT(BUSY_BIT);
@@ -703,7 +1051,13 @@ void Python_Initialize(uint8 mode)
              Read_Buffer.data = PISOC_BUSY;
                 */
             #elif defined(USE_SERIAL)
-                UART_1_PutArray((unsigned char*)xferData.response.bytes, 4);
+                UART_1_PutArray(txFrame, txLen);
+                if (comms.extraCount > 0u){
+                    UART_1_PutArray((uint8 *)comms.extra, 4u*comms.extraCount);
+                }
+                if (crcLen > 0u){
+                    UART_1_PutArray(crcFrame, crcLen);
+                }
                 while (!UART_1_GetTxBufferSize()>0){};
             #endif
             
@@ -721,13 +1075,41 @@ void Python_Initialize(uint8 mode)
                     }
                 }
                 //uint8 dat_out[4] = {out_lo, out_mid_lo, out_mid_hi, out_hi};
-                USBUART_PutData((unsigned char*)xferData.response.bytes, 4);
+                USBUART_PutData(txFrame, txLen);
+                for (extraPos = 0u; extraPos < 4u*comms.extraCount; extraPos += USB_PACKET_SIZE)
+                {
+                    while(!USBUART_CDCIsReady())
+                    {
+                        if (timeout_flag)
+                        {
+                            timeout_flag = false;
+                            timeout_counter = 0;
+                            comms.extraCount = 0u;
+                            return;
+                        }
+                    }
+                    extraLen = 4u*comms.extraCount - extraPos;
+                    USBUART_PutData((uint8 *)comms.extra + extraPos, (extraLen < USB_PACKET_SIZE) ? extraLen : USB_PACKET_SIZE);
+                }
+                if (crcLen > 0u){
+                    while(!USBUART_CDCIsReady())
+                    {
+                        if (timeout_flag)
+                        {
+                            timeout_flag = false;
+                            timeout_counter = 0;
+                            comms.extraCount = 0u;
+                            return;
+                        }
+                    }
+                    USBUART_PutData(crcFrame, crcLen);
+                }
             break;
             default:
                 break;
             //#endif
         }
-        
+        comms.extraCount = 0u;
     }
     
 #ifdef USE_SPI
@@ -737,7 +1119,7 @@ void Python_Initialize(uint8 mode)
                                             HI16(STATUS_SRC_BASE), HI16(STATUS_DST_BASE));
 
         statusTD = CyDmaTdAllocate();
-        CyDmaTdSetConfiguration(statusTD, 4u, statusTD, STATUS__TD_TERMOUT_EN|TD_INC_SRC_ADR);
+        CyDmaTdSetConfiguration(statusTD, SPI_TX_BUFFER_SIZE, statusTD, STATUS__TD_TERMOUT_EN|TD_INC_SRC_ADR);
       //TD_INC_SRC_ADR
         
         CyDmaTdSetAddress(statusTD, LO16((uint32)Status), 
@@ -751,7 +1133,7 @@ void Python_Initialize(uint8 mode)
                                             HI16(TX_DATA_SRC_BASE), HI16(TX_DATA_DST_BASE));
 
         txTD = CyDmaTdAllocate();
-        CyDmaTdSetConfiguration(txTD, 4u, txTD, TX_DATA__TD_TERMOUT_EN|TD_INC_SRC_ADR);
+        CyDmaTdSetConfiguration(txTD, SPI_TX_BUFFER_SIZE, txTD, TX_DATA__TD_TERMOUT_EN|TD_INC_SRC_ADR);
         
         CyDmaTdSetAddress(txTD, LO16((uint32)SPI_txBuffer), 
                                       LO16((uint32)SPIS_1_BSPIS_sR8_Dp_u0__F0_REG));  
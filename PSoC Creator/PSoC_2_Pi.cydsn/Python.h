@@ -23,9 +23,14 @@
 }I2C_Buffer_t;
 
 void Python_parser(void);
+void Python_execute(void);
 void Python_Initialize(uint8 mode);
 void Python_sendData(uint8 mode);
 void Python_getData(void);
+bool Python_rxByte(uint8 rxData);
+bool Python_popFrame(void);
+uint16 Python_crc16(uint16 crc, const uint8 *data, uint8 len);
+uint32 Python_proposeBaud(uint32 baud);
 void TxCompleteHandler(void);
 void StatusOutHandler(void);
 void RxCompleteHandler(void);
@@ -36,7 +41,17 @@ void RxCompleteHandler(void);
 #endif
 
 #define MAGIC_WORD 0xEB
+#define UNACKED_MAGIC_WORD 0xEA /* Starts a frame which is executed but not answered; see CheckBuild 0x0F */
 #define BAD_WORD   0x0BAD
+
+/* What Python_checkFrame found out about the frame being answered */
+#define FRAME_PLAIN     (0u) /* Not checked */
+#define FRAME_OK        (1u) /* Passed its CRC, and is the next frame in sequence */
+#define FRAME_CORRUPT   (2u) /* Failed its CRC; answered with RESEND_PARAM */
+#define FRAME_AHEAD     (3u) /* An earlier frame was lost; answered with RESEND_PARAM so that frames are executed in order */
+#define FRAME_REPLAY    (4u) /* Already executed; answered from the cache */
+#define USB_PACKET_SIZE (60u) /* Largest USBUART_PutData transfer; below the 64 byte endpoint, so no zero length packet is needed */
+#define DEFAULT_BAUD    (115200u) /* The UART's rate after a reset; see Python_proposeBaud */
  
 
 void DmaTxConfiguration(void);
@@ -78,6 +78,11 @@ int main()
     xferData.response.word = 0;
     comms.DataReady = 0;
     comms.mode = (uint8)PISOC_PI_MODE;
+    comms.framed = false;
+    comms.unacked = false;
+    comms.errorCount = 0u;
+    comms.checked = false;
+    comms.frameStatus = FRAME_PLAIN;
     
     timeout_flag = false;
     timeout_counter = 0;
@@ -86,6 +91,7 @@ int main()
     WATCHDOG_StartEx(WatchdogHandler);
     #ifdef USE_SPI
         RX_Not_Empty_StartEx( SPI_RX_Handler);
+        TX_Complete_StartEx(TxCompleteHandler);
     #elif defined(USE_SERIAL)
         RX_Byte_Received_StartEx( UART_RX_Handler );
     //#elif defined (USE_I2C)
@@ -154,17 +160,16 @@ int main()
             if(comms.DataReady == 1)
             {
                 comms.DataReady = 0;
-                Python_parser();
-                xferData.response.word = GOOD_PARAM;
-                readData();
+                Python_execute();
                 Python_sendData(comms.mode);
                
             }
             else if (xferData.ready == I2C_SIGNAL) //We got something on I2C instead of the UART or USB.
             {
-                Python_parser();
-                xferData.response.word = GOOD_PARAM;
-                readData();
+                timeout_counter = 0;
+                timeout_flag = false;
+                while ((EZI2C_1_GetActivity() & EZI2C_1_STATUS_BUSY) && !timeout_flag){}; //a host may write the signal and the frame after it in one transfer
+                Python_execute();
                 xferData.ready = I2C_DONE;
             }
             else if (xferData.ready != I2C_DONE)//Something has gone wrong.
@@ -29,6 +29,8 @@ extern CalibrationData_t CapSense_Config;
 extern GPIO_t GPIO_Config; 
 extern vessel_t vessel;
 extern volatile xfer_t xferData;
+extern comms_t comms;
+extern uint32 Python_proposeBaud(uint32 baud);
 
 #define WAVE_SIZE           (255)
 #define SINE                (0x00)
@@ -255,6 +257,80 @@ void readData()
         
     }
 }
+/****************************************************************************************//**
+*  @brief Hashes (32-bit FNV-1a) the responses to every CheckBuild query which describes this
+*         build: 0x00 to 0x04, 0x07 for each clock, 0x08 for each group of PWMs, 0x09 and 0x0B.
+*         A host which saved what it learned from this build can check that it still holds with
+*         one request to CheckBuild 0x0D. The hash is worked out once, on the first request.
+*
+*  @return: The fingerprint of this build
+*******************************************************************************************/
+static uint32 BuildFingerprint(void)
+{
+    static uint32 fingerprint = 0u;
+    static const uint8 queries[] = {0x00, 0x01, 0x02, 0x03, 0x04, 0x07, 0x08, 0x09, 0x0B};
+    uint32 hash;
+    uint8 i, j, val, count;
+    
+    if (fingerprint == 0u)
+    {
+        hash = 2166136261u;
+        for (i = 0u; i < sizeof(queries); i++)
+        {
+            switch(queries[i])
+            {
+                case 0x07: count = CLK_NUM; break;
+                case 0x08: count = (PWM_NUM + 3u)/4u; break;
+                default: count = 1u; break;
+            }
+            for (val = 0u; val < count; val++)
+            {
+                CheckBuild(queries[i], val);
+                for (j = 0u; j < 4u; j++)
+                {
+                    hash ^= (xferData.response.word>>(8u*j))&0xFFu;
+                    hash *= 16777619u;
+                }
+            }
+        }
+        fingerprint = (hash != 0u) ? hash : 1u;
+    }
+    return fingerprint;
+}
+
+/****************************************************************************************//**
+*  @brief Answers CheckBuild 0x0E with everything the other CheckBuild queries describe, so
+*         that a host can learn about this build with a single request. The response word is
+*         the number of words which follow it, in this order: 0x00, 0x01, 0x02, 0x03, 0x04,
+*         0x09, 0x0B and 0x0D, then 0x07 for each clock and 0x08 for each group of 4 PWMs.
+*         The words which follow are only sent over UART and USB UART.
+*
+*  @return: None
+*******************************************************************************************/
+static void DescribeBuild(void)
+{
+    static const uint8 queries[] = {0x00, 0x01, 0x02, 0x03, 0x04, 0x09, 0x0B, 0x0D};
+    uint8 i, count = 0u;
+    
+    for (i = 0u; i < sizeof(queries); i++)
+    {
+        CheckBuild(queries[i], 0u);
+        comms.extra[count++] = xferData.response.word;
+    }
+    for (i = 0u; i < CLK_NUM; i++)
+    {
+        CheckBuild(0x07, i);
+        comms.extra[count++] = xferData.response.word;
+    }
+    for (i = 0u; i < (PWM_NUM + 3u)/4u; i++)
+    {
+        CheckBuild(0x08, i);
+        comms.extra[count++] = xferData.response.word;
+    }
+    comms.extraCount = count;
+    xferData.response.word = count;
+}
+
 /*This function is used during init to tell the master device what is in the PSoC Creator file */
 /* This should not be edited */
 void CheckBuild(uint8 cmd, uint16 val)
@@ -957,6 +1033,31 @@ void CheckBuild(uint8 cmd, uint16 val)
         case 0x0A:
             xferData.response.word = GPIO_Config.pin_count;
         break;
+        case 0x0B:
+            xferData.response.word = PISOC_FEATURES|(RX_QUEUE_DEPTH<<16);
+        break;
+        case 0x0C: /* Turn framed responses on (1), on and checked (2), or off; this response is already sent the new way */
+            comms.framed = (val != 0u);
+            comms.checked = (val == 2u);
+            if (comms.checked){ /* the host counts sequence numbers from 1 again */
+                comms.nextSeq = 1u;
+                memset(comms.cacheValid, 0, sizeof(comms.cacheValid));
+            }
+            xferData.response.word = GOOD_PARAM;
+        break;
+        case 0x0D: /* Fingerprint of this build; see BuildFingerprint */
+            xferData.response.word = BuildFingerprint();
+        break;
+        case 0x0E: /* The whole description in one response; see DescribeBuild */
+            DescribeBuild();
+        break;
+        case 0x0F: /* Unacknowledged frames which failed: errorAddr<<24 | errorCmd<<16 | count. Reading clears the count */
+            xferData.response.word = (((uint32)comms.errorAddr)<<24)|(((uint32)comms.errorCmd)<<16)|comms.errorCount;
+            comms.errorCount = 0u;
+        break;
+        case 0x10: /* Propose a UART baud rate of val*100, or confirm the one just switched to; see Python_proposeBaud */
+            xferData.response.word = Python_proposeBaud(100u*(uint32)val);
+        break;
         default: xferData.response.word = BAD_PARAM; break;
            
          
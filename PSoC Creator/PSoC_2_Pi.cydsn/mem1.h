@@ -31,6 +31,9 @@
 #include "project.h"
     
 //#define DEBUG_PISOC
+#define MAX_EXTRA_WORDS             (32u) /* Longest multi-word response, for UART and USB UART */
+#define SEQ_CACHE_DEPTH             (16u) /* Responses remembered by sequence number in checked mode; twice RX_QUEUE_DEPTH */
+
 typedef union comm_packet
 {
     uint32 word;
@@ -46,6 +49,22 @@ typedef struct commData{
     uint8 pos;
     uint8 mode;
     uint8 DataReady;
+    bool framed;        /* Responses are sent as MAGIC_WORD, addr, cmd, response */
+    uint8 addr;         /* addr and cmd of the frame being answered */
+    uint8 cmd;
+    uint8 extraCount;   /* Words of extra[] sent after the response; see CheckBuild 0x0E */
+    uint32 extra[MAX_EXTRA_WORDS];
+    bool unacked;       /* The frame being answered started with UNACKED_MAGIC_WORD, so no response is sent */
+    uint16 errorCount;  /* Unacknowledged frames which failed or were dropped since CheckBuild 0x0F */
+    uint8 errorAddr;    /* addr and cmd of the last of them */
+    uint8 errorCmd;
+    bool checked;       /* Frames in both directions carry a sequence number and end with a CRC-16; see CheckBuild 0x0C */
+    uint8 seq;          /* Sequence number of the frame being answered */
+    uint8 nextSeq;      /* Sequence number of the next frame to execute, in checked mode */
+    uint8 frameStatus;  /* FRAME_PLAIN, FRAME_OK, FRAME_CORRUPT, FRAME_AHEAD or FRAME_REPLAY; see Python_checkFrame */
+    bool cacheValid[SEQ_CACHE_DEPTH];   /* Recent responses, indexed by seq%SEQ_CACHE_DEPTH, */
+    uint8 cacheSeq[SEQ_CACHE_DEPTH];    /* so that a frame which is sent again is answered again rather than executed twice */
+    uint32 cacheWord[SEQ_CACHE_DEPTH];
 }comms_t;
 
 typedef struct vessel{
@@ -92,8 +111,9 @@ typedef struct GPIO_Data{
 
 #define PISOC_PI_MODE                       (0x00)
 #define PISOC_PC_MODE                       (0x01)
-#define SPI_TX_BUFFER_SIZE                  (4u)
+#define SPI_TX_BUFFER_SIZE                  (5u)  /* MAGIC_WORD and a response, or the status register and padding */
 #define MAX_RX_BUFFER_SIZE                  (60u)
+#define RX_QUEUE_DEPTH                      (8u)  /* Number of complete frames which may be waiting to be processed */
 //#define GET_TX_ARRAY(val)           {(uint8)(val&0x000000FF), (uint8)((val & 0x0000FF00)>>8), (uint8)((val & 0x00FF0000)>>16), (uint8)((val & 0xFF000000)>>24)}
 #define GET_TX_ARRAY(val)           {LO8(LO16(val)), HI8(LO16(val)), LO8(HI16(val)), HI8(HI16(val))}
 
@@ -169,6 +189,7 @@ enum{
 
     CAPSENSE_REGISTER,
 
+    BATCH_REGISTER              = 0xF9,
     I2CM_REGISTER               = 0xFA,
     STRIPLIGHT_REGISTER         = 0xFB,
     RANGE_FINDER                = 0xFC,
@@ -192,9 +213,25 @@ enum{
 */
 
 #define BAD_PARAM                   (0xFBAD0080)
+#define RESEND_PARAM                (0xFBAD00C0) /* A checked frame failed its CRC, or an earlier one was lost; the host sends it again */
 #define PISOC_BUSY                  (0xFBAD0001)
 #define GOOD_PARAM                  (0x0A11600D)
 
+/* Capabilities reported by CheckBuild 0x0B. Bits 16-23 of that word hold RX_QUEUE_DEPTH */
+#define FEATURE_PIPELINE            (0x0001)
+#define FEATURE_BATCH               (0x0002)
+#define FEATURE_FRAMED              (0x0004)
+#define FEATURE_UNACKED             (0x0008)
+#define FEATURE_CHECKED             (0x0010)
+#if defined(USE_SERIAL)
+    #define FEATURE_BAUD            (0x0020) /* The UART's baud rate can be changed with CheckBuild 0x10 */
+#else
+    #define FEATURE_BAUD            (0x0000)
+#endif
+#define PISOC_FEATURES              (FEATURE_PIPELINE|FEATURE_BATCH|FEATURE_FRAMED|FEATURE_UNACKED|FEATURE_CHECKED|FEATURE_BAUD)
+
+#define MAX_BATCH_COMMANDS          (16u) /* Commands carried by one BATCH_REGISTER frame; one failure bit each */
+
 #define COUNTER_TC_TRIGGERED        (0x80)
 #define COUNTER_CAPTURE_TRIGGERED   (0x40)
 #define COUNTER_ERROR_COMP          (0u) //Initial testing shows closer to 9 uS, will test with o-scope   